@@ -1,47 +1,27 @@
 """
 Python wrapper to Manage hosts value in etc/hosts
-Requirements: subprocess,os
+Requirements: fileinput
 Input: Host name
 Author: Shivakumar Bommakanti
 Date: 22-06-2023
 """
 
-import subprocess
 import fileinput
+from command_runner import run_commands, run_argv, memoize_probe
+from campaign_config import get_host_profile
+from tracing import trace_from_argv
+from run_metrics import metrics_from_argv
 
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
+@memoize_probe
 def get_hostname_new():
-    """Gets the hostname from predefined commands new/updated
+    """Gets the instance name from the Campaign config
 
     Returns:
         hostname: string
     """
-    hostname = ""
-    stdout, stderr = run_commands(
-        ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default | cut -d. -f1 | cut -d'-' -f2"])
-    if stderr:
+    hostname = get_host_profile().instance_name
+    if not hostname:
         print("error in fetching hostname")
-    else:
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return hostname
 
@@ -115,15 +95,15 @@ def get_private_IP(spare_servers):
     servers_IP = {}
     region = ''
     for server in spare_servers:
-        stdout, stderr = run_commands(['nslookup {}'.format(server)])
-        if stderr:
+        stdout, stderr, returncode = run_argv(['nslookup', server])
+        if returncode != 0:
             print("error while running nslookup for spare server", server)
         else:
             lines = stdout.splitlines()
             lines = [line for line in lines if line] #To remove empty strings
             address = lines[-1].split(':')[1].strip()
-            stdout1, stderr1 = run_commands(['nslookup {}'.format(address)])
-            if stderr1:
+            stdout1, stderr1, returncode1 = run_argv(['nslookup', address])
+            if returncode1 != 0:
                 print("error while running nslookup for address", address)
             else:
                 lines = stdout1.splitlines()
@@ -135,10 +115,11 @@ def get_private_IP(spare_servers):
                         break
 
             if region:
-                stdout2, stderr2 = run_commands(['aws ec2 describe-instances --filters "Name=tag:Name,Values=cerebro-stage1-1" '
-                                             '--query "Reservations[].Instances[].PrivateIpAddress" '
-                                             '--region {} --output text'.format(region)])
-                if stderr2:
+                stdout2, stderr2, returncode2 = run_argv(['aws', 'ec2', 'describe-instances',
+                                                          '--filters', 'Name=tag:Name,Values=cerebro-stage1-1',
+                                                          '--query', 'Reservations[].Instances[].PrivateIpAddress',
+                                                          '--region', region, '--output', 'text'])
+                if returncode2 != 0:
                     print("error while running aws query for region", region)
                 else:
                     private_ip = stdout2.strip()
@@ -166,6 +147,8 @@ def update_file_using_dict(filename, servers_IP_dict):
 
 
 if __name__ == '__main__':
+    trace_from_argv()
+    metrics_from_argv()
 
     #verifying manage_etc_hosts value
     value = search_file_return_value('/etc/cloud/cloud.cfg.d/01_debian_cloud.cfg', 'manage_etc_hosts', '=')
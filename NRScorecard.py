@@ -100,6 +100,8 @@ from fuzzywuzzy import fuzz
 import openpyxl
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Alignment, Font
+from tracing import trace_from_argv
+from profiling import profile_from_argv
 
 
 BASE_URL = 'https://jira.corp.adobe.com/plugins/servlet/eazybi/accounts/295/export/report'
@@ -1450,6 +1452,8 @@ def add_stats_to_scorecard_excel(new_onboard, ent_or_adv, guid_id, scorecard_tem
         write_scorecard_stats(wb, new_onboard, ent_or_adv, guid_id, customer_name, customer_excel_filename)
 
 def main():
+        trace_from_argv()
+        profile_from_argv()
         scorecard_automation()
 if __name__ == "__main__":
     main()
\ No newline at end of file
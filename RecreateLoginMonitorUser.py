@@ -7,68 +7,52 @@ Date: 25-07-2023
 """
 import subprocess
 import fileinput
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
-def is_ACC_or_ACS():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump -full web'"]
-    stdout, stderr = run_commands(commands)
+from command_runner import run_commands, stream_command, memoize_probe, invalidate_probes
+from database import query, execute
+from async_runner import gather_commands
+from host_facts import campaign_product
+from neolane_env import run_nlserver, environment_summary
+from process_table import get_process_table
+from campaign_config import get_host_profile, CONFIG_GLOB
+from tracing import trace_from_argv
+from run_metrics import metrics_from_argv
+
+PROBE_TIMEOUT = 60
+LOGIN_MONITOR_USER = 'campaign-loginmonitor'
+
+def is_ACC_or_ACS(probe=None):
+    stdout, stderr = probe if probe else campaign_product()
     if stderr:
         print(stderr)
         exit(1)
     return stdout
 
 def check_apache_status():
-    commands = ["cd /var/db/newrelic-infra/custom-integrations; /etc/init.d/apache2 status"]
-    stdout, stderr = run_commands(commands)
+    # stop reading as soon as the Active: line shows up
+    line, stdout, stderr = stream_command("cd /var/db/newrelic-infra/custom-integrations; /etc/init.d/apache2 status",
+                                          lambda line: "Active:" in line)
     if stderr:
         print(stderr)
         exit(1)
     print('check apache ', stdout)
 
-    for line in stdout.split("\n"):
-        if line.strip():
-            if "Active:" in line:
-                line = line.lstrip()
-                if len(line.split()) > 1 \
-                        and "running" in line.split()[1]:
-                    return True
-                else:
-                    return False
+    if line is not None:
+        line = line.lstrip()
+        if len(line.split()) > 1 \
+                and "running" in line.split()[1]:
+            return True
+        else:
+            return False
 
 
 def check_web_status():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump'"]
-    stdout, stderr = run_commands(commands)
+    table, stderr = get_process_table()
     if stderr:
         print(stderr)
         exit(1)
-    print('check web ', stdout)
+    print('check web ', [process.full_name for process in table.processes])
 
-    for line in stdout.split("\n"):
-        if line.strip():
-            if "web@" in line:
-                return True
-            else:
-                return False
+    return len(table.find("web")) > 0
 
 def restart_apache():
     commands = ["cd /var/db/newrelic-infra/custom-integrations; /etc/init.d/apache2 restart"]
@@ -79,8 +63,8 @@ def restart_apache():
     print('restart apache ', stdout)
 
 def restart_web():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver restart web'"]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["restart", "web"])
+    invalidate_probes()
     if stderr:
         print(stderr)
         exit(1)
@@ -118,74 +102,62 @@ def checkBinary_healthy(type):
 
     return proceed
 
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         print("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
-def checkInDB(db_table):
+def checkInDB(db_table, dbname=None):
 
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select sname,idisable,tslastmodified from {} where sname=''campaign-loginmonitor';\"".format(db_table)
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+    if dbname is None:
+        dbname = get_db_name()
+    # a table name can't be a parameter, db_table is xtkoperator or xtkuser
+    sql = "select sname, idisable, tslastmodified from {} where sname = %s;".format(db_table)
+    print(sql, LOGIN_MONITOR_USER)
+    rows, stderr = query(sql, (LOGIN_MONITOR_USER,), dbname)
     print(stderr)
 
-    for line in stdout.split("\n"):
-        line = line.strip()
-        if line:
-            parts = line.split('|')
-            if "idisable" in parts[0]:
-                return parts[1].strip()
+    for row in rows:
+        return row.idisable
 
-    return stdout, stderr
+    return None
 
-def updateInDB(db_table):
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"update {} r set idisable=0 where sname='campaign-loginmonitor';\"".format(
-                               db_table)
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+def updateInDB(db_table, dbname=None):
+    if dbname is None:
+        dbname = get_db_name()
+    sql = "update {} set idisable = 0 where sname = %s;".format(db_table)
+    print(sql, LOGIN_MONITOR_USER)
+    rowcount, stderr = execute(sql, (LOGIN_MONITOR_USER,), dbname)
     print(stderr)
-    print(stdout)
+    print("updated", rowcount)
 
-def set_neolane_env():
-    commands = ['source /usr/local/neolane/nl*/env.sh']
-    stdout, stderr = run_commands(commands)
+def set_neolane_env(probe=None):
+    stdout, stderr = probe if probe else environment_summary()
     if stderr:
         print(stderr)
         exit(1)
     return stdout
 
 def _get_instance_name():
-    commands = ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default |cut -d. -f1 |cut -d'-' -f2"]
-    stdout, stderr = run_commands(commands)
-    if stderr:
-        print(stderr)
+    instance_name = get_host_profile().instance_name
+    if not instance_name:
+        print("no Campaign instance config found under " + CONFIG_GLOB)
         exit(1)
-    return stdout
+    return instance_name
 
 def update_folder_settings(instance_id):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "nlserver javascript -instance:{} -file " \
-                           "/etc/newrelic-infra/custom-integrations/loginmonitor/update_folder_settings.js"\
-                            .format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file",
+                                               "/etc/newrelic-infra/custom-integrations/loginmonitor/update_folder_settings.js"])
     if stderr:
         print(stderr)
         exit(1)
@@ -194,11 +166,9 @@ def update_folder_settings(instance_id):
 def create_credentials(instance_id, pwd):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "/usr/local/neolane/nlserver javascript -instance:{} -file " \
-                           "/etc/newrelic-infra/custom-integrations/loginmonitor/create_credentials.js -arg:{}}'"\
-                            .format(instance_id,pwd)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file",
+                                               "/etc/newrelic-infra/custom-integrations/loginmonitor/create_credentials.js",
+                                               "-arg:" + pwd.strip()])
     if stderr:
         print(stderr)
         exit(1)
@@ -215,8 +185,17 @@ def update_file(file_path, pwd):
     return
 
 if __name__ == '__main__':
+    trace_from_argv()
+    metrics_from_argv()
+
+    # None of these depend on each other, so fire them together
+    probes = gather_commands({
+        'acc_or_acs': campaign_product,
+        'neolane_env': environment_summary,
+    }, timeout=PROBE_TIMEOUT)
+    dbname = get_db_name()
 
-    stdout = is_ACC_or_ACS()
+    stdout = is_ACC_or_ACS(probes['acc_or_acs'])
     print('type '+stdout)
 
     if "Adobe Campaign Classic" in stdout:
@@ -236,10 +215,10 @@ if __name__ == '__main__':
         if not web_status:
             restart_web()
 
-    isDisabled = checkInDB(db_table)
+    isDisabled = checkInDB(db_table, dbname)
     if isDisabled:
-        updateInDB(db_table)
-        isDisabled = checkInDB(db_table)
+        updateInDB(db_table, dbname)
+        isDisabled = checkInDB(db_table, dbname)
         print('After update ', isDisabled)
         restart_nr()
         restart_apache()
@@ -251,7 +230,7 @@ if __name__ == '__main__':
 
         print("password created", pwd)
 
-        stdout, stderr = set_neolane_env()
+        stdout = set_neolane_env(probes['neolane_env'])
         print("Neolane env set", stdout)
 
         stdout= _get_instance_name()
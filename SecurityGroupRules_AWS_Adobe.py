@@ -8,6 +8,8 @@ Date: 15-07-2023
 
 import boto3
 import json
+from tracing import trace_from_argv
+from profiling import profile_from_argv
 
 def get_the_allowed_ips():
     allowed_ips = []
@@ -62,6 +64,8 @@ def handle_security_group_rule(grp_name, grp_id, rules_page, allowed_ips, instan
 
 
 
+trace_from_argv()
+profile_from_argv()
 allowed_ips = get_the_allowed_ips()
 
 check_groups = ['public-web-access', 'production']
@@ -11,64 +11,50 @@ import sys
 import time
 import argparse
 from argparse import RawTextHelpFormatter
+from command_runner import CommandResult, invalidate_probes, timeout_message
+from neolane_env import run_nlserver
+from process_table import get_process_table, missing_processes
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args, set_action
 
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True,
-                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
+ACTION_TIMEOUT = 15
 
 def run_action_command(action, process, no_console=True):
     """
     Runs commond in neolane user for given action and process
-    :return: output
+    :return: CommandResult, timed_out when nlserver was killed after ACTION_TIMEOUT secs
+        (the caller decides whether to go on with another process)
     """
+    args = [action] + process.split()
     if no_console:
-        end = " -noconsole' > /dev/null &"
-    else:
-        end = "'"
-    commands = [
-        "nohup /usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver " + action + " " +process+end+""
-    ]
-    print(commands)
+        args.append("-noconsole")
+    print(args)
+    set_action(" ".join(args[:2]))
+    started = time.monotonic()
     try:
-        result = subprocess.check_output(
-            commands[0], shell=True, universal_newlines=True, timeout=15)
-    except subprocess.TimeoutExpired:
-        print("timed out")
-        sys.exit(0)
+        stdout, stderr, returncode = run_nlserver(args, timeout=ACTION_TIMEOUT, background=no_console)
+        result = CommandResult(stdout, stderr, returncode, False, time.monotonic() - started)
+    except subprocess.TimeoutExpired as e:
+        result = CommandResult(e.stdout or "", timeout_message(e.timeout, ["nlserver"] + args), None, True,
+                               time.monotonic() - started)
+    if no_console:
+        # the process list is different now, whether or not nlserver finished
+        invalidate_probes()
     return result
 
-def get_process_hostname(command1, command2):
-    """Gets the hostname from predefined commands new/updated
+def get_process_hostname(missing):
+    """Gets the running processes from pdump, or the missing ones from monitor -missing
 
     Returns:
-        hostname: string
+        hostname: list of name@instance
     """
-    hostname = []
-    stdout = run_action_command(command1, command2, False)
-
-    lineno = 0
-    lines = stdout.split("\n")
-    for line in lines:
-        if lineno > 0:
-            hostname.append(line)
-        lineno +=1
+    if missing:
+        hostname, stderr = missing_processes()
+    else:
+        table, stderr = get_process_table()
+        hostname = [process.full_name for process in table.processes]
+    if stderr:
+        print(stderr)
 
     return hostname
 
@@ -80,18 +66,24 @@ def action_process(process, action):
     """
 
     if action == 'stop' or action == 'restart':
-        hostname = get_process_hostname('', 'pdump')
+        hostname = get_process_hostname(False)
     else:
-        hostname = get_process_hostname('monitor', '-missing')
+        hostname = get_process_hostname(True)
     if len(hostname) > 0:
-        for proc in hostname:
-            if proc.startswith(process):
-                process1 = proc.split(' ')[0]
-                result = run_action_command(action, process1)
-                print(result)
-                print('Successfull performed ' + action + ' on ' + process1)
-                break;
+        matches = [proc for proc in hostname if proc.startswith(process)]
+        for proc in matches:
+            result = run_action_command(action, proc)
+            if result.timed_out:
+                # try the next matching process
+                print(result.stderr)
+                continue
+            print(result.stdout)
+            print('Successfull performed ' + action + ' on ' + proc)
+            break
         else:
+            if matches:
+                print('Could not ' + action + ' any of ' + ", ".join(matches))
+                sys.exit(1)
             print('Didnt perform action as their is a process missing but not matching with given input')
             sys.exit(0)
     else:
@@ -112,8 +104,12 @@ if __name__ == '__main__':
     required_parser.add_argument("-a", "--action", help="Action")
     required_parser.add_argument("-p", "--process_name", help="Process Name")
 
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     action = args.get('action')
     process_name = args.get('process_name')
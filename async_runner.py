@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+"""
+asyncio based runner to fire independent host probes at the same time
+Requirements: asyncio
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import asyncio
+import contextvars
+import os
+import signal
+import threading
+import time
+
+import tracing
+import transcript
+from command_runner import BASH, effective_timeout, timeout_message
+
+
+async def run_argv_async(argv, timeout=None, env=None):
+    """Runs a single command directly, without going through bash
+
+    Args:
+        argv (list): program and its arguments
+        timeout (int): seconds to wait before killing the command and its
+            process group, None waits forever (capped by the run budget)
+        env (dict): environment for the program, defaults to ours
+
+    Returns:
+        stdout: output of the command
+        stderr: standard error if any
+        returncode: exit code of the command, None if it timed out
+    """
+    timeout = effective_timeout(timeout)
+    transcript.note_call("async")
+    # probes of one gather overlap on this thread, each gets its own lane in the trace
+    with tracing.span(tracing.describe("async", argv), "async", lane=tracing.new_lane()) as span_args:
+        result = await _transcribed_argv_async(argv, timeout, env)
+        span_args.update(tracing.outcome("async", result))
+    return result
+
+
+async def _transcribed_argv_async(argv, timeout, env):
+    if transcript.replaying():
+        result, delay = transcript.replay_entry("async", list(argv))
+        await asyncio.sleep(delay)
+        return tuple(result)
+    started = time.monotonic()
+    result = await _run_argv_async(argv, timeout, env)
+    if transcript.recording():
+        transcript.record("async", list(argv), list(result), time.monotonic() - started)
+    return result
+
+
+async def _run_argv_async(argv, timeout, env):
+    try:
+        process = await asyncio.create_subprocess_exec(*argv, stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE, env=env,
+                                                       start_new_session=True)
+    except OSError as e:
+        return "", str(e), 127
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        return "", timeout_message(timeout, argv), None
+    return stdout.decode(errors="replace"), stderr.decode(errors="replace"), process.returncode
+
+
+async def run_commands_async(commands, timeout=None):
+    """Runs unix commands in their own bash
+
+    Args:
+        commands (list): list of commands to execute
+        timeout (int): seconds to wait before killing bash, None waits forever
+
+    Returns:
+        stdout: output of the commands
+        stderr: standard error if any
+        returncode: exit code of the last command, None if it timed out
+    """
+    return await run_argv_async([BASH, "-c", "\n".join(commands)], timeout)
+
+
+async def _run_in_thread(func, timeout):
+    """func() in a daemon thread, given up on after timeout secs
+
+    A thread can't be killed: one that runs past the timeout is left to
+    finish on its own. It is a daemon thread, unlike asyncio.to_thread's
+    executor, so neither gather_commands nor the script's exit waits for it.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    context = contextvars.copy_context()
+
+    def settle(result, error):
+        if not future.done():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def target():
+        result, error = None, None
+        try:
+            result = context.run(func)
+        except Exception as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(settle, result, error)
+        except RuntimeError:
+            # gather_commands is over, nobody wants the answer any more
+            pass
+
+    threading.Thread(target=target, name="probe-" + getattr(func, "__name__", "func"), daemon=True).start()
+    return await asyncio.wait_for(future, timeout)
+
+
+async def _run_probe(probe, timeout):
+    if callable(probe):
+        # python probes (e.g. cached host facts) run in a worker thread
+        timeout = effective_timeout(timeout)
+        try:
+            return await _run_in_thread(probe, timeout)
+        except asyncio.TimeoutError:
+            return "", timeout_message(timeout, getattr(probe, "__name__", repr(probe)))
+    stdout, stderr, returncode = await run_commands_async(probe, timeout)
+    return stdout, stderr
+
+
+async def _gather(probes, timeout):
+    names = list(probes)
+    results = await asyncio.gather(*[_run_probe(probes[name], timeout) for name in names])
+    return dict(zip(names, results))
+
+
+def gather_commands(probes, timeout=None):
+    """Runs independent probes concurrently and waits for all of them
+
+    Total time is the slowest probe instead of the sum of all of them.
+    A probe that runs past its timeout reports the timeout on stderr, the
+    others are not affected. Commands are killed; a function is left to
+    finish in the background, see _run_in_thread.
+
+    Args:
+        probes (dict): probe name -> list of commands, same as run_commands,
+            or a function returning (stdout, stderr)
+        timeout (int): seconds allowed for each probe (capped by the run budget)
+
+    Returns:
+        dict: probe name -> (stdout, stderr)
+    """
+    return asyncio.run(_gather(probes, timeout))
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""
+Stand-in for nlserver, psql, camp-glops, hostnamectl, systemctl, ... used by
+the benchmark. It is linked under the name of the tool it plays and answers
+from the scenario file in ONCALL_FAKE_SCENARIO:
+
+    {"tools": {"nlserver": {"latency": 0.2, "responses": [
+        {"match": ["pdump", "-full"], "stdout": "...", "latency": 0.6},
+        {"match": "monitor -missing", "stdout": "...", "returncode": 0}]}}}
+
+The first response whose match strings are all found in the command line
+wins, the tool's own latency applies when the response has none. Every
+call is appended to ONCALL_FAKE_LOG as one JSON line, for counting.
+Requirements: json, time
+Input: tool arguments
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import json
+import os
+import sys
+import time
+
+SCENARIO_ENV = "ONCALL_FAKE_SCENARIO"
+LOG_ENV = "ONCALL_FAKE_LOG"
+
+
+def find_response(tool, args, scenario):
+    """Returns the response for the call and its latency"""
+    config = scenario.get("tools", {}).get(tool, {})
+    command_line = " ".join(args)
+    for response in config.get("responses", []):
+        match = response.get("match", [])
+        if isinstance(match, str):
+            match = [match]
+        if all(part in command_line for part in match):
+            return response, response.get("latency", config.get("latency", 0))
+    return config.get("default", {}), config.get("latency", 0)
+
+
+def log_call(tool, args, latency):
+    path = os.environ.get(LOG_ENV)
+    if not path:
+        return
+    line = json.dumps({"tool": tool, "args": args, "latency": latency, "pid": os.getpid()}) + "\n"
+    # one write on an O_APPEND descriptor, so concurrent calls don't interleave
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def main():
+    tool = os.path.basename(sys.argv[0])
+    args = sys.argv[1:]
+    with open(os.environ[SCENARIO_ENV]) as fp:
+        scenario = json.load(fp)
+
+    response, latency = find_response(tool, args, scenario)
+    log_call(tool, args, latency)
+    time.sleep(latency)
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    return response.get("returncode", 0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/python3
+"""
+End-to-end latency benchmark of the remediation scripts against fake tools
+Builds a throwaway Campaign host (instance config, env.sh, /etc files) from
+a scenario, puts the fake nlserver, psql, camp-glops, hostnamectl, systemctl
+and ps first on PATH and runs every script the way on-call would, reporting
+wall-clock time, processes started by the script and calls per fake tool.
+The first run of a case starts with an empty host facts cache (cold), the
+others reuse it (warm). Runs as the current user, nothing outside the
+temporary host is touched.
+Requirements: argparse, json, subprocess, tempfile, statistics
+Input: --scenario, --repeat, --sleep-scale, --case, --json
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+Example: python3 bench/run_bench.py --repeat 3 --sleep-scale 0
+"""
+import argparse
+import collections
+import json
+import os
+import pwd
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import RawTextHelpFormatter
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+REPO = os.path.dirname(HERE)
+SHIM = os.path.join(HERE, "shim")
+FAKE_TOOL = os.path.join(HERE, "fake_tool.py")
+DEFAULT_SCENARIO = os.path.join(HERE, "scenario.json")
+
+# case: script and arguments, as on-call would run them
+CASES = {
+    "camp_glops": ["camp_glops.py"],
+    "action_pdumps": ["action_pdumps.py", "-a", "restart", "-p", "inMail"],
+    "acc-acs_updated": ["acc-acs_updated.py", "-s", "xtknewid"],
+    "kill_idle_Queries": ["kill_idle_Queries.py", "-days", "3"],
+    # both backends outlive the cancel (the policy's survivor% pattern picks the fake's answer)
+    "kill_idle_Queries_survivors": ["kill_idle_Queries.py", "--policy", "idle-survivors.json",
+                                    "--converge-timeout", "0.5"],
+    "critical_workflow_updated": ["critical_workflow_updated.py", "-wn", "rtEventProcessing"],
+}
+
+
+def build_host(root, scenario):
+    """Writes the scenario files under root and links the fake tools
+
+    Returns:
+        bin_dir: directory to put first on PATH
+    """
+    bin_dir = os.path.join(root, "bin")
+    os.makedirs(bin_dir)
+    for tool in scenario["tools"]:
+        os.symlink(FAKE_TOOL, os.path.join(bin_dir, tool))
+    for relative_path, content in scenario.get("files", {}).items():
+        path = os.path.join(root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fp:
+            fp.write(content.replace("{bin}", bin_dir).replace("{root}", root))
+    return bin_dir
+
+
+def case_environment(root, bin_dir, scenario_path, sleep_scale):
+    """Environment pointing the scripts at the fake host"""
+    environment = dict(os.environ)
+    for name in ("ONCALL_RECORD", "ONCALL_REPLAY", "ONCALL_RUN_BUDGET"):
+        environment.pop(name, None)
+    environment.update({
+        "PATH": bin_dir + os.pathsep + environment.get("PATH", ""),
+        "PYTHONPATH": SHIM + os.pathsep + REPO,
+        "ONCALL_NEOLANE_ROOT": os.path.join(root, "neolane"),
+        "ONCALL_NEOLANE_USER": pwd.getpwuid(os.geteuid()).pw_name,
+        "ONCALL_ETC_DIR": os.path.join(root, "etc"),
+        "ONCALL_HOST_FACTS": os.path.join(root, "host-facts.json"),
+        "ONCALL_HELPER_SOCKET": os.path.join(root, "no-helper.sock"),
+        "ONCALL_FAKE_SCENARIO": scenario_path,
+        "ONCALL_FAKE_LOG": os.path.join(root, "calls.jsonl"),
+        "ONCALL_BENCH_STATS": os.path.join(root, "stats.json"),
+        "ONCALL_SLEEP_SCALE": str(sleep_scale),
+    })
+    return environment
+
+
+def run_case(argv, root, environment):
+    """Runs one script once
+
+    Returns:
+        dict: returncode, wall, spawns, slept, tool_calls, output
+    """
+    for name in ("ONCALL_FAKE_LOG", "ONCALL_BENCH_STATS"):
+        if os.path.exists(environment[name]):
+            os.unlink(environment[name])
+
+    started = time.monotonic()
+    completed = subprocess.run([sys.executable, os.path.join(REPO, argv[0])] + argv[1:], cwd=root,
+                               env=environment, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, universal_newlines=True)
+    wall = time.monotonic() - started
+
+    tool_calls = collections.Counter()
+    if os.path.exists(environment["ONCALL_FAKE_LOG"]):
+        with open(environment["ONCALL_FAKE_LOG"]) as fp:
+            for line in fp:
+                tool_calls[json.loads(line)["tool"]] += 1
+    stats = {}
+    if os.path.exists(environment["ONCALL_BENCH_STATS"]):
+        with open(environment["ONCALL_BENCH_STATS"]) as fp:
+            stats = json.load(fp)
+
+    return {"returncode": completed.returncode, "wall": round(wall, 3), "spawns": stats.get("spawns"),
+            "slept": stats.get("slept"), "tool_calls": dict(tool_calls), "output": completed.stdout}
+
+
+def bench_case(name, scenario, scenario_path, repeat, sleep_scale, keep):
+    """Runs a case repeat times on its own fresh fake host"""
+    root = tempfile.mkdtemp(prefix="oncall-bench-{}-".format(name))
+    try:
+        bin_dir = build_host(root, scenario)
+        environment = case_environment(root, bin_dir, scenario_path, sleep_scale)
+        return [run_case(CASES[name], root, environment) for _ in range(repeat)]
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def summarize(name, runs):
+    warm = [run["wall"] for run in runs[1:]]
+    last = runs[-1]
+    return {
+        "case": name,
+        "returncode": last["returncode"],
+        "cold": runs[0]["wall"],
+        "warm": round(statistics.median(warm), 3) if warm else None,
+        "spawns": last["spawns"],
+        "tool_calls": sum(last["tool_calls"].values()),
+        "by_tool": last["tool_calls"],
+        "slept": last["slept"],
+    }
+
+
+def print_report(summaries):
+    print("{:<27} {:>4} {:>8} {:>8} {:>7} {:>6} {:>7}  {}".format(
+        "case", "exit", "cold s", "warm s", "spawns", "calls", "slept", "calls by tool"))
+    for summary in summaries:
+        print("{:<27} {:>4} {:>8.2f} {:>8} {:>7} {:>6} {:>7}  {}".format(
+            summary["case"], summary["returncode"], summary["cold"],
+            "-" if summary["warm"] is None else "{:.2f}".format(summary["warm"]),
+            "-" if summary["spawns"] is None else summary["spawns"], summary["tool_calls"],
+            "-" if summary["slept"] is None else "{:g}".format(summary["slept"]),
+            ", ".join("{} {}".format(tool, count) for tool, count in sorted(summary["by_tool"].items()))))
+
+
+if __name__ == '__main__':
+    exe_process = """Runs the remediation scripts end to end against fake tools.
+Use --sleep-scale 0 to leave out the fixed waits and measure the scripts' own time."""
+    parser = argparse.ArgumentParser(epilog=exe_process, formatter_class=RawTextHelpFormatter)
+    parser.add_argument("--scenario", default=DEFAULT_SCENARIO, help="fake host and tool answers (JSON)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, the first one is cold")
+    parser.add_argument("--sleep-scale", type=float, default=1.0, help="multiply the scripts' sleeps by this")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="case to run, default all")
+    parser.add_argument("--json", metavar="FILE", help="write every run to FILE")
+    parser.add_argument("--show-output", action="store_true", help="print the output of the last run")
+    parser.add_argument("--keep", action="store_true", help="keep the fake hosts for inspection")
+
+    args = parser.parse_args()
+    scenario_path = os.path.abspath(args.scenario)
+    with open(scenario_path) as fp:
+        scenario = json.load(fp)
+
+    results = {}
+    summaries = []
+    for name in args.case or list(CASES):
+        runs = bench_case(name, scenario, scenario_path, max(1, args.repeat), args.sleep_scale, args.keep)
+        results[name] = runs
+        summaries.append(summarize(name, runs))
+        if args.show_output:
+            print("==== {} ====\n{}".format(name, runs[-1]["output"]))
+
+    print_report(summaries)
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump({"summary": summaries, "runs": results}, fp, indent=2)
@@ -0,0 +1,41 @@
+"""
+Loaded into every script the benchmark runs (PYTHONPATH=bench/shim).
+Counts the processes the script starts itself, and scales time.sleep by
+ONCALL_SLEEP_SCALE so the fixed waits between steps can be left out when
+only the scripts' own overhead is of interest. Writes the numbers to
+ONCALL_BENCH_STATS when the script exits. Both variables are taken out of
+the environment, so the fake tools the script starts keep their latency.
+"""
+import atexit
+import json
+import os
+import time
+
+SPAWN_EVENTS = ("subprocess.Popen", "os.posix_spawn", "os.exec", "os.spawn", "os.system")
+
+_stats = {"spawns": 0, "slept": 0.0}
+_sleep = time.sleep
+_stats_path = os.environ.pop("ONCALL_BENCH_STATS", None)
+_scale = float(os.environ.pop("ONCALL_SLEEP_SCALE", "1"))
+
+
+def _audit(event, args):
+    if event in SPAWN_EVENTS:
+        _stats["spawns"] += 1
+
+
+def _scaled_sleep(seconds):
+    _stats["slept"] += seconds
+    _sleep(seconds * _scale)
+
+
+def _write_stats():
+    with open(_stats_path, "w") as fp:
+        json.dump(_stats, fp)
+
+
+if _stats_path:
+    import sys
+    sys.addaudithook(_audit)
+    time.sleep = _scaled_sleep
+    atexit.register(_write_stats)
@@ -1,190 +1,180 @@
 #!/usr/bin/python3
 """
 Python3 script for eliminating inmail issues
-Requirements: subprocess, fileinput, time, sys, os, logging, pwd
-Input: None
+Requirements: fileinput, time, sys, os, logging, pwd
+Input: --trace FILE (optional)
 Author: Shivakumar Bommakanti
 ver 1 : Created - 04-26-2023
 ver 2 : Added timeout of 90 secs and camp globs status check, restart - 18-12-2023
 ver 3 : Added code to check hostnamectl and commands to install camp glops accordingly - 25-12-2023
 """
 import os
-import subprocess
 import sys
 import time
 import logging
 import fileinput
 from pwd import getpwnam
-
-neolane_uid = getpwnam('neolane').pw_uid
-neolane_gid = getpwnam('neolane').pw_gid
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
+from command_runner import run_commands, stream_command, memoize_probe, invalidate_probes
+from database import query, execute
+from neolane_env import run_nlserver, NEOLANE_USER
+from campaign_config import get_host_profile
+from host_facts import os_name
+from tracing import trace_from_argv
+from service_manager import get_service_manager, InitdServiceManager, SystemdServiceManager
+from run_metrics import metrics_from_argv, set_action, mark_healthy, set_result, add_metric
+
+neolane_uid = getpwnam(NEOLANE_USER).pw_uid
+neolane_gid = getpwnam(NEOLANE_USER).pw_gid
+
+ETC_DIR = os.environ.get("ONCALL_ETC_DIR", "/etc")
+HOSTS_FILE = os.path.join(ETC_DIR, "hosts")
+GLOPS_INI = os.path.join(ETC_DIR, "glops/glops.ini")
+CAMP_GLOPS_DEFAULTS = os.path.join(ETC_DIR, "default/camp-glops")
+
+# seconds allowed for camp-glops checks, service commands and psql before they are killed
+CHECK_TIMEOUT = 60
+SERVICE_TIMEOUT = 120
+PSQL_TIMEOUT = 120
+# what a fresh install changes, as the per-OS install commands always did
+INSTALL_CHANGES = {
+    InitdServiceManager: [("start", "camp-glops"), ("enable", "camp-glops")],
+    SystemdServiceManager: [("start", "camp-glops"), ("stop", "dovecot")],
+}
+
+@memoize_probe
+def get_hostname_new():
+    """Gets the instance name from the Campaign config
 
     Returns:
-        stdout: output of the commands
-        stderr: standard error if any
+        hostname: string
     """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True,
-                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    hostname = get_host_profile().instance_name
+    if not hostname:
+        logger.exception("error in fetching hostname")
 
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
+    return hostname
 
 
-def get_hostname_new():
-    """Gets the hostname from predefined commands new/updated
+@memoize_probe
+def get_hostname():
+    """Gets the first instance with autoStart modules from the Campaign config
 
     Returns:
         hostname: string
     """
     hostname = ""
-    stdout, stderr = run_commands(
-        ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default | cut -d. -f1 | cut -d'-' -f2"])
-    if stderr:
+    hostnames = get_host_profile().started_instance_names
+    if not hostnames:
         logger.exception("error in fetching hostname")
     else:
-        hostnames = stdout.split("\n")
-        if(len(hostnames) > 1):
-            stdout = hostnames[0]
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
+        hostname = hostnames[0]
 
     return hostname
 
 
-def get_hostname():
-    """Gets the hostname from predefined commands
+@memoize_probe
+def get_inmail_instances():
+    """Instances running inMail (autoStart in their config), every one of them
+    on a shared host; the first instance when none says so
 
     Returns:
-        hostname: string
+        instance names: list of strings
     """
-    hostname = ""
-    stdout, stderr = run_commands(
-        ["grep -il 'true' /usr/local/neolane/nl*/conf/config-*.xml | grep -v seczo | grep -v default |  awk -F'config-' '{print $2}' | sed -re 's/.{4}$//'"])
-    if stderr:
+    profile = get_host_profile()
+    names = [instance.name for instance in profile.instances if instance.auto_start.get("inMail")]
+    if not names and profile.instance_name:
+        names = [profile.instance_name]
+    if not names:
         logger.exception("error in fetching hostname")
-    else:
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
-
-    return hostname
+    return names
 
 
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         logger.exception("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
 
+def mailbox_ok(line):
+    """camp-glops line saying the mailboxes are healthy"""
+    return "Mailbox(es) are ok" in line
+
+
 def check_mailbox_status():
-    """checks the health of mailbox using camp-glops
+    """checks the health of mailbox using camp-glops, stops camp-glops
+    as soon as it reports healthy mailboxes
 
     Returns:
         integer: 1 if there are issues 0 if none
     """
     counter = 1
-    command = "camp-glops -check -v"
-    stdout, stderr = run_commands([command])
+    matched, stdout, stderr = stream_command(["camp-glops", "-check", "-v"], mailbox_ok, timeout=CHECK_TIMEOUT)
 
-    if "Mailbox(es) are ok" in stdout:
+    if matched:
         logger.info("Mailboxes are healthy")
         counter = 0
-    elif "Mailbox(es) are ok" not in stdout:
-        logger.info("Mail box isn't healthy, proceed to restart inMail")
     elif stderr:
-        logger.info("error in checking mailbox status, exiting..")
+        logger.info("error in checking mailbox status: " + stderr)
+    else:
+        logger.info("Mail box isn't healthy, proceed to restart inMail")
 
     return counter
 
 
 def restart_inMail():
-    """Restart the inmail nlserver
+    """Restart the inmail nlserver of every inMail instance
 
     Returns:
         None
     """
-    hostname = get_hostname_new()
+    hostnames = get_inmail_instances()
     time.sleep(10)
-    commands = [
-        "nohup /usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver restart inMail@" +
-        hostname+" -noconsole' > /dev/null &"
-    ]
-    #print(commands)
-    try:
-        result = subprocess.check_output(
-            commands[0], shell=True, universal_newlines=True, timeout=15)
-    except subprocess.TimeoutExpired:
-        logger.exception("timed out")
-        sys.exit(0)
+    for hostname in hostnames:
+        args = ["restart", "inMail@" + hostname, "-noconsole"]
+        #print(args)
+        # started in background, nothing to wait for: only a failed start is reported
+        result, stderr, returncode = run_nlserver(args, timeout=15, background=True)
+        if stderr:
+            logger.info("error in restarting inMail@{}: {}".format(hostname, stderr))
+    invalidate_probes()
     # THE BELOW STATEMENT IS COMMENTED, I.E., IT WON'T RUN THE RESTART INMAIL COMMAND
     # stdout, stderr = run_commands(commands)
     time.sleep(40)
     return
 
 
-def install_camp_glops(osType):
-    """Install the camp glops if not installed
+def install_camp_glops(services):
+    """Install the camp glops if not installed and start it
+    (Debian: enabled at boot too, CentOS: dovecot stopped too)
     """
-    if osType == 0:
-        commands = [
-            "apt-get update -y",
-            "apt-get install camp-glops -y",
-            "/etc/init.d/camp-glops start",
-            "update-rc.d camp-glops enable",
-            "camp-glops -check -check-details"
-        ]
-    else:
-        commands = [
-            "yum update -y",
-            "yum install camp-glops -y",
-            "systemctl start camp-glops.service",
-            "camp-glops -check -check-details",
-            "systemctl stop dovecot.service"
-        ]
+    changes = INSTALL_CHANGES[type(services)]
+    commands = (services.install_commands("camp-glops") + services.batch_commands(changes)
+                + ["camp-glops -check -check-details"])
     stdout, stderr = run_commands(commands)
+    invalidate_probes()
     logger.info(stdout)
     logger.exception(stderr)
 
 
-def disable_dovecot(osType):
-
-    if osType == 0:
-        commands = [
-            "/etc/init.d/dovecot stop",
-            "update-rc.d dovecot disable"
-        ]
-    else:
-        commands = [
-            "systemctl stop dovecot.service"
-        ]
-    stdout, stderr = run_commands(commands)
-    logger.info(stdout)
+def disable_dovecot(services):
+    """Stops dovecot and keeps it from starting at boot, camp-glops serves its port"""
+    states, stderr = services.apply([("stop", "dovecot"), ("disable", "dovecot")])
+    logger.info(states)
     logger.exception(stderr)
 
 
 def kill_process_dovecot(commandPart):
     command = [
         "ps -eo pid,command | egrep '/usr/sbin/dovecot' | grep -v grep | awk '{print $1}'"]
-    stdout, stderr = run_commands(command)
+    stdout, stderr = run_commands(command, timeout=SERVICE_TIMEOUT)
     if stderr:
         logger.exception("error in getting process id")
         return
@@ -192,56 +182,47 @@ def kill_process_dovecot(commandPart):
     process_id = stdout.strip("\n")
 
     command = ["kill -9 "+process_id]
-    stdout, stderr = run_commands(command)
+    stdout, stderr = run_commands(command, timeout=SERVICE_TIMEOUT)
     if stderr:
         logger.exception("error in killing process id")
         return
 
 
-def check_for_installation(osType):
+def _camp_glops_active(states):
+    # no state at all when the shell call timed out or the run budget ran out
+    state = states.get("camp-glops")
+    return state is not None and state.active
+
+
+def check_for_installation(services):
     commands = [
         "ps -ef | egrep 'dovecot|glops'"
     ]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = run_commands(commands, timeout=SERVICE_TIMEOUT)
     if stderr:
         logger.exception("error in checking processes.. returning")
         return
 
     if "/usr/sbin/dovecot" in stdout:
         kill_process_dovecot("/usr/sbin/dovecot")
-        disable_dovecot(osType)
+        disable_dovecot(services)
         time.sleep(5)
     elif "/usr/bin/dovecot" in stdout:
         kill_process_dovecot("/usr/bin/dovecot")
-        disable_dovecot(osType)
+        disable_dovecot(services)
         time.sleep(5)
 
     if "/usr/bin/camp-glops" in stdout or "/usr/sbin/camp-glops" in stdout:
-        if osType == 0:
-            commands_status = [
-                "/etc/init.d/camp-glops status"
-            ]
-            commands_running = [
-                "/etc/init.d/camp-glops stop && /etc/init.d/camp-glops start && /etc/init.d/camp-glops status"
-            ]
-        else:
-            commands_status = [
-                "systemctl status camp-glops.service"
-            ]
-            commands_running = [
-                "systemctl stop camp-glops.service && systemctl start camp-glops.service && systemctl status camp-glops.service"
-            ]
-
-        stdout, stderr = run_commands(commands_status)
-        if "running" not in stdout:
-            stdout, stderr = run_commands(commands_running)
-            if "running" not in stdout:
+        states, stderr = services.status(["camp-glops"])
+        if not _camp_glops_active(states):
+            states, stderr = services.apply([("restart", "camp-glops")])
+            if not _camp_glops_active(states):
                 print('Camp-glops are not in running state and failed to restart')
                 sys.exit(0)
         logger.info("camp_glops already installed")
         return
     else:
-        install_camp_glops(osType)
+        install_camp_glops(services)
 
 
 def change_content_in_files(filename, find_text, replace_text, flag=0):
@@ -264,21 +245,22 @@ def change_content_in_files(filename, find_text, replace_text, flag=0):
 def fix_inmail_extaccounts():
     hostname = get_hostname_new()
     dbname = get_db_name()
-    sql_retrieve_command = "psql -d "+dbname + \
-        " -c \"SELECT iextaccountid,saccount,sname,sserver,sport,spassword FROM nmsextaccount WHERE itype = 0 and iactive = 1;\" | awk -F\"|\" 'NR==3 {if($6==\" \") print $1}'"
-    logger.info(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+    sql = "SELECT iextaccountid,saccount,sname,sserver,sport,spassword FROM nmsextaccount WHERE itype = 0 and iactive = 1;"
+    logger.info(sql)
+    rows, stderr = query(sql, dbname=dbname, timeout=PSQL_TIMEOUT)
     #print(stderr)
     if 'PGSQL.5432" failed: No such file or directory' in stderr:
         stdout1,stderr1 = run_commands((['eval $(camp-db-params-e)']))
         print('DB Error loop After running fix Out- ',stdout1,' Error - ',stderr1)
-    iextaccountid = stdout.strip("\t").strip("\n").strip(" ")
+    iextaccountid = None
+    if rows:
+        # first active pop account without a password
+        if not (rows[0].spassword or "").strip():
+            iextaccountid = rows[0].iextaccountid
     logger.info(iextaccountid)
-    if iextaccountid != "":
-        delete_command = "psql -d "+dbname + \
-            " -c \"DELETE FROM nmsextaccount WHERE iextaccountid = "+iextaccountid+";\""
-        #print(delete_command)
-        stdout, stderr = run_commands([delete_command])
+    if iextaccountid is not None:
+        rowcount, stderr = execute("DELETE FROM nmsextaccount WHERE iextaccountid = %s;", (iextaccountid,),
+                                   dbname, timeout=PSQL_TIMEOUT)
         logger.exception(stderr)
 
         filename = "create_extaccount.js"
@@ -302,25 +284,21 @@ def fix_inmail_extaccounts():
         f.write(data)
         f.close()
 
-        create_command = "/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver javascript -instance:"+hostname+" -file "+filename
-        stdout, stderr = run_commands([create_command])
+        stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + hostname, "-file", filename])
         logger.exception(stderr)
 
 def check_throughput():
     throughput = ""
-    #stdout, stderr = run_commands(
-    command = ["camp-glops -check -check-details | grep neolane | awk -F\| '{print $5}' | awk '{$1=$1;print}' | awk -F" " '{print $1}'"]
-    #stdout = subprocess.check_output(command[0], shell=True, universal_newlines=True, timeout=15)
-    # process = subprocess.Popen(command, shell=True, universal_newlines=True,
-    #                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    # stdout, stderr = process.communicate()
-    stdout, stderr = run_commands(command)
-    if stderr:
+    # the neolane row of the details table, throughput is the first word of the 5th column
+    matched, stdout, stderr = stream_command(["camp-glops", "-check", "-check-details"],
+                                             lambda line: "neolane" in line, timeout=CHECK_TIMEOUT)
+    if matched is None:
         logger.exception("error in fetching throughput")
-    #else:
-    print('throughput', stdout)
-    throughput = stdout.replace('\n', '').replace(
-            '\t', '').replace(' ', '')
+    else:
+        fields = matched.split("|")
+        if len(fields) > 4 and fields[4].split():
+            throughput = fields[4].split()[0]
+    print('throughput', throughput)
 
     try:
         if throughput:
@@ -331,14 +309,13 @@ def check_throughput():
     return throughput
 
 def getOSType():
-    """Runs hostnamectl command and returns
+    """Checks hostnamectl (cached across runs) and returns
     1 - if OS is CentOS
     0 - if OS is Debian"""
 
-    command = "hostnamectl"
-    stdout, stderr = run_commands([command])
+    stdout, stderr = os_name()
 
-    if stderr:
+    if not stdout:
         print("error in getting Operating System")
         logger.exception("error in getting Operating System")
         sys.exit(0)
@@ -353,6 +330,8 @@ def getOSType():
 
 
 if __name__ == '__main__':
+    trace_from_argv()
+    metrics_from_argv()
     try:
         #context.set_logger("inmail")
         global logger
@@ -361,45 +340,41 @@ if __name__ == '__main__':
         raise e
 
     osType = getOSType()
+    # any OS but Debian always got the CentOS (systemd) commands
+    services = get_service_manager(SERVICE_TIMEOUT) or SystemdServiceManager(SERVICE_TIMEOUT)
 
-    check_for_installation(osType)
+    check_for_installation(services)
     time.sleep(10)
 
-    change_content_in_files('/etc/hosts', '::1	        localhost ip6-localhost ip6-loopback',
+    change_content_in_files(HOSTS_FILE, '::1	        localhost ip6-localhost ip6-loopback',
                             '::1	        ip6-localhost ip6-loopback')
     change_content_in_files(
-        '/etc/glops/glops.ini', 'Listen = "[::1]:110,127.0.0.1:110"', 'Listen = "127.0.0.1:110"')
+        GLOPS_INI, 'Listen = "[::1]:110,127.0.0.1:110"', 'Listen = "127.0.0.1:110"')
 
     if osType == 0: #Debian
         print('Modifying permissions to neolane')
-        os.chown('/etc/default/camp-glops', neolane_uid, neolane_gid)
+        os.chown(CAMP_GLOPS_DEFAULTS, neolane_uid, neolane_gid)
         print('Modified permissions')
 
     not_healthy = check_mailbox_status()
     if not_healthy:
-        if osType == 0:
-            command = ["/etc/init.d/camp-glops restart"]
-        else:
-            command = ["systemctl restart camp-glops.service"]
-        stdout, stderr = run_commands(command)
-        #print('stdout', stdout, 'error', stderr)
+        set_action("restart camp-glops and inMail (mailboxes not healthy)")
+        states, stderr = services.apply([("restart", "camp-glops")])
+        #print('states', states, 'error', stderr)
         restart_inMail()
 
-    hostname = get_hostname_new()
-    command = ['ls /usr/local/neolane/nl*/conf/config-'+hostname+'.xml']
-    stdout, stderr = run_commands(command)
-   # print(stdout)
-    #print(stderr)
     print('Before updating inmail config file')
 
-    for file in stdout.split("\n"):
-        #print(file)
-        if hostname in file:
-            change_content_in_files(file,
-                            '<inMail autoStart="true"',
-                            '<inMail autoStart="true" maxMsgPerSession="3000" popMailPeriodSec="5" popQueueSize="200" user="neolane"/>',
-                            1)
-            print('After updating inmail config file')
+    paths = [instance.path for instance in map(get_host_profile().get, get_inmail_instances()) if instance is not None]
+    for path in paths:
+        change_content_in_files(path,
+                        '<inMail autoStart="true"',
+                        '<inMail autoStart="true" maxMsgPerSession="3000" popMailPeriodSec="5" popQueueSize="200" user="neolane"/>',
+                        1)
+    if paths:
+        get_host_profile(refresh=True)
+        invalidate_probes()
+        print('After updating inmail config file')
 
     # Now we check the throughput after 90 secs.
     #time.sleep(60)
@@ -413,31 +388,31 @@ if __name__ == '__main__':
         #restart_inMail()
 
     print('Restarting campglops and inmail')
-    if osType == 0:
-        command = ["/etc/init.d/camp-glops restart"]
-    else:
-        command = ["systemctl restart camp-glops.service"]
-
-    stdout,stderr = run_commands(command)
+    set_action("restart camp-glops and inMail")
+    states, stderr = services.apply([("restart", "camp-glops")])
     restart_inMail()
     # Now we check the throughput periodically until 1.5 mins.
     throughput = check_throughput()
-    command = ["camp-glops -check -check-details"]
-    stdout, stderr = run_commands(command)
+    if isinstance(throughput, int):
+        add_metric("throughput", throughput)
+    command = ["camp-glops", "-check", "-check-details"]
+    matched, stdout, stderr = stream_command(command, mailbox_ok, timeout=CHECK_TIMEOUT)
     #print(stdout)
     time.sleep(15)
     elapsed_time = 15
     while elapsed_time < 90:
-        if "Mailbox(es) are ok" in stdout:
+        if matched:
             logger.info("Mailboxes are healthy")
             print("Mailboxes are healthy, exiting")
+            mark_healthy()
             sys.exit(0)
         else:
-            stdout, stderr = run_commands(command)
+            matched, stdout, stderr = stream_command(command, mailbox_ok, timeout=CHECK_TIMEOUT)
             #print(stdout)
             time.sleep(15)
             elapsed_time += 15
     else:
+        set_result("not_healthy")
         throughput = check_throughput()
         logger.exception("timeout for waiting")
         print("Mail size is too big, mails are processing, Current Throughput is {}.Exiting script".format(throughput))
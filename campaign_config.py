@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+"""
+In-process reader for the Campaign config-*.xml files
+Parses every instance config once per run and hands out a host profile
+(instance names, db login/name, autoStart flags, inMail settings) instead
+of cat | grep | awk pipelines.
+Requirements: glob, os, xml.etree.ElementTree, dataclasses
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import glob
+import logging
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import asdict, dataclass, field
+
+import transcript
+
+NEOLANE_ROOT = os.environ.get("ONCALL_NEOLANE_ROOT", "/usr/local/neolane")
+NEOLANE_HOME_GLOB = NEOLANE_ROOT + "/nl*"
+CONFIG_GLOB = NEOLANE_HOME_GLOB + "/conf/config-*.xml"
+SKIPPED_CONFIGS = ("default",)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InstanceConfig:
+    """Settings of one Campaign instance, from conf/config-<name>.xml"""
+    name: str
+    path: str
+    db_login: str = ""
+    db_name: str = ""
+    db_server: str = ""
+    auto_start: dict = field(default_factory=dict)
+    inmail: dict = None
+
+    @property
+    def auto_started(self):
+        """True when at least one module of the instance has autoStart="true" """
+        return any(self.auto_start.values())
+
+
+@dataclass
+class HostProfile:
+    """All Campaign instances configured on this host"""
+    instances: list = field(default_factory=list)
+
+    @property
+    def instance_names(self):
+        return [instance.name for instance in self.instances]
+
+    @property
+    def instance_name(self):
+        """Name of the first instance, empty string if there is none"""
+        return self.instances[0].name if self.instances else ""
+
+    @property
+    def db_name(self):
+        """Database of the first instance, empty string if there is none"""
+        return self.instances[0].db_name if self.instances else ""
+
+    @property
+    def started_instance_names(self):
+        """Instances with autoStart modules, leaving out the seczo ones"""
+        return [instance.name for instance in self.instances
+                if instance.auto_started and "seczo" not in instance.name.lower()]
+
+    def get(self, name):
+        """Returns the InstanceConfig called name, None if not on this host"""
+        for instance in self.instances:
+            if instance.name == name:
+                return instance
+        return None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([InstanceConfig(**instance) for instance in data["instances"]])
+
+
+def instance_name_from_path(path):
+    """config-<name>.xml -> <name>"""
+    base = os.path.basename(path)
+    return base[len("config-"):-len(".xml")]
+
+
+def parse_instance_config(path):
+    """Parses one config-<name>.xml
+
+    Args:
+        path (str): path of the config file
+
+    Returns:
+        InstanceConfig
+    """
+    instance = InstanceConfig(name=instance_name_from_path(path), path=path)
+    root = ET.parse(path).getroot()
+
+    connections = [element for element in root.iter("dbcnx") if element.get("login")]
+    if connections:
+        # the default data source is the instance database, extra ones are external accounts
+        connection = connections[0]
+        for data_source in root.iter("dataSource"):
+            if data_source.get("name") == "default":
+                defaults = [element for element in data_source.iter("dbcnx") if element.get("login")]
+                if defaults:
+                    connection = defaults[0]
+                break
+        instance.db_login = connection.get("login")
+        instance.db_name = instance.db_login.split(":")[0].strip()
+        instance.db_server = connection.get("server", "")
+
+    for element in root.iter():
+        if "autoStart" in element.attrib:
+            instance.auto_start[element.tag] = element.get("autoStart").lower() == "true"
+
+    inmail = root.find(".//inMail")
+    if inmail is not None:
+        instance.inmail = dict(inmail.attrib)
+
+    return instance
+
+
+def load_host_profile(pattern=CONFIG_GLOB):
+    """Globs and parses every instance config on the host
+
+    Args:
+        pattern (str): glob of the config files
+
+    Returns:
+        HostProfile
+    """
+    profile = HostProfile()
+    for path in sorted(glob.glob(pattern)):
+        if instance_name_from_path(path) in SKIPPED_CONFIGS:
+            continue
+        try:
+            profile.instances.append(parse_instance_config(path))
+        except (ET.ParseError, OSError):
+            logger.exception("error in parsing %s", path)
+    return profile
+
+
+_profiles = {}
+
+
+def get_host_profile(pattern=CONFIG_GLOB, refresh=False):
+    """Returns the host profile, parsing the configs only the first time
+
+    Args:
+        pattern (str): glob of the config files
+        refresh (bool): parse again, e.g. after a config file was edited
+
+    Returns:
+        HostProfile
+    """
+    if refresh or pattern not in _profiles:
+        _profiles[pattern] = transcript.call("config", [pattern], lambda: load_host_profile(pattern),
+                                             asdict, HostProfile.from_dict)
+    return _profiles[pattern]
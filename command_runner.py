@@ -0,0 +1,513 @@
+#!/usr/bin/python3
+"""
+Shared command runner used by the oncall scripts
+Keeps one long-lived bash session per run and frames every batch of
+commands with sentinels so stdout, stderr and exit code stay separate.
+Every runner takes a timeout, and the whole run can be given a budget
+(set_run_budget or ONCALL_RUN_BUDGET seconds) that caps all of them. A
+command that runs out of time is killed with its whole process group
+(bash, sudo, nlserver, ...) and reported as timed out instead of hanging.
+Every call goes through the transcript, so runs can be recorded and replayed.
+Requirements: subprocess, selectors, signal, tempfile, uuid, threading, atexit
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import atexit
+import functools
+import os
+import selectors
+import shlex
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+
+import tracing
+import transcript
+
+BASH = "/bin/bash"
+RUN_BUDGET_ENV = "ONCALL_RUN_BUDGET"
+# a batch given no timeout still can't hold the session forever
+SESSION_TIMEOUT = 1800
+
+_run_deadline = None
+
+
+@dataclass
+class CommandResult:
+    """Outcome of a command, returncode is None when it timed out"""
+    stdout: str
+    stderr: str
+    returncode: int = None
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def set_run_budget(seconds):
+    """Caps the time left for every command of this run
+
+    Args:
+        seconds (float): budget from now on, None removes it
+    """
+    global _run_deadline
+    _run_deadline = None if seconds is None else time.monotonic() + seconds
+
+
+def remaining_budget():
+    """Seconds left of the run budget, None when there is no budget"""
+    if _run_deadline is None:
+        return None
+    return max(0.0, _run_deadline - time.monotonic())
+
+
+def effective_timeout(timeout):
+    """The smaller of timeout and the remaining run budget, None if neither is set"""
+    remaining = remaining_budget()
+    if remaining is None:
+        return timeout
+    if timeout is None:
+        return remaining
+    return min(timeout, remaining)
+
+
+def timeout_message(timeout, command):
+    """stderr reported for a command that ran out of time"""
+    if isinstance(command, (list, tuple)):
+        command = " ".join(str(part) for part in command)
+    return "timed out after {:g} secs: {}".format(timeout, command)
+
+
+def _budget_exhausted(command):
+    return CommandResult("", "run budget exhausted, not started: {}".format(
+        " ".join(command) if isinstance(command, (list, tuple)) else command), None, True)
+
+
+class ShellSession:
+    """Long-lived bash process that runs batches of commands.
+
+    Every batch runs in a subshell with stdin from /dev/null, so a `cd`,
+    `exit` or `source` inside one batch does not leak into the next one,
+    exactly like the old fresh `/bin/bash` per call. The batch reaches the
+    subshell as one quoted argument of eval, so an unbalanced quote or an
+    unterminated heredoc is a syntax error of that batch (exit code 2)
+    rather than something that swallows the rest of the session's input.
+    After the batch the session prints a unique sentinel (with the exit
+    code) on stdout and on stderr, which is how the reader knows the batch
+    is done.
+    """
+
+    def __init__(self, shell=BASH):
+        self.shell = shell
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Starts the bash process if it is not already running"""
+        if self.process is not None and self.process.poll() is None:
+            return
+        self.process = subprocess.Popen([self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0, start_new_session=True)
+
+    def close(self):
+        """Stops the bash process"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+        for stream in (self.process.stdout, self.process.stderr):
+            stream.close()
+        self.process = None
+
+    def run(self, commands, timeout=None):
+        """Runs a batch of commands in the session
+
+        When the batch runs past timeout the whole session (bash and every
+        process the batch started) is killed; the next batch gets a new one.
+
+        Args:
+            commands (list): list of commands to execute
+            timeout (float): seconds to wait for the batch, None waits SESSION_TIMEOUT
+
+        Returns:
+            CommandResult: returncode is None if the batch timed out or the session died
+        """
+        started = time.monotonic()
+        with self.lock:
+            self.start()
+            sentinel = "__ONCALL_" + uuid.uuid4().hex + "__"
+            script = "( eval " + shlex.quote("\n".join(commands)) + " ) < /dev/null\n" \
+                     "__oncall_rc=$?\n" \
+                     "printf '\\n%s:%d\\n' '" + sentinel + "' \"$__oncall_rc\"\n" \
+                     "printf '\\n%s\\n' '" + sentinel + "' >&2\n"
+            try:
+                self.process.stdin.write(script.encode())
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                self.close()
+                self.start()
+                self.process.stdin.write(script.encode())
+                self.process.stdin.flush()
+            if timeout is None:
+                timeout = SESSION_TIMEOUT
+            stdout, stderr, returncode, timed_out = self._read_frame(sentinel, started + timeout)
+        if timed_out:
+            stderr += timeout_message(timeout, commands)
+        return CommandResult(stdout, stderr, returncode, timed_out, time.monotonic() - started)
+
+    def _read_frame(self, sentinel, deadline=None):
+        """Reads stdout and stderr until both sentinels show up or the deadline passes"""
+        out_marker = ("\n" + sentinel + ":").encode()
+        err_marker = ("\n" + sentinel + "\n").encode()
+        buffers = {self.process.stdout: b"", self.process.stderr: b""}
+        pending = set(buffers)
+        returncode = None
+        timed_out = False
+
+        selector = selectors.DefaultSelector()
+        for stream in pending:
+            selector.register(stream, selectors.EVENT_READ)
+        try:
+            while pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    break
+                for key, _ in selector.select(remaining):
+                    stream = key.fileobj
+                    chunk = os.read(stream.fileno(), 65536)
+                    if not chunk:
+                        # bash went away, keep what we have and restart next time
+                        selector.unregister(stream)
+                        pending.discard(stream)
+                        continue
+                    buffers[stream] += chunk
+                    if stream is self.process.stdout:
+                        index = buffers[stream].find(out_marker)
+                        if index != -1 and buffers[stream].endswith(b"\n"):
+                            tail = buffers[stream][index + len(out_marker):]
+                            returncode = int(tail.strip() or -1)
+                            buffers[stream] = buffers[stream][:index]
+                            selector.unregister(stream)
+                            pending.discard(stream)
+                    elif buffers[stream].endswith(err_marker):
+                        buffers[stream] = buffers[stream][:-len(err_marker)]
+                        selector.unregister(stream)
+                        pending.discard(stream)
+        finally:
+            selector.close()
+
+        stdout, stderr = buffers.values()
+        if timed_out:
+            _kill_group(self.process)
+        if returncode is None:
+            self.close()
+        return stdout.decode(errors="replace"), stderr.decode(errors="replace"), returncode, timed_out
+
+
+_session = ShellSession()
+atexit.register(_session.close)
+
+if os.environ.get(RUN_BUDGET_ENV):
+    set_run_budget(float(os.environ[RUN_BUDGET_ENV]))
+
+_probe_cache = {}
+_invalidation_callbacks = []
+
+
+def get_session():
+    """Returns the shell session shared by the whole run"""
+    return _session
+
+
+def run_commands_result(commands, timeout=None):
+    """Runs unix commands in the shared bash session under the run budget
+
+    Args:
+        commands (list): list of commands to execute
+        timeout (float): seconds allowed for the batch, None waits up to SESSION_TIMEOUT
+
+    Returns:
+        CommandResult: output, exit code and whether it timed out
+    """
+    timeout = effective_timeout(timeout)
+    if timeout is not None and timeout <= 0:
+        return _budget_exhausted(commands)
+    return transcript.call("shell", list(commands), lambda: _session.run(commands, timeout),
+                           asdict, CommandResult.from_dict)
+
+
+def run_commands(commands, timeout=None):
+    """Runs unix commands in the shared bash session
+
+    Args:
+        commands (list): list of commands to execute
+        timeout (float): seconds allowed for the batch, None waits up to SESSION_TIMEOUT;
+            on timeout stderr says so
+
+    Returns:
+        stdout: output of the commands
+        stderr: standard error if any
+    """
+    result = run_commands_result(commands, timeout)
+    return result.stdout, result.stderr
+
+
+def memoize_probe(func):
+    """Remembers the result of an idempotent discovery function for the run
+
+    Decorate probes like db name, instance name or pdump lookups so that
+    calling them again (once per PID, once per step, ...) costs nothing.
+    Empty results are not remembered, so a failed probe is tried again.
+    Call invalidate_probes() after an action that changes what they report.
+    """
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__module__, func.__qualname__, args)
+        if key in _probe_cache:
+            return _probe_cache[key]
+        result = func(*args)
+        if result:
+            _probe_cache[key] = result
+        return result
+    return wrapper
+
+
+def on_invalidate(callback):
+    """Registers a function to call from invalidate_probes, for other per-run caches"""
+    _invalidation_callbacks.append(callback)
+
+
+def invalidate_probes():
+    """Forgets every memoized probe, e.g. after a restart or a config change"""
+    _probe_cache.clear()
+    for callback in _invalidation_callbacks:
+        callback()
+
+
+def run_process(argv, timeout=None, **popen_kwargs):
+    """Runs a program in its own process group under the run budget
+
+    On timeout the whole group is terminated, so children of the program
+    (sudo -> bash -> nlserver, psql pagers, ...) don't outlive it.
+
+    Args:
+        argv (list): program and its arguments
+        timeout (float): seconds to wait, None waits forever
+        popen_kwargs: extra subprocess.Popen arguments (env, cwd, user, ...)
+
+    Returns:
+        CommandResult: returncode 127 if it could not be started, None if it timed out
+    """
+    timeout = effective_timeout(timeout)
+    if timeout is not None and timeout <= 0:
+        return _budget_exhausted(argv)
+    return transcript.call("argv", list(argv), lambda: _run_process(argv, timeout, popen_kwargs),
+                           asdict, CommandResult.from_dict)
+
+
+def _run_process(argv, timeout, popen_kwargs):
+    started = time.monotonic()
+    try:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True,
+                                   start_new_session=True, **popen_kwargs)
+    except OSError as e:
+        return CommandResult("", str(e), 127)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _kill_group(process)
+        stdout, stderr = process.communicate()
+        return CommandResult(stdout, stderr + timeout_message(timeout, argv), None, True,
+                             time.monotonic() - started)
+    return CommandResult(stdout, stderr, process.returncode, False, time.monotonic() - started)
+
+
+def run_argv(argv, env=None, cwd=None, timeout=None):
+    """Runs a single command directly, without going through bash
+
+    Use it for plain invocations (hostnamectl, camp-glops, psql, ...) that
+    don't need pipes, globs or redirections. Nothing is quoted or expanded,
+    so arguments can be passed as they are. Unlike run_commands, output on
+    stderr is not a failure by itself, check returncode instead.
+
+    Args:
+        argv (list): program and its arguments
+        env (dict): environment for the program, defaults to ours
+        cwd (str): working directory for the program
+        timeout (float): seconds to wait, None waits forever
+
+    Returns:
+        stdout: output of the command
+        stderr: standard error if any
+        returncode: exit code of the command, 127 if it could not be started,
+            None if it timed out
+    """
+    result = run_process(argv, timeout, env=env, cwd=cwd)
+    return result.stdout, result.stderr, result.returncode
+
+
+def _kill_group(process):
+    """Terminates the process and everything it started"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(timeout=2)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+def stream_lines(command, timeout=None, env=None, errors=None):
+    """Yields stdout lines of a command as they arrive
+
+    The command gets its own process group. Closing the generator early
+    (break out of the loop) terminates the whole group, so a slow CLI stops
+    as soon as the caller has its answer.
+
+    Args:
+        command (list or str): argv list, or a string run by bash (pipes allowed)
+        timeout (int): stop reading after this many seconds (capped by the run budget)
+        env (dict): environment for the program, defaults to ours
+        errors (list): stderr of the command is appended to it once it is done,
+            with a timed out line if it ran out of time
+
+    Yields:
+        line: one line of stdout without the trailing newline
+    """
+    if transcript.replaying():
+        stream = _replayed_stream_lines(command, errors)
+    elif transcript.recording():
+        stream = _recorded_stream_lines(command, timeout, env, errors)
+    else:
+        stream = _stream_lines(command, timeout, env, errors)
+    transcript.note_call("stream")
+    return _traced_stream_lines(command, stream) if tracing.active() else stream
+
+
+def _traced_stream_lines(command, stream):
+    """Span from the start of the command until the caller stopped reading"""
+    with tracing.span(tracing.describe("stream", command), "stream") as span_args:
+        lines = 0
+        try:
+            for line in stream:
+                lines += 1
+                yield line
+        finally:
+            stream.close()
+            span_args["lines"] = lines
+
+
+def _replayed_stream_lines(command, errors):
+    recorded = transcript.replay("stream", command)
+    if errors is not None:
+        errors.append(recorded["stderr"])
+    yield from recorded["lines"]
+
+
+def _recorded_stream_lines(command, timeout, env, errors):
+    """stream_lines writing the lines read until the caller stopped to the transcript"""
+    started = time.monotonic()
+    lines = []
+    captured = []
+    stream = _stream_lines(command, timeout, env, captured)
+    try:
+        for line in stream:
+            lines.append(line)
+            yield line
+    finally:
+        stream.close()
+        transcript.record("stream", command, {"lines": lines, "stderr": "".join(captured)},
+                          time.monotonic() - started)
+        if errors is not None:
+            errors.extend(captured)
+
+
+def _stream_lines(command, timeout, env, errors):
+    argv = [BASH, "-c", command] if isinstance(command, str) else command
+    timeout = effective_timeout(timeout)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    timed_out = False
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=stderr_file, env=env, start_new_session=True)
+        selector = selectors.DefaultSelector()
+        selector.register(process.stdout, selectors.EVENT_READ)
+        pending = b""
+        try:
+            while True:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    break
+                if not selector.select(remaining):
+                    continue
+                chunk = os.read(process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                for line in lines:
+                    yield line.decode(errors="replace")
+            if pending:
+                yield pending.decode(errors="replace")
+        finally:
+            selector.close()
+            if process.poll() is None:
+                _kill_group(process)
+            process.stdout.close()
+            if errors is not None:
+                stderr_file.seek(0)
+                errors.append(stderr_file.read().decode(errors="replace"))
+                if timed_out:
+                    errors.append(timeout_message(timeout, command))
+
+
+def stream_command(command, predicate, timeout=None, env=None):
+    """Runs a command until one of its stdout lines answers the question
+
+    Args:
+        command (list or str): argv list, or a string run by bash
+        predicate (function): called with every line, True stops the command
+        timeout (int): give up after this many seconds
+        env (dict): environment for the program, defaults to ours
+
+    Returns:
+        line: the first line predicate accepted, None if there was none
+        stdout: every line read, the matching one included
+        stderr: standard error of the command until it stopped
+    """
+    lines = []
+    errors = []
+    matched = None
+    stream = stream_lines(command, timeout=timeout, env=env, errors=errors)
+    try:
+        for line in stream:
+            lines.append(line)
+            if predicate(line):
+                matched = line
+                break
+    finally:
+        stream.close()
+    return matched, "\n".join(lines), "".join(errors)
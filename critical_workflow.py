@@ -1,75 +1,52 @@
 """
 Python wrapper to start/restart rteventprocessing workflow based on Campaign
-Requirements: subprocess,os
+Requirements: pwd, fileinput
 Input: Tenant id, workflow name
 Author: Shivakumar Bommakanti
 Date: 30-03-2023
 """
-import subprocess
-import os
 from pwd import getpwnam
 import argparse
 from argparse import RawTextHelpFormatter
 import fileinput
+from command_runner import run_commands, run_argv, memoize_probe
+from neolane_env import run_nlserver
+from host_facts import campaign_product
+from campaign_config import get_host_profile, CONFIG_GLOB
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args
 
 neolane_uid = getpwnam('neolane').pw_uid
 neolane_gid = getpwnam('neolane').pw_gid
 
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
+@memoize_probe
 def get_hostname_new():
-    """Gets the hostname from predefined commands new/updated
+    """Gets the instance name from the Campaign config
 
     Returns:
         hostname: string
     """
-    hostname = ""
-    stdout, stderr = run_commands(
-        ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default | cut -d. -f1 | cut -d'-' -f2"])
-    if stderr:
+    hostname = get_host_profile().instance_name
+    if not hostname:
         print("error in fetching hostname")
-    else:
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return hostname
 
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         print("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
 def _is_is_ACC_or_ACS():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump -full web'"]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = campaign_product()
     return stdout, stderr
 
 def create_file(file_path, data):
@@ -83,15 +60,14 @@ def create_file(file_path, data):
 def run_workflow(instance_id):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver javascript -instance:{} -file /tmp/start_workflow.js'".format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file", "/tmp/start_workflow.js"])
     return stdout, stderr
 
 def _get_instance_name():
-    commands = ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default |cut -d. -f1 |cut -d'-' -f2"]
-    stdout, stderr = run_commands(commands)
-    return stdout, stderr
+    instance_name = get_host_profile().instance_name
+    if not instance_name:
+        return "", "no Campaign instance config found under " + CONFIG_GLOB
+    return instance_name, ""
 
 def check_ulimit_files():
     update_count = 0
@@ -134,17 +110,15 @@ def check_for_failed_workflows(query_param, workflow_name):
     :rtype: Std output and error
     """
     dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select istatus, ifailed from xtkworkflow where {}='{}';\"".format(query_param, workflow_name);
+    sql_retrieve_command = ["psql", "-d", dbname, "-c",
+                            "select istatus, ifailed from xtkworkflow where {}='{}';".format(query_param, workflow_name)]
     print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+    stdout, stderr, returncode = run_argv(sql_retrieve_command)
     print(stderr)
     return stdout, stderr
 
 def uncoditional_stop(instance_id):
-    run_workflow_command = "/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver javascript -instance:{} -file /tmp/stop_workflow.js'".format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file", "/tmp/stop_workflow.js"])
     return stdout, stderr
 
 if __name__ == '__main__':
@@ -159,8 +133,12 @@ if __name__ == '__main__':
     #required_parser.add_argument("-ti", "--tenant_id", help="Tenant ID")
     required_parser.add_argument("-wn", "--workflow_name", help="Workflow Name")
 
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     check, count = check_ulimit_files()
 
@@ -1,76 +1,59 @@
 """
 Python wrapper to start/restart rteventprocessing workflow based on Campaign
-Requirements: subprocess,os
+Requirements: os
 Input: Tenant id, workflow name
 Author: Shivakumar Bommakanti
 Date: 20-06-2023
 """
-import subprocess
 import os
 from pwd import getpwnam
 import argparse
 from argparse import RawTextHelpFormatter
 import fileinput
 import time
-
-neolane_uid = getpwnam('neolane').pw_uid
-neolane_gid = getpwnam('neolane').pw_gid
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
+from command_runner import run_commands, memoize_probe
+from database import query
+from neolane_env import run_nlserver, NEOLANE_USER
+from host_facts import campaign_product
+from campaign_config import get_host_profile, CONFIG_GLOB, NEOLANE_ROOT
+from instances import add_instance_arguments, select_instances, run_per_instance
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args, set_action, mark_healthy, set_result
+
+neolane_uid = getpwnam(NEOLANE_USER).pw_uid
+neolane_gid = getpwnam(NEOLANE_USER).pw_gid
+
+PSQL_TIMEOUT = 120
+OUTPUT_LIST = ['Not Started', 'In Progress', '', 'Suspended', 'Stopping', 'Finished']
+
+@memoize_probe
 def get_hostname_new():
-    """Gets the hostname from predefined commands new/updated
+    """Gets the instance name from the Campaign config
 
     Returns:
         hostname: string
     """
-    hostname = ""
-    stdout, stderr = run_commands(
-        ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default | cut -d. -f1 | cut -d'-' -f2"])
-    if stderr:
+    hostname = get_host_profile().instance_name
+    if not hostname:
         print("error in fetching hostname")
-    else:
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return hostname
 
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         print("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
 def _is_is_ACC_or_ACS():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump -full web'"]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = campaign_product()
     return stdout, stderr
 
 def create_file(file_path, data):
@@ -84,15 +67,14 @@ def create_file(file_path, data):
 def run_workflow(instance_id):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver javascript -instance:{} -file /tmp/start_workflow.js'".format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file", "/tmp/start_workflow.js"])
     return stdout, stderr
 
 def _get_instance_name():
-    commands = ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default |cut -d. -f1 |cut -d'-' -f2"]
-    stdout, stderr = run_commands(commands)
-    return stdout, stderr
+    instance_name = get_host_profile().instance_name
+    if not instance_name:
+        return "", "no Campaign instance config found under " + CONFIG_GLOB
+    return instance_name, ""
 
 def check_ulimit_files():
     update_count = 0
@@ -125,28 +107,103 @@ def check_ulimit_files():
     else:
         return False, update_count
 
-def check_for_failed_workflows(query_param, workflow_name):
+def check_for_failed_workflows(query_param, workflow_name, dbname=None):
     """This will return all critical failed workflows for you.
 
-    Args: None
+    Args:
+        query_param (str): name column of xtkworkflow, sinternalname or snamesinternalname
 
-    Return output which contains status and error if any
-    :rtype: Std output and error
+    Return rows (istatus, ifailed) of the workflow and error if any
+    :rtype: rows and error
     """
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select istatus, ifailed from xtkworkflow where {}='{}';\"".format(query_param, workflow_name);
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+    dbname = dbname or get_db_name()
+    # a column name can't be a parameter, it is one of the two above
+    sql = "select istatus, ifailed from xtkworkflow where {} = %s;".format(query_param)
+    print(sql, workflow_name)
+    rows, stderr = query(sql, (workflow_name,), dbname, timeout=PSQL_TIMEOUT)
     print(stderr)
-    return stdout, stderr
+    return rows, stderr
 
 def uncoditional_stop(instance_id):
-    run_workflow_command = "/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver javascript -instance:{} -file /tmp/stop_workflow.js'".format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file", "/tmp/stop_workflow.js"])
     return stdout, stderr
 
+def get_workflow_status(query_param, workflow_name, dbname=None):
+    """istatus of the workflow, None if it isn't found"""
+    rows, stderr = check_for_failed_workflows(query_param, workflow_name, dbname)
+    # if stderr:
+    #     print(stderr)
+    #     exit(1)
+    print("rows", rows)
+    if rows:
+        return rows[-1].istatus
+    return None
+
+def restart_workflow(instance_name, dbname, query_param, workflow_name):
+    """Starts the failed workflow on the instance, kills and starts it if that didn't help"""
+    print('Issue with '+workflow_name+' on '+instance_name+' attempting to restart')
+    set_action("restart workflow " + workflow_name + " on " + instance_name)
+    data = """var a = ["""+workflow_name+""""]
+    a.forEach(function(entry) {
+        countWkf=sqlGetInt("Select count(*) from xtkworkflow where """ + query_param + """='" + entry + "' and ifailed=1")
+        if (countWkf != 0){
+            xtk.workflow.Start(entry)
+        }
+    });"""
+
+    create_file(NEOLANE_ROOT + "/start_workflow.js", data)
+    os.chmod(NEOLANE_ROOT + "/start_workflow.js", 0o777)
+    print("workflow file created")
+
+    stdout, stderr = run_workflow(instance_name)
+    # if stderr:
+    #     print(stderr)
+    #     exit(1)
+    print(stdout)
+
+    output = get_workflow_status(query_param, workflow_name, dbname)
+    if output is None:
+        return
+    print('Again Status of workflow -> {} is {}({}'.format(workflow_name, OUTPUT_LIST[output], output))
+    if output in (1, 5):
+        mark_healthy()
+        return
+
+    print('Restarting '+workflow_name+' failed. Proceeding with unconditional stop')
+    set_action("unconditional stop and start of workflow " + workflow_name + " on " + instance_name)
+    unconditional_data = """var a = ["""+workflow_name+"""]
+                    a.forEach(function(entry) {
+                        countWkf=sqlGetInt("Select count(*) from xtkworkflow where """ + query_param + """='" + entry + "' and ifailed=1")
+                        if (countWkf != 0){
+                            xtk.workflow.Kill(entry)
+                        }
+                    });"""
+    create_file(NEOLANE_ROOT + "/stop_workflow.js", unconditional_data)
+    os.chmod(NEOLANE_ROOT + "/stop_workflow.js", 0o777)
+    print("workflow file stop created")
+    stdout, stderr = uncoditional_stop(instance_name)
+    print(stdout)
+    # if stderr:
+    #     print(stderr)
+    #     exit(1)
+
+    print('After unconditional stop, now starting workflow')
+    stdout, stderr = run_workflow(instance_name)
+    # if stderr:
+    #     print(stderr)
+    #     exit(1)
+    print(stdout)
+    print('Waiting for 30 seconds to recheck status')
+    time.sleep(30)
+    print('After waiting')
+    output = get_workflow_status(query_param, workflow_name, dbname)
+    if output is not None:
+        print('At last Status of workflow -> {} is {}({}'.format(workflow_name, OUTPUT_LIST[output], output))
+        if output in (1, 5):
+            mark_healthy()
+        else:
+            set_result("not_healthy")
+
 if __name__ == '__main__':
 
     exe_process = """
@@ -158,9 +215,14 @@ if __name__ == '__main__':
     required_parser = parser.add_argument_group('required arguments')
     #required_parser.add_argument("-ti", "--tenant_id", help="Tenant ID")
     required_parser.add_argument("-wn", "--workflow_name", help="Workflow Name")
+    add_instance_arguments(parser)
 
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     # check, count = check_ulimit_files()
     #
@@ -183,88 +245,23 @@ if __name__ == '__main__':
     else:
         query_param = "sinternalname"
 
-    stdout, stderr = check_for_failed_workflows(query_param, workflow_name)
-    # if stderr:
-    #     print(stderr)
-    #     exit(1)
-    print("stdout " + stdout)
-    output = stdout.splitlines()
-    if len(output) > 4:
-        output = int(output[-3].strip().split('|')[0].strip())
-        output_list = ['Not Started', 'In Progress', '', 'Suspended', 'Stopping', 'Finished']
-        print('Status of workflow -> {} is {}({}'.format(workflow_name, output_list[output], output))
-        if output != 1 and output != 5:
-            print('Issue with '+workflow_name+' attempting to restart')
-            data = """var a = ["""+workflow_name+""""]
-            a.forEach(function(entry) {
-                countWkf=sqlGetInt("Select count(*) from xtkworkflow where """ + query_param + """='" + entry + "' and ifailed=1")
-                if (countWkf != 0){
-                    xtk.workflow.Start(entry)
-                }
-            });"""
-
-            create_file("/usr/local/neolane/start_workflow.js", data)
-            os.chmod("/usr/local/neolane/start_workflow.js", 0o777)
-            print("workflow file created")
-
-            stdout, stderr = _get_instance_name()
-            # if stderr:
-            #     print(stderr)
-            #     exit(1)
-            instance_name = stdout.strip().strip("\n").strip("\t")
-
-            stdout, stderr = run_workflow(instance_name)
-            # if stderr:
-            #     print(stderr)
-            #     exit(1)
-            print(stdout)
-
-            stdout, stderr = check_for_failed_workflows(query_param, workflow_name)
-            # if stderr:
-            #     print(stderr)
-            #     exit(1)
-            print("stdout " + stdout)
-            output = stdout.splitlines()
-            if len(output) > 4:
-                output = int(output[-3].strip().split('|')[0].strip())
-                print('Again Status of workflow -> {} is {}({}'.format(workflow_name, output_list[output], output))
-                if output != 1 and output != 5:
-                    print('Restarting '+workflow_name+' failed. Proceeding with unconditional stop')
-                    unconditional_data = """var a = ["""+workflow_name+"""]
-                                    a.forEach(function(entry) {
-                                        countWkf=sqlGetInt("Select count(*) from xtkworkflow where """ + query_param + """='" + entry + "' and ifailed=1")
-                                        if (countWkf != 0){
-                                            xtk.workflow.Kill(entry)
-                                        }
-                                    });"""
-                    create_file("/usr/local/neolane/stop_workflow.js", unconditional_data)
-                    os.chmod("/usr/local/neolane/stop_workflow.js", 0o777)
-                    print("workflow file stop created")
-                    stdout, stderr = uncoditional_stop(instance_name)
-                    print(stdout)
-                    # if stderr:
-                    #     print(stderr)
-                    #     exit(1)
-
-                    print('After unconditional stop, now starting workflow')
-                    stdout, stderr = run_workflow(instance_name)
-                    # if stderr:
-                    #     print(stderr)
-                    #     exit(1)
-                    print(stdout)
-                    print('Waiting for 30 seconds to recheck status')
-                    time.sleep(30)
-                    print('After waiting')
-                    stdout, stderr = check_for_failed_workflows(query_param, workflow_name)
-                    print(stdout)
-                    # if stderr:
-                    #     print(stderr)
-                    #     exit(1)
-                    output = stdout.splitlines()
-                    if len(output) > 4:
-                        output = int(output[-3].strip().split('|')[0].strip())
-                        print('At last Status of workflow -> {} is {}({}'.format(workflow_name, output_list[output],
-                                                                               output))
+    instances, stderr = select_instances(args.get('instance'))
+    if stderr:
+        print(stderr)
+
+    # the status checks of all instances run together, restarts go one instance at a time
+    statuses = run_per_instance(
+        lambda instance: get_workflow_status(query_param, workflow_name, instance.db_name), instances)
+    for instance, status, error in statuses:
+        if error is not None:
+            print('Checking {} on {} failed - {}'.format(workflow_name, instance.name, error))
+            continue
+        if status is None:
+            print('Status of workflow -> {} on {} is unknown'.format(workflow_name, instance.name))
+            continue
+        print('Status of workflow -> {} on {} is {}({}'.format(workflow_name, instance.name, OUTPUT_LIST[status], status))
+        if status != 1 and status != 5:
+            restart_workflow(instance.name, instance.db_name, query_param, workflow_name)
     #         else:
     #             print("No issue with " + workflow_name)
     #     else:
@@ -0,0 +1,401 @@
+#!/usr/bin/python3
+"""
+PostgreSQL access for the oncall scripts: parameterized queries, typed rows
+One connection per database is opened for the whole run and reused by
+every query (a daemon asks for a pool of them instead), so a query costs a
+round trip rather than a psql process start plus authentication. Values
+are passed as parameters (%s or %(name)s, psycopg2 style), never pasted
+into SQL strings by the caller, and rows come back as named tuples with
+Python types (ints, bools, datetimes, ...).
+
+    rows, stderr = query("select pid, state from pg_stat_activity where datname = %s;", (dbname,), dbname)
+    for row in rows:
+        print(row.pid, row.state)
+
+psycopg2 is used when it is installed. Without it (or with
+ONCALL_DB_DRIVER=psql) every query runs through psql: the parameters are
+quoted here and the rows come back as JSON, so callers get the same rows,
+only timestamps and intervals stay strings. Every query goes through the
+transcript as a "sql" call.
+Requirements: psycopg2 (optional), json, threading
+Input: ONCALL_DB_DRIVER (psycopg2 or psql)
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import atexit
+import collections
+import datetime
+import json
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+import transcript
+from campaign_config import get_host_profile
+from command_runner import effective_timeout, run_argv, timeout_message
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+DRIVER_ENV = "ONCALL_DB_DRIVER"
+PSYCOPG2 = "psycopg2"
+PSQL = "psql"
+APPLICATION_NAME = "oncall-automation"
+CONNECT_TIMEOUT = 10
+QUERY_TIMEOUT = 120
+PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+# INSERT 0 3, UPDATE 3, DELETE 0, ... as printed by psql
+COMMAND_TAG = re.compile(r"^[A-Z][A-Z ]*? (?:\d+ )?(\d+)$")
+
+_databases = {}
+_databases_lock = threading.Lock()
+_row_types = {}
+
+
+class DatabaseError(Exception):
+    """A statement could not be run (bad parameters, no connection, ...)"""
+
+
+@dataclass
+class QueryResult:
+    """Outcome of a statement: its rows, the rows affected and the error if any"""
+    columns: list = field(default_factory=list)
+    rows: list = field(default_factory=list)
+    rowcount: int = -1
+    error: str = ""
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.error
+
+    def encode(self):
+        """JSON-able form, for the transcript"""
+        return {"columns": self.columns, "rows": [list(row) for row in self.rows], "rowcount": self.rowcount,
+                "error": self.error, "timed_out": self.timed_out, "elapsed": self.elapsed}
+
+    @classmethod
+    def decode(cls, data):
+        data = dict(data)
+        data["rows"] = make_rows(data["columns"], data["rows"])
+        return cls(**data)
+
+
+def make_rows(columns, values):
+    """Named tuples of the values, fields named after the columns (row.pid, row[0])"""
+    columns = tuple(columns)
+    row_type = _row_types.get(columns)
+    if row_type is None:
+        # count(*) and friends give names that aren't identifiers, rename=True makes them _0, _1, ...
+        row_type = _row_types[columns] = collections.namedtuple("Row", columns, rename=True)
+    return [row_type(*row) for row in values]
+
+
+def literal(value):
+    """SQL literal of a Python value, the way psycopg2 adapts it
+
+    Raises:
+        DatabaseError: the value can't be passed (NUL in a string, unknown type)
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return repr(value)
+        return "'{}'::float8".format("NaN" if math.isnan(value) else "Infinity" if value > 0 else "-Infinity")
+    if isinstance(value, tuple):
+        # psycopg2 turns tuples into lists for IN (...)
+        if not value:
+            raise DatabaseError("an empty tuple can't be used for IN ()")
+        return "(" + ", ".join(literal(item) for item in value) + ")"
+    if isinstance(value, list):
+        return "ARRAY[" + ", ".join(literal(item) for item in value) + "]"
+    if isinstance(value, datetime.timedelta):
+        return "'{} seconds'::interval".format(value.total_seconds())
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        value = value.isoformat()
+    if not isinstance(value, str):
+        raise DatabaseError("can't pass {} as an SQL parameter".format(type(value).__name__))
+    if "\x00" in value:
+        raise DatabaseError("NUL character in an SQL parameter")
+    # standard_conforming_strings is forced on for psql runs, backslashes are plain characters
+    return "'" + value.replace("'", "''") + "'"
+
+
+def interpolate(sql, params):
+    """sql with its %s / %(name)s placeholders replaced by the quoted params
+
+    As with psycopg2, % must be written %% when params are given, and sql is
+    left alone when params is None.
+    """
+    if params is None:
+        return sql
+    positional = iter(params) if isinstance(params, (list, tuple)) else None
+
+    def replace(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1) is not None:
+            if positional is not None or match.group(1) not in params:
+                raise DatabaseError("no parameter named {}".format(match.group(1)))
+            return literal(params[match.group(1)])
+        if positional is None:
+            raise DatabaseError("%s placeholder with named parameters")
+        try:
+            return literal(next(positional))
+        except StopIteration:
+            raise DatabaseError("not enough parameters for the query")
+
+    text = PLACEHOLDER.sub(replace, sql)
+    if positional is not None and next(positional, PLACEHOLDER) is not PLACEHOLDER:
+        raise DatabaseError("more parameters than placeholders in the query")
+    return text
+
+
+def default_driver():
+    """psycopg2 when it is installed, else psql; ONCALL_DB_DRIVER overrides it"""
+    driver = os.environ.get(DRIVER_ENV)
+    if driver in (PSYCOPG2, PSQL):
+        return driver
+    return PSYCOPG2 if psycopg2 is not None else PSQL
+
+
+class Database:
+    """Connections to one database, up to pool_size of them open at a time
+
+    A run keeps the default of one connection, used by every query (threads
+    take turns). A daemon serving requests in parallel asks for more.
+    """
+
+    def __init__(self, dbname, pool_size=1, driver=None):
+        self.dbname = dbname
+        self.pool_size = max(1, pool_size)
+        self.driver = driver or default_driver()
+        if self.driver == PSYCOPG2 and psycopg2 is None:
+            raise DatabaseError("psycopg2 is not installed")
+        self._idle = []
+        self._open = 0
+        self._available = threading.Condition()
+
+    def run(self, sql, params=None, timeout=QUERY_TIMEOUT, fetch=True):
+        """Runs one statement (autocommitted) through the transcript
+
+        Args:
+            sql (str): statement with %s or %(name)s placeholders
+            params (tuple or dict): values of the placeholders
+            timeout (float): seconds the statement may take, capped by the run budget
+            fetch (bool): the statement returns rows (select, ... returning)
+
+        Returns:
+            QueryResult
+        """
+        key = [self.dbname, sql, params]
+        return transcript.call("sql", key, lambda: self._run(sql, params, timeout, fetch),
+                               QueryResult.encode, QueryResult.decode)
+
+    def _run(self, sql, params, timeout, fetch):
+        timeout = effective_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return QueryResult(error="run budget exhausted, not run: " + sql, timed_out=True)
+        started = time.monotonic()
+        if self.driver == PSQL:
+            result = self._run_psql(sql, params, timeout, fetch)
+        else:
+            result = self._run_psycopg2(sql, params, timeout)
+        result.elapsed = time.monotonic() - started
+        return result
+
+    def _run_psql(self, sql, params, timeout, fetch):
+        try:
+            text = interpolate(sql, params).strip().rstrip(";")
+        except DatabaseError as e:
+            return QueryResult(error=str(e))
+        if fetch:
+            # the rows come back as one JSON array, typed and free of psql's text layout; json_agg
+            # puts each row after the first on a line of its own, so the array is all of stdout
+            text = "with q as (\n{}\n) select coalesce(json_agg(q), '[]') from q".format(text)
+        argv = ["psql", "-X", "-d", self.dbname, "-A", "-t", "-v", "ON_ERROR_STOP=1", "-c", text]
+        env = dict(os.environ, PGAPPNAME=APPLICATION_NAME, PGCONNECT_TIMEOUT=str(CONNECT_TIMEOUT),
+                   PGOPTIONS="-c standard_conforming_strings=on")
+        stdout, stderr, returncode = run_argv(argv, env=env, timeout=timeout)
+        if returncode is None:
+            return QueryResult(error=timeout_message(timeout, ["psql", sql]), timed_out=True)
+        if returncode != 0:
+            return QueryResult(error=stderr.strip() or "psql exited with {}".format(returncode))
+        if not fetch:
+            lines = [line for line in stdout.splitlines() if line.strip()]
+            tag = COMMAND_TAG.match(lines[-1]) if lines else None
+            return QueryResult(rowcount=int(tag.group(1)) if tag else -1)
+        try:
+            records = json.loads(stdout) if stdout.strip() else []
+        except ValueError:
+            return QueryResult(error="unexpected psql output: " + stdout.strip()[:200])
+        columns = list(records[0]) if records else []
+        return QueryResult(columns, make_rows(columns, [list(record.values()) for record in records]),
+                           len(records))
+
+    def _run_psycopg2(self, sql, params, timeout):
+        try:
+            connection, reused = self._acquire()
+        except psycopg2.Error as e:
+            return QueryResult(error=str(e).strip())
+        try:
+            result = self._execute(connection, sql, params, timeout)
+        except psycopg2.extensions.QueryCanceledError as e:
+            # statement_timeout, the connection is fine
+            self._release(connection)
+            return QueryResult(error=str(e).strip(), timed_out=True)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            self._release(connection, broken=True)
+            if not reused:
+                return QueryResult(error=str(e).strip())
+            # the server dropped a connection that sat idle (restart, idle timeout), try again on a fresh one
+            return self._run_psycopg2(sql, params, timeout)
+        except psycopg2.Error as e:
+            self._release(connection)
+            return QueryResult(error=str(e).strip())
+        self._release(connection)
+        return result
+
+    def _execute(self, connection, sql, params, timeout):
+        milliseconds = 0 if timeout is None else max(1, int(timeout * 1000))
+        with connection.cursor() as cursor:
+            # the server cancels the statement itself, no process to kill
+            if getattr(connection, "oncall_statement_timeout", None) != milliseconds:
+                cursor.execute("SET statement_timeout = %s", (milliseconds,))
+                connection.oncall_statement_timeout = milliseconds
+            cursor.execute(sql, params)
+            if cursor.description is None:
+                return QueryResult(rowcount=cursor.rowcount)
+            columns = [column[0] for column in cursor.description]
+            return QueryResult(columns, make_rows(columns, cursor.fetchall()), cursor.rowcount)
+
+    def _acquire(self):
+        """An idle connection, a new one while under pool_size, else waits for one"""
+        with self._available:
+            while not self._idle and self._open >= self.pool_size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop(), True
+            self._open += 1
+        try:
+            connection = psycopg2.connect(dbname=self.dbname, application_name=APPLICATION_NAME,
+                                          connect_timeout=CONNECT_TIMEOUT)
+            connection.autocommit = True
+        except psycopg2.Error:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+        return connection, False
+
+    def _release(self, connection, broken=False):
+        with self._available:
+            if broken or connection.closed:
+                self._open -= 1
+                try:
+                    connection.close()
+                except psycopg2.Error:
+                    pass
+            else:
+                self._idle.append(connection)
+            self._available.notify()
+
+    def close(self):
+        """Closes the idle connections"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for connection in idle:
+            connection.close()
+
+
+def get_database(dbname=None, pool_size=None):
+    """The run's Database for dbname, opened on first use
+
+    Args:
+        dbname (str): database, default the one of the Campaign config
+        pool_size (int): connections a daemon may keep open at a time (default 1)
+
+    Raises:
+        DatabaseError: no database name configured
+    """
+    dbname = dbname or get_host_profile().db_name
+    if not dbname:
+        raise DatabaseError("no database configured")
+    with _databases_lock:
+        database = _databases.get(dbname)
+        if database is None:
+            database = _databases[dbname] = Database(dbname, pool_size or 1)
+        elif pool_size:
+            with database._available:
+                database.pool_size = pool_size
+                database._available.notify_all()
+    return database
+
+
+def run_query(sql, params=None, dbname=None, timeout=QUERY_TIMEOUT, fetch=True):
+    """Runs one statement on dbname, see Database.run
+
+    Returns:
+        QueryResult, with the error when there is no database configured
+    """
+    try:
+        database = get_database(dbname)
+    except DatabaseError as e:
+        return QueryResult(error=str(e))
+    return database.run(sql, params, timeout, fetch)
+
+
+def query(sql, params=None, dbname=None, timeout=QUERY_TIMEOUT):
+    """Rows of a select (or ... returning)
+
+    Returns:
+        rows: list of named tuples, empty on error
+        stderr: error if any
+    """
+    result = run_query(sql, params, dbname, timeout)
+    return result.rows, result.error
+
+
+def scalar(sql, params=None, dbname=None, timeout=QUERY_TIMEOUT):
+    """First column of the first row, e.g. of a count(*)
+
+    Returns:
+        value: None when there is no row or on error
+        stderr: error if any
+    """
+    rows, stderr = query(sql, params, dbname, timeout)
+    return (rows[0][0] if rows else None), stderr
+
+
+def execute(sql, params=None, dbname=None, timeout=QUERY_TIMEOUT):
+    """Runs a statement that returns no rows (update, delete, alter, ...)
+
+    Returns:
+        rowcount: rows affected, -1 if not known or on error
+        stderr: error if any
+    """
+    result = run_query(sql, params, dbname, timeout, fetch=False)
+    return result.rowcount, result.error
+
+
+def close_all():
+    """Closes every connection of the run"""
+    with _databases_lock:
+        databases = list(_databases.values())
+    for database in databases:
+        database.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,302 @@
+#!/usr/bin/python3
+"""
+Runs an oncall command on many hosts at once
+Each host runs `oncall <command> [args]` over ssh (or, with --local, a local
+copy of oncall.py standing in for the host, for tests and rehearsals).
+At most --parallel hosts run at a time, each is killed after --timeout
+secs, output is streamed prefixed with the host name as it arrives and a
+summary of every host is printed at the end.
+Requirements: asyncio, argparse, shlex
+Input: command and its arguments, --hosts / --hosts-file, --parallel, --timeout
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+Example: oncall fleet --hosts-file prod-hosts.txt --role mkt --parallel 20 -- camp-glops
+"""
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import signal
+import sys
+import time
+from argparse import RawTextHelpFormatter
+from dataclasses import asdict, dataclass, field
+
+import tracing
+from command_runner import effective_timeout
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_PARALLEL = 10
+DEFAULT_TIMEOUT = 900
+TAIL_LINES = 20
+LINE_LIMIT = 1024 * 1024
+SSH_UNREACHABLE = 255
+SSH_OPTIONS = ["-T", "-o", "BatchMode=yes", "-o", "ConnectTimeout=10", "-o", "ServerAliveInterval=15"]
+ROLES = {"mkt": "-mkt-", "mid": "-mid-", "rt": "-rt-"}
+
+OK = "ok"
+FAILED = "failed"
+UNREACHABLE = "unreachable"
+TIMEOUT = "timeout"
+ERROR = "error"
+SKIPPED = "skipped"
+
+
+@dataclass
+class HostResult:
+    """Outcome of the command on one host"""
+    host: str
+    status: str
+    returncode: int = None
+    elapsed: float = 0.0
+    tail: list = field(default_factory=list)
+
+
+class SshTransport:
+    """Runs the command on the host with ssh"""
+
+    def __init__(self, user=None, options=None, remote_oncall="oncall", sudo=False):
+        self.user = user
+        self.options = SSH_OPTIONS + list(options or [])
+        self.remote_oncall = remote_oncall
+        self.sudo = sudo
+
+    def argv(self, host, command):
+        remote = (["sudo", "-n"] if self.sudo else []) + [self.remote_oncall] + list(command)
+        target = "{}@{}".format(self.user, host) if self.user else host
+        return ["ssh"] + self.options + [target, shlex.join(remote)]
+
+    def env(self, host):
+        return None
+
+    def status(self, returncode):
+        return UNREACHABLE if returncode == SSH_UNREACHABLE else FAILED
+
+
+class LocalTransport:
+    """Runs this checkout's oncall.py locally in place of the host
+
+    The host name is in ONCALL_FLEET_HOST, and {host} in the extra
+    environment values is replaced with it, so every "host" can get its own
+    facts cache, neolane root, ...
+    """
+
+    def __init__(self, environment=None):
+        self.environment = dict(environment or {})
+
+    def argv(self, host, command):
+        return [sys.executable, os.path.join(HERE, "oncall.py")] + list(command)
+
+    def env(self, host):
+        env = dict(os.environ)
+        env["ONCALL_FLEET_HOST"] = host
+        env.update({name: value.replace("{host}", host) for name, value in self.environment.items()})
+        return env
+
+    def status(self, returncode):
+        return FAILED
+
+
+def read_hosts(hosts=None, hosts_file=None, role=None):
+    """Host names from a comma separated list and/or a file (one per line, # comments)
+
+    Args:
+        hosts (str): h1,h2,...
+        hosts_file (str): path, - for stdin
+        role (str): mkt, mid or rt to keep only those hosts
+
+    Returns:
+        list: host names in order, without duplicates
+    """
+    names = []
+    if hosts:
+        names.extend(hosts.split(","))
+    if hosts_file:
+        fp = sys.stdin if hosts_file == "-" else open(hosts_file)
+        with fp:
+            names.extend(line.split("#", 1)[0] for line in fp)
+    names = [name.strip() for name in names if name.strip()]
+    if role:
+        names = [name for name in names if ROLES[role] in name]
+    return list(dict.fromkeys(names))
+
+
+class Fleet:
+    """Runs one command on a list of hosts with bounded concurrency"""
+
+    def __init__(self, transport, parallel=DEFAULT_PARALLEL, timeout=DEFAULT_TIMEOUT,
+                 max_failures=None, quiet=False, log_dir=None, out=sys.stdout):
+        self.transport = transport
+        self.parallel = max(1, parallel)
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.quiet = quiet
+        self.log_dir = log_dir
+        self.out = out
+        self.failures = 0
+
+    def run(self, hosts, command):
+        """Runs command on every host
+
+        Returns:
+            list: HostResult per host, in the order of hosts
+        """
+        return asyncio.run(self._run_all(hosts, command))
+
+    async def _run_all(self, hosts, command):
+        semaphore = asyncio.Semaphore(self.parallel)
+        width = max([len(host) for host in hosts] + [1])
+
+        async def bounded(host):
+            async with semaphore:
+                # a canary batch that keeps failing stops the rest from starting
+                if self.max_failures is not None and self.failures >= self.max_failures:
+                    return HostResult(host, SKIPPED)
+                try:
+                    result = await self._run_host(host, command, width)
+                except Exception as e:
+                    # one host going wrong must not take the others, and the summary, with it
+                    self._emit(host, width, "error: {}".format(e))
+                    result = HostResult(host, ERROR, tail=["error: {}".format(e)])
+                if result.status != OK:
+                    self.failures += 1
+                return result
+
+        return await asyncio.gather(*[bounded(host) for host in hosts])
+
+    async def _run_host(self, host, command, width):
+        argv = self.transport.argv(host, command)
+        timeout = effective_timeout(self.timeout)
+        started = time.monotonic()
+        with tracing.span("{} {}".format(host, " ".join(command)), "fleet", lane=tracing.new_lane()) as span_args:
+            result = await self._run_process(host, argv, timeout, width)
+            result.elapsed = round(time.monotonic() - started, 3)
+            span_args.update(status=result.status, returncode=result.returncode)
+        self._emit(host, width, "== {} ({}, {:.1f}s)".format(result.status, result.returncode, result.elapsed))
+        return result
+
+    async def _run_process(self, host, argv, timeout, width):
+        try:
+            process = await asyncio.create_subprocess_exec(*argv, stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.STDOUT,
+                                                           env=self.transport.env(host), start_new_session=True,
+                                                           limit=LINE_LIMIT)
+        except OSError as e:
+            self._emit(host, width, str(e))
+            return HostResult(host, ERROR, 127, tail=[str(e)])
+
+        tail = []
+        log = open(os.path.join(self.log_dir, host + ".log"), "w") if self.log_dir else None
+        try:
+            await asyncio.wait_for(self._read_output(process, host, width, tail, log), timeout)
+            returncode = await process.wait()
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            message = "timed out after {:g} secs".format(timeout)
+            self._emit(host, width, message)
+            return HostResult(host, TIMEOUT, None, tail=(tail + [message])[-TAIL_LINES:])
+        finally:
+            if log:
+                log.close()
+        status = OK if returncode == 0 else self.transport.status(returncode)
+        return HostResult(host, status, returncode, tail=tail)
+
+    async def _read_output(self, process, host, width, tail, log):
+        while True:
+            try:
+                line = await process.stdout.readline()
+            except ValueError:
+                # a line over LINE_LIMIT: readline dropped what it had buffered, the rest comes next
+                line = "[output line longer than {} bytes cut]\n".format(LINE_LIMIT).encode()
+            if not line:
+                return
+            line = line.decode(errors="replace").rstrip("\n")
+            tail.append(line)
+            del tail[:-TAIL_LINES]
+            if log:
+                log.write(line + "\n")
+            self._emit(host, width, line)
+
+    def _emit(self, host, width, line):
+        if not self.quiet:
+            print("{:<{}} | {}".format(host, width, line), file=self.out, flush=True)
+
+
+def print_summary(results, out=sys.stdout):
+    """Prints one line per host and the count per status"""
+    width = max([len(result.host) for result in results] + [4])
+    print("\n{:<{}}  {:<11} {:>4} {:>8}  {}".format("host", width, "status", "exit", "secs", "last line"), file=out)
+    for result in results:
+        print("{:<{}}  {:<11} {:>4} {:>8.1f}  {}".format(
+            result.host, width, result.status, "-" if result.returncode is None else result.returncode,
+            result.elapsed, result.tail[-1][:80] if result.tail else ""), file=out)
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print("\n{} hosts: {}".format(len(results), ", ".join(
+        "{} {}".format(count, status) for status, count in sorted(counts.items()))), file=out)
+
+
+def main(argv=None):
+    exe_process = """Runs `oncall <command> [args]` on every host, e.g.
+    fleet --hosts acme-mkt-prod1,acme-mkt-prod2 -- action-pdumps restart inMail
+    fleet --hosts-file prod-hosts.txt --role mkt --parallel 20 --timeout 600 -- camp-glops
+Put -- before the command so its options aren't taken for fleet's."""
+    parser = argparse.ArgumentParser(prog="fleet", epilog=exe_process, formatter_class=RawTextHelpFormatter)
+    parser.add_argument("--hosts", help="comma separated host names")
+    parser.add_argument("--hosts-file", metavar="FILE", help="one host per line, - for stdin")
+    parser.add_argument("--role", choices=sorted(ROLES), help="only the -mkt-, -mid- or -rt- hosts of the list")
+    parser.add_argument("--parallel", type=int, default=DEFAULT_PARALLEL, help="hosts running at the same time")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="secs allowed per host")
+    parser.add_argument("--max-failures", type=int, metavar="N",
+                        help="don't start more hosts once N hosts failed")
+    parser.add_argument("--ssh-user", help="ssh as this user")
+    parser.add_argument("--ssh-option", action="append", default=[], metavar="OPTION",
+                        help="extra ssh argument, repeatable (e.g. --ssh-option=-i --ssh-option=key.pem)")
+    parser.add_argument("--remote-oncall", default="oncall", help="oncall command on the hosts")
+    parser.add_argument("--sudo", action="store_true", help="run it with sudo -n on the hosts")
+    parser.add_argument("--local", action="store_true", help="run this checkout locally per host instead of ssh")
+    parser.add_argument("--local-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="environment for --local runs, {host} is replaced with the host name")
+    parser.add_argument("--log-dir", metavar="DIR", help="write each host's full output to DIR/<host>.log")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    parser.add_argument("--json", metavar="FILE", help="write the results to FILE")
+    tracing.add_trace_argument(parser)
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="oncall command and its arguments")
+
+    args_namespace = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    args = vars(args_namespace)
+    tracing.trace_from_args(args)
+
+    command = args["command"][1:] if args["command"][:1] == ["--"] else args["command"]
+    if not command:
+        parser.error("no command given")
+    hosts = read_hosts(args.get("hosts"), args.get("hosts_file"), args.get("role"))
+    if not hosts:
+        parser.error("no hosts given")
+    if args.get("log_dir"):
+        os.makedirs(args["log_dir"], exist_ok=True)
+
+    if args.get("local"):
+        transport = LocalTransport(dict(entry.split("=", 1) for entry in args["local_env"]))
+    else:
+        transport = SshTransport(args.get("ssh_user"), args["ssh_option"], args["remote_oncall"], args["sudo"])
+    fleet = Fleet(transport, args["parallel"], args["timeout"], args.get("max_failures"),
+                  args["quiet"], args.get("log_dir"))
+    results = fleet.run(hosts, command)
+
+    print_summary(results)
+    if args.get("json"):
+        with open(args["json"], "w") as fp:
+            json.dump([asdict(result) for result in results], fp, indent=2)
+    return 0 if all(result.status == OK for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+"""
+On-disk cache of slow host facts shared by all the oncall scripts
+Caches the Campaign product banner (from nlserver pdump -full web) and the
+operating system (from hostnamectl). The cache is keyed on the mtimes of
+config-*.xml, env.sh and /etc/os-release, so an upgrade, a new instance or
+an OS change throws it away and the facts get probed again.
+The product banner decides ACC vs ACS for the scripts, so the cache lives
+in a directory only its owner (root) can write, and a cache file that isn't
+owned by the user running the script, or that others can write, is ignored.
+Requirements: json, os, glob, tempfile
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import glob
+import json
+import logging
+import os
+import stat
+import tempfile
+
+import transcript
+from command_runner import run_argv
+from campaign_config import CONFIG_GLOB, NEOLANE_HOME_GLOB
+from process_table import get_process_table
+
+CACHE_PATH = os.environ.get("ONCALL_HOST_FACTS", "/var/cache/oncall-automation/host-facts.json")
+ENV_GLOB = NEOLANE_HOME_GLOB + "/env.sh"
+OS_RELEASE = "/etc/os-release"
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key():
+    """mtime of every file the facts are derived from, None when missing"""
+    key = {}
+    for path in sorted(glob.glob(CONFIG_GLOB)) + sorted(glob.glob(ENV_GLOB)) + [OS_RELEASE]:
+        try:
+            key[path] = os.stat(path).st_mtime
+        except OSError:
+            key[path] = None
+    return key
+
+
+def _trusted(stat_result):
+    """Owned by the user running the script and writable by no one else"""
+    return stat_result.st_uid == os.geteuid() and not stat_result.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def load_facts(path=CACHE_PATH):
+    """Reads the cached facts, empty dict if missing, out of date or not trusted"""
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return {}
+    try:
+        with os.fdopen(fd) as fp:
+            if not _trusted(os.fstat(fp.fileno())):
+                logger.warning("ignoring host facts cache %s: not owned by uid %s or writable by others",
+                               path, os.geteuid())
+                return {}
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    if data.get("key") != cache_key():
+        return {}
+    return data.get("facts", {})
+
+
+def save_facts(facts, path=CACHE_PATH):
+    """Writes the facts with the current key, atomically
+
+    The directory is created for the user running the script (0755); an
+    existing one that isn't trusted is not written to. The file is created
+    0600 under a random name in it and renamed over the cache.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, mode=0o755, exist_ok=True)
+        if not _trusted(os.lstat(directory)):
+            logger.warning("not writing host facts cache in %s: not owned by uid %s or writable by others",
+                           directory, os.geteuid())
+            return
+        fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", dir=directory)
+    except OSError:
+        logger.exception("error in writing host facts cache %s", path)
+        return
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump({"key": cache_key(), "facts": facts}, fp, indent=2)
+        os.replace(temp_path, path)
+    except OSError:
+        logger.exception("error in writing host facts cache %s", path)
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def _product_banner():
+    table, stderr = get_process_table("web", full=True)
+    if not table.output:
+        return None, stderr
+    return table.banner or table.output, ""
+
+
+def _os_name():
+    stdout, stderr, returncode = run_argv(["hostnamectl"])
+    if returncode != 0:
+        return None, stderr or "hostnamectl exited with {}".format(returncode)
+    for line in stdout.split("\n"):
+        if "Operating System" in line:
+            return line.strip(), ""
+    return stdout, ""
+
+
+PROBES = {
+    "product_banner": _product_banner,
+    "os_name": _os_name,
+}
+
+
+def get_fact(name, refresh=False):
+    """Returns a cached fact, probing and caching it on a miss
+
+    Failed probes are not cached, the next run will try again.
+
+    Args:
+        name (str): one of PROBES
+        refresh (bool): ignore the cached value
+
+    Returns:
+        value: the fact, None if the probe failed
+        stderr: error of the probe if any
+    """
+    return transcript.call("fact", [name, refresh], lambda: _get_fact(name, refresh), list, tuple)
+
+
+def _get_fact(name, refresh):
+    facts = load_facts()
+    if not refresh and name in facts:
+        return facts[name], ""
+
+    value, stderr = PROBES[name]()
+    if value is not None:
+        facts[name] = value
+        save_facts(facts)
+    return value, stderr
+
+
+def campaign_product():
+    """Campaign banner lines of nlserver pdump -full web, checked for
+    "Adobe Campaign Classic" to tell ACC from ACS
+
+    Returns:
+        stdout: banner, empty string if pdump failed
+        stderr: standard error if any
+    """
+    banner, stderr = get_fact("product_banner")
+    return banner or "", stderr
+
+
+def os_name():
+    """Operating System line of hostnamectl
+
+    Returns:
+        stdout: os line, empty string if hostnamectl failed
+        stderr: standard error if any
+    """
+    name, stderr = get_fact("os_name")
+    return name or "", stderr
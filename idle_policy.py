@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+"""
+Which idle database sessions kill_idle_Queries may reap, and after how long
+A policy is a JSON file of rules, exclusions and a cap on kills per run:
+
+    {
+      "rules": [
+        {"state": "idle in transaction (aborted)", "older_than": "2m"},
+        {"state": ["idle in transaction", "idle in transaction (aborted)"],
+         "application_name": "nlserver*", "older_than": "10m"},
+        {"state": "idle", "usename": "report_*", "client_addr": "10.20.0.0/16", "older_than": "2h"},
+        {"older_than": "1h"}
+      ],
+      "exclude": {"application_name": ["pg_dump*", "pg_basebackup"], "usename": ["postgres"],
+                  "client_addr": ["local"]},
+      "max_kills": 50
+    }
+
+The first rule whose filters all match a session decides its threshold:
+how long it has been in its current state (now() - state_change). A rule
+leaves out a filter to match anything. state is idle, idle in transaction
+or idle in transaction (aborted), by default both idle in transaction
+states. application_name and usename take glob patterns, client_addr takes
+addresses or networks, "local" for Unix socket connections. A session
+matching any exclusion is never reaped, nor are this tool's own sessions.
+Thresholds are seconds, or a number followed by s, m, h or d.
+The policy is compiled into the WHERE clause of one pg_stat_activity
+statement, so sessions are matched, re-checked and signalled in one round trip.
+Requirements: json, ipaddress
+Input: policy file
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import ipaddress
+import json
+import re
+from dataclasses import dataclass, field
+
+from database import APPLICATION_NAME
+
+IDLE = "idle"
+IDLE_IN_TRANSACTION = "idle in transaction"
+IDLE_IN_TRANSACTION_ABORTED = "idle in transaction (aborted)"
+STATES = (IDLE, IDLE_IN_TRANSACTION, IDLE_IN_TRANSACTION_ABORTED)
+LOCAL = "local"
+DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class PolicyError(Exception):
+    """The policy file can't be used"""
+
+
+def parse_duration(value):
+    """Seconds of 600, "90s", "15m", "2h" or "3d"
+
+    Raises:
+        PolicyError: not a duration
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+        return float(value)
+    match = DURATION.match(value) if isinstance(value, str) else None
+    if not match:
+        raise PolicyError("not a duration: {!r} (seconds, or a number followed by s, m, h or d)".format(value))
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+
+def like_pattern(glob):
+    """LIKE pattern of a glob pattern (* and ?)"""
+    pattern = glob.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return pattern.replace("*", "%").replace("?", "_")
+
+
+def _string_list(value, name):
+    values = [value] if isinstance(value, str) else value
+    if not isinstance(values, list) or not values or not all(isinstance(item, str) for item in values):
+        raise PolicyError("{} must be a string or a list of strings".format(name))
+    return values
+
+
+@dataclass
+class Selector:
+    """Sessions picked by application_name, usename and client_addr, None matches anything"""
+    application_name: list = None
+    usename: list = None
+    client_addr: list = None
+
+    def conditions(self):
+        """SQL conditions on pg_stat_activity for each filter set, and their params"""
+        conditions, params = [], []
+        if self.application_name:
+            conditions.append("application_name like any(%s)")
+            params.append([like_pattern(glob) for glob in self.application_name])
+        if self.usename:
+            conditions.append("usename like any(%s)")
+            params.append([like_pattern(glob) for glob in self.usename])
+        if self.client_addr:
+            networks = [address for address in self.client_addr if address != LOCAL]
+            parts = ["client_addr is null"] if LOCAL in self.client_addr else []
+            if networks:
+                parts.append("client_addr <<= any(%s::inet[])")
+                params.append(networks)
+            conditions.append("(" + " or ".join(parts) + ")")
+        return conditions, params
+
+    @classmethod
+    def parse(cls, data, name):
+        selector = cls()
+        for key in ("application_name", "usename", "client_addr"):
+            if data.get(key) is not None:
+                setattr(selector, key, _string_list(data[key], "{} {}".format(name, key)))
+        for address in selector.client_addr or []:
+            if address != LOCAL:
+                try:
+                    ipaddress.ip_network(address, strict=False)
+                except ValueError as e:
+                    raise PolicyError("{} client_addr: {}".format(name, e))
+        return selector
+
+
+@dataclass
+class Rule(Selector):
+    """Sessions in one of states, matching the filters, idle for more than older_than secs"""
+    older_than: float = 0.0
+    states: list = field(default_factory=lambda: [IDLE_IN_TRANSACTION, IDLE_IN_TRANSACTION_ABORTED])
+
+    def condition(self):
+        """SQL condition matching the rule's sessions (the threshold aside), and its params"""
+        conditions, params = self.conditions()
+        return " and ".join(["state = any(%s)"] + conditions), [self.states] + params
+
+    def describe(self):
+        filters = ["{}={}".format(key, ",".join(getattr(self, key)))
+                   for key in ("application_name", "usename", "client_addr") if getattr(self, key)]
+        return "{} {}> {:g}s".format("/".join(self.states), " ".join(filters) + " " if filters else "",
+                                     self.older_than)
+
+    @classmethod
+    def parse(cls, data, name):
+        if not isinstance(data, dict) or "older_than" not in data:
+            raise PolicyError("{} needs older_than".format(name))
+        rule = super().parse(data, name)
+        rule.older_than = parse_duration(data["older_than"])
+        if data.get("state") is not None:
+            rule.states = _string_list(data["state"], name + " state")
+            unknown = [state for state in rule.states if state not in STATES]
+            if unknown:
+                raise PolicyError("{} state must be one of {}, not {}".format(name, ", ".join(STATES), unknown))
+        return rule
+
+
+@dataclass
+class Policy:
+    """Rules in order, exclusions and the cap on kills per database per run"""
+    rules: list
+    exclude: Selector = field(default_factory=Selector)
+    max_kills: int = None
+
+    def select_sql(self, pids=None, limit=None):
+        """Statement listing the sessions of the current database the policy reaps, longest idle first
+
+        Args:
+            pids (list): only these backends
+            limit (int): at most this many sessions
+
+        Returns:
+            sql: with %s placeholders; the columns are pid, application_name, client_addr,
+                usename, state, idle_for, idle_seconds and rule (index of the rule matched)
+            params: tuple
+        """
+        rule_cases, threshold_cases, rule_params, threshold_params = [], [], [], []
+        for index, rule in enumerate(self.rules):
+            condition, params = rule.condition()
+            rule_cases.append("when {} then {}".format(condition, index))
+            rule_params += params
+            threshold_cases.append("when {} then %s".format(condition))
+            threshold_params += params + [rule.older_than]
+
+        where = ["datname = current_database()", "pid <> pg_backend_pid()", "state like 'idle%%'",
+                 "application_name <> %s"]
+        where_params = [APPLICATION_NAME]
+        exclusions, params = self.exclude.conditions()
+        if exclusions:
+            # a session whose application_name/usename is null can't dodge an exclusion
+            where.append("not coalesce(" + " or ".join(exclusions) + ", false)")
+            where_params += params
+        if pids is not None:
+            where.append("pid = any(%s)")
+            where_params.append([int(pid) for pid in pids])
+
+        sql = ("select pid, application_name, client_addr, usename, state, idle_for, idle_seconds, rule from ("
+               "select pid, application_name, client_addr, usename, state, now() - state_change as idle_for, "
+               "extract(epoch from now() - state_change)::float8 as idle_seconds, "
+               "case {} end as rule, case {} end as threshold "
+               "from pg_stat_activity where {}"
+               ") sessions where idle_seconds > threshold order by idle_seconds desc").format(
+            " ".join(rule_cases), " ".join(threshold_cases), " and ".join(where))
+        params = rule_params + threshold_params + where_params
+        if limit is not None:
+            sql += " limit %s"
+            params.append(int(limit))
+        return sql, tuple(params)
+
+    @classmethod
+    def parse(cls, data):
+        """Policy of the decoded JSON of a policy file
+
+        Raises:
+            PolicyError: with what is wrong
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("rules"), list) or not data["rules"]:
+            raise PolicyError("a policy needs a non-empty list of rules")
+        rules = [Rule.parse(rule, "rule {}".format(index + 1)) for index, rule in enumerate(data["rules"])]
+        exclude = Selector.parse(data.get("exclude") or {}, "exclude")
+        max_kills = data.get("max_kills")
+        if max_kills is not None and (not isinstance(max_kills, int) or isinstance(max_kills, bool) or max_kills < 0):
+            raise PolicyError("max_kills must be a whole number")
+        return cls(rules, exclude, max_kills)
+
+
+def load_policy(path):
+    """Policy of a JSON policy file
+
+    Raises:
+        PolicyError: the file can't be read or isn't a valid policy
+    """
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+    except (OSError, ValueError) as e:
+        raise PolicyError("can't read policy {}: {}".format(path, e))
+    return Policy.parse(data)
+
+
+def days_policy(days):
+    """The fixed policy of -days: idle in transaction for more than days days"""
+    return Policy([Rule(older_than=float(days) * UNITS["d"])])
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+"""
+Every Campaign instance of a host, and checks run on all of them at once
+Shared mid/rt hosts carry several instances (one config-<name>.xml each).
+The scripts pick the ones to work on with --instance (default: all of
+them) and run their per-instance checks concurrently, one thread per
+instance. Run on its own it prints a report per instance: processes from
+pdump, failed workflows and idle-in-transaction sessions of its database.
+Requirements: concurrent.futures, argparse
+Input: --instance NAME (repeatable), --days
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import argparse
+import sys
+from argparse import RawTextHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
+
+from campaign_config import get_host_profile, CONFIG_GLOB
+from database import scalar
+from process_table import get_process_table
+from tracing import add_trace_argument, trace_from_args
+
+QUERY_TIMEOUT = 120
+MAX_WORKERS = 8
+
+
+def add_instance_arguments(parser):
+    """Adds --instance NAME (repeatable) to a script's argument parser"""
+    parser.add_argument("--instance", action="append", metavar="NAME",
+                        help="Campaign instance to work on, repeatable; default every instance of the host")
+
+
+def select_instances(names=None):
+    """Instances of the host to work on
+
+    Args:
+        names (list): instance names, None or empty for all of them
+
+    Returns:
+        instances: list of InstanceConfig, in config file order
+        stderr: the names not configured on this host, if any
+    """
+    profile = get_host_profile()
+    if not names:
+        stderr = "" if profile.instances else "no Campaign instance config found under " + CONFIG_GLOB
+        return list(profile.instances), stderr
+    unknown = [name for name in names if profile.get(name) is None]
+    instances = [instance for instance in profile.instances if instance.name in names]
+    stderr = "no such instance on this host: " + ", ".join(unknown) if unknown else ""
+    return instances, stderr
+
+
+def run_per_instance(func, instances, max_workers=MAX_WORKERS):
+    """Runs func(instance) for every instance concurrently
+
+    An exception (or sys.exit of a script's helper) stays with its
+    instance, the others carry on.
+
+    Returns:
+        list: (instance, result, error) in the order of instances, error is
+            the exception raised or None
+    """
+    if not instances:
+        return []
+
+    def guarded(instance):
+        try:
+            return instance, func(instance), None
+        except (Exception, SystemExit) as e:
+            return instance, None, e
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(instances))) as executor:
+        return list(executor.map(guarded, instances))
+
+
+def check_instance(instance, days, table):
+    """Per-instance checks of the report
+
+    Returns:
+        dict: processes, failed_workflows, idle_in_transaction, errors
+    """
+    processes = [process for process in table.processes if process.instance == instance.name]
+    if not instance.db_name:
+        return {"processes": processes, "failed_workflows": None, "idle_in_transaction": None,
+                "errors": ["no database configured"]}
+    failed, failed_error = scalar("select count(*) from xtkworkflow where ifailed = 1;",
+                                  dbname=instance.db_name, timeout=QUERY_TIMEOUT)
+    idle, idle_error = scalar(
+        "select count(*) from pg_stat_activity where state like 'idle in transaction%%' "
+        "and datname = current_database() and query_start < now() - %s * interval '1 day';",
+        (int(days),), instance.db_name, QUERY_TIMEOUT)
+    return {"processes": processes, "failed_workflows": failed, "idle_in_transaction": idle,
+            "errors": [error for error in (failed_error, idle_error) if error]}
+
+
+def print_report(rows, days):
+    for instance, result, error in rows:
+        print("== {} (db {})".format(instance.name, instance.db_name or "-"))
+        if error is not None:
+            print("   check failed: {}".format(error))
+            continue
+        processes = result["processes"]
+        print("   processes            {}".format(", ".join(
+            "{} ({:g} MB)".format(process.name, process.memory_mb or 0) for process in processes) or "none running"))
+        print("   failed workflows     {}".format("-" if result["failed_workflows"] is None else result["failed_workflows"]))
+        print("   idle in transaction  {} (older than {} days)".format(
+            "-" if result["idle_in_transaction"] is None else result["idle_in_transaction"], days))
+        for message in result["errors"]:
+            print("   error: " + message)
+
+
+if __name__ == '__main__':
+    exe_process = """Reports every Campaign instance of the host, checked concurrently:
+    python3 instances.py
+    python3 instances.py --instance acme_mkt_prod1 --days 1"""
+    parser = argparse.ArgumentParser(epilog=exe_process, formatter_class=RawTextHelpFormatter)
+    add_instance_arguments(parser)
+    parser.add_argument("--days", type=int, default=3, help="idle in transaction for more than this many days")
+    add_trace_argument(parser)
+    args_namespace = parser.parse_args()
+    args = vars(args_namespace)
+    trace_from_args(args)
+
+    instances, stderr = select_instances(args.get("instance"))
+    if stderr:
+        print(stderr)
+    if not instances:
+        sys.exit(1)
+    # one pdump serves every instance
+    table, stderr = get_process_table()
+    if stderr:
+        print(stderr)
+    rows = run_per_instance(lambda instance: check_instance(instance, args["days"], table), instances)
+    print_report(rows, args["days"])
@@ -1,146 +1,484 @@
-#!/usr/bin/python3
-"""
-Python3 script for eliminating inmail issues
-Requirements: subprocess, in_place, time, sys
-Input: None
-Author: Shivakumar Bommakanti
-Date: 05-11-2023
-"""
-import subprocess
-import argparse
-from argparse import RawTextHelpFormatter
-import logging
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True,
-                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
-def get_db_name():
-    """Gets the database name from predefined commands
-
-    Returns:
-        db name: string
-    """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
-        logger.exception("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
-
-    return dbname
-
-def count_idle_queries(days):
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select count(*) from pg_stat_activity where state = 'idle' and query_start < now() - INTERVAL '{} DAY';\" | awk 'NR==1 { print $1}'".format(days)
-    logger.info(sql_retrieve_command)
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
-    if stderr:
-        logger.exception("Error in counting idle queries older than 3 days", stderr)
-        print("Error in counting idle queries older than 3 days", stderr)
-        exit(1)
-    else:
-        print('Count of idle queries',stdout)
-        logger.info('Count of idle queries', stdout)
-    return stdout
-
-def get_list_of_idle_PIDS(days):
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select pid, application_name,client_addr, datname, query_start, now()-query_start as hhmm_running, substring(query from 1 for 100) as truncatedquery," \
-                           "wait_event,wait_event_type,state  from pg_stat_activity where ((state LIKE '%idle in transaction%') and query_start < now() - INTERVAL '{} DAY') order by hhmm_running DESC;" \
-                           "\" | awk 'NR>1 { print $1}'".format(days)
-    logger.info(sql_retrieve_command)
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
-    if stderr:
-        logger.exception("Error in getting pids of idle queries older than 3 days", stderr)
-        print("Error in getting pids of idle queries older than 3 days", stderr)
-        exit(1)
-    else:
-        print('PIDs of idle queries', stdout)
-        logger.info('PIDs of idle queries', stdout)
-    return stdout.split('\n')
-
-def cancel_query(pid):
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select pg_cancel_backend({});'".format(pid)
-    logger.info(sql_retrieve_command)
-    print("cancel",sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
-    if stderr:
-        logger.exception("Error in cancelling query pid -"+pid+"with error "+stderr)
-        print("Error in cancelling query pid -" + pid + "with error " + stderr)
-    else:
-        print('PIDs of idle queries', stdout)
-        logger.info('PIDs of idle queries', stdout)
-    return stdout.split('\n')
-
-def terminate_query(pid):
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select pg_terminate_backend({});'".format(pid)
-    logger.info(sql_retrieve_command)
-    print("terminate", sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
-    if stderr:
-        logger.exception("Error in terminating query pid -"+pid+"with error "+stderr)
-        print("Error in terminating query pid -" + pid + "with error " + stderr)
-    else:
-        print('PIDs of idle queries', stdout)
-        logger.info('PIDs of idle queries', stdout)
-    return stdout.split('\n')
-
-if __name__ == '__main__':
-    try:
-        global logger
-        logger = logging.getLogger('Idle_queries')
-    except Exception as e:
-        raise e
-
-    exe_process = """Please enter an optional argument :
-                    days = No. of older days idle queries to kill Default 3
-                    """
-    parser = argparse.ArgumentParser(
-        epilog=exe_process, formatter_class=RawTextHelpFormatter)
-    parser.add_argument("-days", "--days_older", default='3', help="No. of days older")
-
-    args_namespace = parser.parse_args()
-    args = vars(args_namespace)
-
-    days = args.get('days_older')
-
-    count = count_idle_queries(days)
-    if count > 0:
-        pids = get_list_of_idle_PIDS(days)
-        for pid in pids:
-            cancel_query(pid)
-
-        pids1 = get_list_of_idle_PIDS(days)
-        print('Following pids didnt get cancelled will apply terminate')
-        for pid1 in pids1:
-            terminate_query(pid1)
-        print('Successfully cancelled/terminated idle queries older than 3 days')
-    else:
-        print('No idle queries older than '+days+' days. exiting script')
\ No newline at end of file
+#!/usr/bin/python3
+"""
+Python3 script for eliminating inmail issues
+Requirements: in_place, time, sys
+Input: None
+Author: Shivakumar Bommakanti
+Date: 05-11-2023
+"""
+import argparse
+import collections
+import functools
+import random
+import signal
+import threading
+import time
+from argparse import RawTextHelpFormatter
+import logging
+from command_runner import memoize_probe
+from database import query, scalar, default_driver, PSQL
+from idle_policy import PolicyError, load_policy, days_policy
+from campaign_config import get_host_profile
+from instances import add_instance_arguments, select_instances, run_per_instance
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args, set_action, set_result, add_metric, count_metric, checkpoint
+
+PSQL_TIMEOUT = 120
+# the server function behind each bulk action, the name goes into the statement
+SIGNAL_FUNCTIONS = {"cancel": "pg_cancel_backend", "terminate": "pg_terminate_backend"}
+# a signalled backend takes a moment to go, it is polled for with backoff up to the deadline
+CONVERGE_TIMEOUT = 10
+POLL_INITIAL = 0.05
+POLL_MAX = 1.0
+# --daemon: a sweep every SWEEP_INTERVAL secs, give or take SWEEP_JITTER of it
+SWEEP_INTERVAL = 60
+SWEEP_JITTER = 0.1
+ROLLING_WINDOW = 3600
+
+@memoize_probe
+def get_db_name():
+    """Gets the database name from the Campaign config
+
+    Returns:
+        db name: string
+    """
+    dbname = get_host_profile().db_name
+    if not dbname:
+        logger.exception("error in fetching dbname")
+
+    return dbname
+
+def count_idle_queries(days, dbname=None):
+    dbname = dbname or get_db_name()
+    sql = "select count(*) from pg_stat_activity where state = 'idle' and query_start < now() - %s * interval '1 day';"
+    logger.info(sql)
+    print(sql, days)
+    count, stderr = scalar(sql, (int(days),), dbname, timeout=PSQL_TIMEOUT)
+    if stderr:
+        logger.exception("Error in counting idle queries older than 3 days", stderr)
+        print("Error in counting idle queries older than 3 days", stderr)
+        exit(1)
+    else:
+        print('Count of idle queries', count)
+        logger.info('Count of idle queries %s', count)
+    return count or 0
+
+def get_list_of_idle_PIDS(days, dbname=None):
+    dbname = dbname or get_db_name()
+    sql = ("select pid, application_name, client_addr, datname, query_start, now()-query_start as hhmm_running, "
+           "substring(query from 1 for 100) as truncatedquery, wait_event, wait_event_type, state "
+           "from pg_stat_activity where state like 'idle in transaction%%' and query_start < now() - %s * interval '1 day' "
+           "order by hhmm_running desc;")
+    logger.info(sql)
+    print(sql, days)
+    rows, stderr = query(sql, (int(days),), dbname, timeout=PSQL_TIMEOUT)
+    if stderr:
+        logger.exception("Error in getting pids of idle queries older than 3 days", stderr)
+        print("Error in getting pids of idle queries older than 3 days", stderr)
+        exit(1)
+    else:
+        for row in rows:
+            print('PID of idle query', row.pid, row.application_name, row.client_addr, row.hhmm_running, row.truncatedquery)
+        logger.info('PIDs of idle queries %s', [row.pid for row in rows])
+    return [row.pid for row in rows]
+
+def cancel_query(pid, dbname=None):
+    dbname = dbname or get_db_name()
+    logger.info("cancel %s", pid)
+    print("cancel", pid)
+    cancelled, stderr = scalar("select pg_cancel_backend(%s);", (int(pid),), dbname, timeout=PSQL_TIMEOUT)
+    if stderr:
+        logger.exception("Error in cancelling query pid -"+str(pid)+"with error "+stderr)
+        print("Error in cancelling query pid -" + str(pid) + "with error " + stderr)
+    else:
+        print('Cancelled pid', pid, cancelled)
+        logger.info('Cancelled pid %s %s', pid, cancelled)
+    return bool(cancelled)
+
+def terminate_query(pid, dbname=None):
+    dbname = dbname or get_db_name()
+    logger.info("terminate %s", pid)
+    print("terminate", pid)
+    terminated, stderr = scalar("select pg_terminate_backend(%s);", (int(pid),), dbname, timeout=PSQL_TIMEOUT)
+    if stderr:
+        logger.exception("Error in terminating query pid -"+str(pid)+"with error "+stderr)
+        print("Error in terminating query pid -" + str(pid) + "with error " + stderr)
+    else:
+        print('Terminated pid', pid, terminated)
+        logger.info('Terminated pid %s %s', pid, terminated)
+    return bool(terminated)
+
+def signal_idle_backends(action, policy, dbname=None, pids=None, limit=None, dry_run=False):
+    """Cancels or terminates every backend of dbname the policy reaps, in one statement
+
+    Args:
+        action (str): cancel or terminate
+        policy (Policy): which sessions, see idle_policy
+        pids (list): only these backends (e.g. the ones a cancel left behind), None for all of them
+        limit (int): signal at most this many, the longest idle first
+        dry_run (bool): only list the backends, signal none
+
+    Returns:
+        rows: a row per backend matched: pid, application_name, client_addr, usename, state,
+            idle_for, idle_seconds, rule (index in the policy) and signalled (True when the
+            signal was sent)
+        stderr: error of the statement, no backend was signalled then
+    """
+    dbname = dbname or get_db_name()
+    if pids is not None and not pids:
+        return [], ""
+    sessions, params = policy.select_sql(pids, limit)
+    # sessions is limited in a subquery of its own, so only the sessions kept are signalled
+    sql = "select *, {} as signalled from ({}) matched;".format(
+        "false" if dry_run else SIGNAL_FUNCTIONS[action] + "(pid)", sessions)
+    logger.info(sql)
+    print(action, sql, params)
+    rows, stderr = query(sql, params, dbname, timeout=PSQL_TIMEOUT)
+    if stderr:
+        logger.exception("Error in bulk %s of idle queries with error %s", action, stderr)
+        print("Error in bulk " + action + " of idle queries with error " + stderr)
+        return [], stderr
+    for row in rows:
+        print('{} pid {} ({}, {}, {}, {}) idle for {}, rule {} -> {}'.format(
+            action, row.pid, row.application_name, row.client_addr, row.usename, row.state, row.idle_for,
+            row.rule + 1, "dry run" if dry_run else "signalled" if row.signalled else "not signalled"))
+    logger.info('%s of idle queries %s', action, [(row.pid, row.signalled) for row in rows])
+    return rows, ""
+
+def wait_for_backends(pids, policy, dbname, timeout=CONVERGE_TIMEOUT):
+    """Polls pg_stat_activity until the backends are gone or the timeout is up
+
+    A backend counts as gone once the policy no longer reaps it: it
+    exited, or its transaction ended. Polls start POLL_INITIAL secs apart
+    and double up to POLL_MAX.
+
+    Returns:
+        gone: dict pid -> secs it took, as seen by the poll that found it gone
+        alive: pids still there at the deadline, or not known to be gone when a poll failed
+        stderr: error of the poll that failed, the backends in alive may be gone then
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    alive = [int(pid) for pid in pids]
+    gone = {}
+    delay = POLL_INITIAL
+    while alive:
+        sessions, params = policy.select_sql(alive)
+        rows, stderr = query("select pid from ({}) still_idle;".format(sessions), params, dbname,
+                             timeout=PSQL_TIMEOUT)
+        if stderr:
+            logger.exception("Error in polling idle queries with error %s", stderr)
+            print("Error in polling idle queries with error " + stderr)
+            return gone, alive, stderr
+        elapsed = time.monotonic() - started
+        remaining = {row.pid for row in rows}
+        for pid in alive:
+            if pid not in remaining:
+                gone[pid] = elapsed
+        alive = [pid for pid in alive if pid in remaining]
+        if not alive or time.monotonic() >= deadline:
+            break
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        delay = min(delay * 2, POLL_MAX)
+    return gone, alive, ""
+
+def kill_idle_queries_bulk(dbname, policy, converge_timeout=CONVERGE_TIMEOUT, dry_run=False):
+    """kill_idle_queries with one statement per pass whatever the number of sessions, for a policy
+
+    At most policy.max_kills sessions are signalled. Only the backends still
+    there converge_timeout secs after the cancel are terminated.
+
+    Returns:
+        dict: idle (count), cancelled, terminated, still_alive, cleanup_seconds (until the
+            last backend went), outcomes (pid -> (outcome, secs to go or None)),
+            sessions (rows of the cancel pass), error (of a pass that failed, else "")
+    """
+    started = time.monotonic()
+    cancelled, stderr = signal_idle_backends("cancel", policy, dbname, limit=policy.max_kills, dry_run=dry_run)
+    if stderr:
+        return {"idle": 0, "cancelled": 0, "terminated": 0, "still_alive": 0, "cleanup_seconds": 0.0,
+                "outcomes": {}, "sessions": [], "error": stderr}
+    if policy.max_kills is not None and len(cancelled) >= policy.max_kills:
+        print('Kill cap of {} reached in {}, the other sessions wait for the next run'.format(policy.max_kills, dbname))
+    if not cancelled or dry_run:
+        if not cancelled:
+            print('No idle queries to reap in '+dbname)
+        return {"idle": len(cancelled), "cancelled": 0, "terminated": 0, "still_alive": 0, "cleanup_seconds": 0.0,
+                "outcomes": {row.pid: ("dry run", None) for row in cancelled}, "sessions": cancelled, "error": ""}
+    gone, alive, stderr = wait_for_backends([row.pid for row in cancelled], policy, dbname, converge_timeout)
+    outcomes = {pid: ("cancelled", seconds) for pid, seconds in gone.items()}
+
+    # only the sessions the cancel left behind, a session that went idle since isn't ours to terminate yet;
+    # a failed poll doesn't tell which those are, so nothing is terminated on it
+    if not stderr:
+        terminated, stderr = signal_idle_backends("terminate", policy, dbname, alive)
+    if not stderr:
+        gone, alive, stderr = wait_for_backends([row.pid for row in terminated], policy, dbname, converge_timeout)
+        outcomes.update({pid: ("terminated", seconds) for pid, seconds in gone.items()})
+    outcomes.update({pid: ("unknown" if stderr else "still alive", None) for pid in alive})
+    cleanup_seconds = time.monotonic() - started
+
+    for pid, (outcome, seconds) in sorted(outcomes.items()):
+        print('pid {}: {}{}'.format(pid, outcome, "" if seconds is None else ", gone after {:.2f}s".format(seconds)))
+    if stderr:
+        print('{} idle queries not known to be gone in {}: {}'.format(len(alive), dbname, alive))
+    elif alive:
+        print('{} idle queries still there after terminate in {}: {}'.format(len(alive), dbname, alive))
+    else:
+        print('Successfully cancelled/terminated idle queries in '+dbname+' in {:.2f}s'.format(cleanup_seconds))
+    return {"idle": len(cancelled), "cancelled": sum(1 for outcome, _ in outcomes.values() if outcome == "cancelled"),
+            "terminated": sum(1 for outcome, _ in outcomes.values() if outcome == "terminated"),
+            "still_alive": len(alive), "cleanup_seconds": round(cleanup_seconds, 3), "outcomes": outcomes,
+            "sessions": cancelled, "error": stderr}
+
+class ReapCounters:
+    """Sessions reaped per application and failed sweeps per database, since the start and
+    over the last window secs"""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.total = collections.Counter()
+        self.failed = collections.Counter()
+        self._events = collections.deque()
+        self._failures = collections.deque()
+
+    def add(self, application, count=1):
+        self.total[application] += count
+        self._events.append((time.monotonic(), application, count))
+
+    def add_failure(self, dbname):
+        """A sweep of dbname that failed, it reaped nothing or not all it should have"""
+        self.failed[dbname] += 1
+        self._failures.append((time.monotonic(), dbname, 1))
+
+    def _within_window(self, events):
+        horizon = time.monotonic() - self.window
+        while events and events[0][0] < horizon:
+            events.popleft()
+        counts = collections.Counter()
+        for _, key, count in events:
+            counts[key] += count
+        return counts
+
+    def recent(self):
+        """Counter of the sessions reaped in the last window secs"""
+        return self._within_window(self._events)
+
+    def recent_failures(self):
+        """Counter of the failed sweeps by database in the last window secs"""
+        return self._within_window(self._failures)
+
+
+def _format_counts(counts):
+    return ", ".join("{} {}".format(application, count) for application, count in counts.most_common()) or "none"
+
+
+def run_daemon(instances, policy, interval=SWEEP_INTERVAL, jitter=SWEEP_JITTER, window=ROLLING_WINDOW,
+               converge_timeout=CONVERGE_TIMEOUT, dry_run=False, sweeps=None):
+    """Sweeps the instance databases every interval secs until SIGTERM/SIGINT
+
+    The database connections stay open from one sweep to the next. Each
+    sweep starts interval secs (plus or minus jitter of it, so several
+    hosts don't hit a shared database in step) after the previous one
+    started, and writes a metrics sample when --metrics is on.
+
+    Args:
+        instances (list): one instance per database to sweep
+        sweeps (int): stop after this many sweeps, None runs until stopped
+
+    Returns:
+        ReapCounters
+    """
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop.set())
+    if default_driver() == PSQL:
+        print('psycopg2 is not installed, every query of every sweep starts psql')
+    # a failed sweep is counted and the daemon carries on, the next sweep may get through
+    counters = ReapCounters(window)
+    sweep = 0
+    while not stop.is_set():
+        started = time.monotonic()
+        sweep += 1
+        results = run_per_instance(lambda instance: kill_idle_queries_bulk(instance.db_name, policy, converge_timeout,
+                                                                           dry_run), instances)
+        reaped = collections.Counter()
+        failed = []
+        for instance, result, error in results:
+            if error is None and result["error"]:
+                error = result["error"]
+            if error is not None:
+                failed.append(instance.db_name)
+                counters.add_failure(instance.db_name)
+                print('{} ({}): failed - {}'.format(instance.name, instance.db_name, error))
+            if result is None:
+                continue
+            for row in result["sessions"]:
+                if result["outcomes"].get(row.pid, (None,))[0] in ("cancelled", "terminated"):
+                    reaped[row.application_name or "-"] += 1
+            count_metric("idleQueries", result["idle"])
+            count_metric("idlePidsCancelled", result["cancelled"])
+            count_metric("idlePidsTerminated", result["terminated"])
+            count_metric("idlePidsStillAlive", result["still_alive"])
+        for application, count in reaped.items():
+            counters.add(application, count)
+        recent = counters.recent()
+        recent_failures = counters.recent_failures()
+        print('sweep {} in {:.2f}s: reaped {} ({}){}; last {:g}s {}, failed {}; since start {}, failed {}'.format(
+            sweep, time.monotonic() - started, sum(reaped.values()), _format_counts(reaped),
+            ", FAILED in " + ", ".join(failed) if failed else "", window, _format_counts(recent),
+            _format_counts(recent_failures), _format_counts(counters.total), _format_counts(counters.failed)),
+            flush=True)
+
+        add_metric("sweep", sweep)
+        add_metric("reapedLastWindow", sum(recent.values()))
+        add_metric("reapedByApplication", ",".join("{}={}".format(application, count)
+                                                   for application, count in recent.most_common()))
+        add_metric("sweepFailures", len(failed))
+        add_metric("failedSweepsLastWindow", sum(recent_failures.values()))
+        if reaped:
+            set_action("reap idle sessions of " + ", ".join(sorted(reaped)))
+        set_result("failure" if failed else "success" if reaped else "no_action")
+        checkpoint()
+
+        if sweeps is not None and sweep >= sweeps:
+            break
+        delay = interval * (1 + random.uniform(-jitter, jitter))
+        stop.wait(max(0.0, delay - (time.monotonic() - started)))
+    return counters
+
+def kill_idle_queries(dbname, days):
+    """Cancels the idle in transaction sessions of dbname older than days, terminates the ones left
+
+    Returns:
+        dict: idle (count), cancelled, terminated
+    """
+    count = count_idle_queries(days, dbname)
+    if count == 0:
+        print('No idle queries older than '+days+' days in '+dbname)
+        return {"idle": 0, "cancelled": 0, "terminated": 0}
+
+    pids = get_list_of_idle_PIDS(days, dbname)
+    for pid in pids:
+        cancel_query(pid, dbname)
+
+    pids1 = get_list_of_idle_PIDS(days, dbname)
+    print('Following pids didnt get cancelled will apply terminate')
+    for pid1 in pids1:
+        terminate_query(pid1, dbname)
+    print('Successfully cancelled/terminated idle queries older than '+days+' days in '+dbname)
+    return {"idle": count, "cancelled": len(pids), "terminated": len(pids1)}
+
+if __name__ == '__main__':
+    try:
+        global logger
+        logger = logging.getLogger('Idle_queries')
+    except Exception as e:
+        raise e
+
+    exe_process = """Please enter an optional argument :
+                    days = No. of older days idle queries to kill Default 3
+                    policy = JSON file of thresholds per application, user, client and state
+                             (see idle_policy.py), instead of days
+                    """
+    parser = argparse.ArgumentParser(
+        epilog=exe_process, formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-days", "--days_older", default='3', help="No. of days older")
+    parser.add_argument("--per-pid", action="store_true",
+                        help="cancel/terminate with a statement per session instead of one for all of them")
+    parser.add_argument("--converge-timeout", type=float, default=CONVERGE_TIMEOUT, metavar="SECS",
+                        help="secs to wait for cancelled sessions to go before terminating them (default %(default)s)")
+    parser.add_argument("--policy", metavar="FILE", help="reap the sessions matched by this policy file")
+    parser.add_argument("--dry-run", action="store_true", help="list the sessions that would be reaped, signal none")
+    parser.add_argument("--max-kills", type=int, metavar="N", help="signal at most N sessions per database")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running, sweeping every --interval secs over the same connections")
+    parser.add_argument("--interval", type=float, default=SWEEP_INTERVAL, metavar="SECS",
+                        help="--daemon: secs between sweeps (default %(default)s)")
+    parser.add_argument("--jitter", type=float, default=SWEEP_JITTER, metavar="FRACTION",
+                        help="--daemon: vary the interval by up to this fraction of it (default %(default)s)")
+    parser.add_argument("--window", type=float, default=ROLLING_WINDOW, metavar="SECS",
+                        help="--daemon: window of the rolling reaped counters (default %(default)s)")
+    parser.add_argument("--sweeps", type=int, metavar="N", help="--daemon: stop after N sweeps")
+    add_instance_arguments(parser)
+
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
+    args_namespace = parser.parse_args()
+    args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
+
+    days = args.get('days_older')
+    if args.get('per_pid') and (args.get('policy') or args.get('dry_run') or args.get('max_kills') is not None
+                                or args.get('daemon')):
+        print('--per-pid works with -days only')
+        exit(1)
+    if args.get('daemon') and (args['interval'] <= 0 or not 0 <= args['jitter'] < 1):
+        print('--interval must be positive and --jitter between 0 and 1')
+        exit(1)
+    try:
+        policy = load_policy(args['policy']) if args.get('policy') else days_policy(days)
+    except (PolicyError, ValueError) as e:
+        print('Bad kill policy: {}'.format(e))
+        exit(1)
+    if args.get('max_kills') is not None:
+        policy.max_kills = args['max_kills']
+    for index, rule in enumerate(policy.rules):
+        print('rule {}: {}'.format(index + 1, rule.describe()))
+    reaping = "per policy " + args['policy'] if args.get('policy') else "older than {} days".format(days)
+
+    instances, stderr = select_instances(args.get('instance'))
+    if stderr:
+        print(stderr)
+    # instances sharing a database are swept once
+    databases = {}
+    for instance in instances:
+        if instance.db_name:
+            databases.setdefault(instance.db_name, instance)
+    if not databases:
+        print('No Campaign database found. exiting script')
+        exit(1)
+
+    if args.get('daemon'):
+        counters = run_daemon(list(databases.values()), policy, args['interval'], args['jitter'], args['window'],
+                              args['converge_timeout'], args['dry_run'], args.get('sweeps'))
+        exit(1 if counters.failed else 0)
+
+    if args.get('per_pid'):
+        kill = functools.partial(kill_idle_queries, days=days)
+    else:
+        kill = functools.partial(kill_idle_queries_bulk, policy=policy, converge_timeout=args['converge_timeout'],
+                                 dry_run=args['dry_run'])
+    results = run_per_instance(lambda instance: kill(instance.db_name), list(databases.values()))
+    idle = 0
+    cleanup_seconds = 0.0
+    failed = any(error is not None for _, _, error in results)
+    for instance, result, error in results:
+        if error is not None:
+            print('{} ({}): failed - {}'.format(instance.name, instance.db_name, error))
+            continue
+        if result.get("error"):
+            failed = True
+            print('{} ({}): failed - {}'.format(instance.name, instance.db_name, result["error"]))
+        print('{} ({}): {} idle, {} cancelled, {} terminated'.format(
+            instance.name, instance.db_name, result["idle"], result["cancelled"], result["terminated"]))
+        idle += result["idle"]
+        count_metric("idlePidsCancelled", result["cancelled"])
+        count_metric("idlePidsTerminated", result["terminated"])
+        count_metric("idlePidsStillAlive", result.get("still_alive", 0))
+        cleanup_seconds = max(cleanup_seconds, result.get("cleanup_seconds", 0.0))
+    add_metric("idleQueries", idle)
+    if idle > 0 and not args.get('per_pid'):
+        add_metric("idleCleanupSeconds", cleanup_seconds)
+    add_metric("instances", len(results))
+    if idle > 0 and args.get('dry_run'):
+        set_result("dry_run")
+        print('Dry run: {} idle queries {} would be reaped'.format(idle, reaping))
+    elif idle > 0:
+        set_action("cancel/terminate idle queries " + reaping)
+    elif not failed:
+        set_result("no_action")
+        print('No idle queries '+reaping+'. exiting script')
+    if failed:
+        exit(1)
\ No newline at end of file
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""
+Runs nlserver directly as neolane with a captured copy of its environment
+env.sh is sourced once per run (one sudo + bash), the resulting environment
+is kept, and every nlserver call after that is a plain exec under the
+neolane uid instead of `sudo -u neolane bash -c '. env.sh ; nlserver ...'`.
+Requirements: subprocess, os, pwd, shutil
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import os
+import shutil
+import socket
+import stat
+import subprocess
+from pwd import getpwnam
+
+import transcript
+from campaign_config import NEOLANE_HOME_GLOB
+from command_runner import run_argv, run_process, effective_timeout
+from neolane_helper import HelperUnavailable, helper_available, helper_request
+
+NEOLANE_USER = os.environ.get("ONCALL_NEOLANE_USER", "neolane")
+ENV_SCRIPT_GLOB = NEOLANE_HOME_GLOB + "/env.sh"
+SUDO = "/usr/bin/sudo"
+HELPER_GRACE = 5
+CAPTURE_COMMAND = [SUDO, "-u", NEOLANE_USER, "bash", "-c", ". " + ENV_SCRIPT_GLOB + " && env -0"]
+
+_environment = None
+
+
+def parse_environment(output):
+    """Parses `env -0` output into a dict"""
+    environment = {}
+    for entry in output.split("\0"):
+        if "=" in entry:
+            key, value = entry.split("=", 1)
+            environment[key] = value
+    return environment
+
+
+def capture_environment(refresh=False):
+    """Sources env.sh as neolane once and returns the resulting environment
+
+    Args:
+        refresh (bool): source env.sh again, e.g. after an upgrade
+
+    Returns:
+        environment: dict, empty if env.sh could not be sourced
+        stderr: standard error if any
+    """
+    global _environment
+    if _environment is not None and not refresh:
+        return _environment, ""
+
+    if os.geteuid() == getpwnam(NEOLANE_USER).pw_uid:
+        # already neolane, no sudo needed
+        command = CAPTURE_COMMAND[3:]
+    else:
+        command = CAPTURE_COMMAND
+    stdout, stderr, returncode = run_argv(command)
+    if returncode != 0:
+        return {}, stderr or "sourcing {} exited with {}".format(ENV_SCRIPT_GLOB, returncode)
+    _environment = parse_environment(stdout)
+    return _environment, ""
+
+
+def environment_summary():
+    """Captures the environment, for callers that only report that it worked
+
+    Returns:
+        stdout: number of variables captured from env.sh
+        stderr: standard error if any
+    """
+    environment, stderr = capture_environment()
+    if not environment:
+        return "", stderr
+    return "{} variables from {}".format(len(environment), ENV_SCRIPT_GLOB), ""
+
+
+def nlserver_argv(args, environment):
+    """Full argv for nlserver, resolved against the neolane PATH"""
+    nlserver = shutil.which("nlserver", path=environment.get("PATH")) or "nlserver"
+    return [nlserver] + [arg for arg in args if arg]
+
+
+def neolane_can_enter(path):
+    """True when neolane may chdir to path, judged on neolane's uid and group
+
+    os.access answers for the caller, and root passes everywhere while
+    nlserver runs as neolane (with only its primary group, see _privileges).
+    """
+    account = getpwnam(NEOLANE_USER)
+    if account.pw_uid == 0:
+        return os.path.isdir(path)
+    path = os.path.abspath(path)
+    while True:
+        try:
+            status = os.stat(path)
+        except OSError:
+            return False
+        if status.st_uid == account.pw_uid:
+            allowed = status.st_mode & stat.S_IXUSR
+        elif status.st_gid == account.pw_gid:
+            allowed = status.st_mode & stat.S_IXGRP
+        else:
+            allowed = status.st_mode & stat.S_IXOTH
+        if not allowed:
+            return False
+        parent = os.path.dirname(path)
+        if parent == path:
+            return True
+        path = parent
+
+
+def _privileges():
+    """Popen keywords to run as neolane, empty when we already are neolane"""
+    account = getpwnam(NEOLANE_USER)
+    if os.geteuid() == account.pw_uid:
+        return {}
+    return {"user": account.pw_uid, "group": account.pw_gid, "extra_groups": []}
+
+
+def run_nlserver(args, timeout=None, background=False, use_helper=True, cwd=None):
+    """Runs nlserver as neolane with the captured environment
+
+    When the neolane helper daemon is running the request goes to it
+    instead, which saves the fork and the privilege switch.
+
+    Args:
+        args (list): nlserver arguments, e.g. ['restart', 'inMail@instance', '-noconsole']
+        timeout (int): seconds to wait (capped by the run budget); nlserver and
+            its children are killed and subprocess.TimeoutExpired is raised
+        background (bool): start detached with output discarded and don't wait,
+            same as the old `nohup ... > /dev/null &`
+        use_helper (bool): go through the helper daemon when it is running
+        cwd (str): working directory for nlserver (relative -file paths), defaults to ours
+            when neolane may enter it; neolane's HOME otherwise
+
+    Returns:
+        stdout: output of nlserver
+        stderr: standard error if any
+        returncode: exit code of nlserver, None when started in background
+    """
+    if cwd is None and neolane_can_enter(os.getcwd()):
+        cwd = os.getcwd()
+    timeout = effective_timeout(timeout)
+
+    stdout, stderr, returncode, timed_out = transcript.call(
+        "nlserver", [list(args), background],
+        lambda: _run_nlserver(args, timeout, background, use_helper, cwd), list, tuple)
+    if timed_out:
+        raise subprocess.TimeoutExpired(["nlserver"] + list(args), timeout, stdout, stderr)
+    return stdout, stderr, returncode
+
+
+def _run_nlserver(args, timeout, background, use_helper, cwd):
+    """run_nlserver without the transcript, returns (stdout, stderr, returncode, timed_out)"""
+    if use_helper and helper_available():
+        # the helper enforces the timeout itself, the socket only waits a bit longer
+        socket_timeout = None if timeout is None else timeout + HELPER_GRACE
+        try:
+            response = helper_request("nlserver", timeout=socket_timeout, args=list(args),
+                                      background=background, cwd=cwd, run_timeout=timeout)
+        except socket.timeout:
+            return "", "", None, True
+        except HelperUnavailable:
+            pass
+        else:
+            return response["stdout"], response["stderr"], response["returncode"], bool(response.get("timed_out"))
+
+    environment, stderr = capture_environment()
+    if not environment:
+        return "", stderr, 127, False
+    argv = nlserver_argv(args, environment)
+    if not cwd or not neolane_can_enter(cwd):
+        # e.g. /root sent by a script run from root's home, nlserver couldn't start there
+        cwd = environment.get("HOME")
+
+    if background:
+        try:
+            subprocess.Popen(argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL, env=environment, cwd=cwd,
+                             start_new_session=True, **_privileges())
+        except OSError as e:
+            return "", str(e), 127, False
+        return "", "", None, False
+
+    result = run_process(argv, timeout, env=environment, cwd=cwd, **_privileges())
+    return result.stdout, result.stderr, result.returncode, result.timed_out
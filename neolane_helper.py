@@ -0,0 +1,251 @@
+#!/usr/bin/python3
+"""
+Optional helper daemon running as neolane, serving nlserver actions
+over a Unix domain socket so remediation doesn't fork sudo for every call.
+The helper keeps the env.sh environment and the parsed Campaign config warm
+and answers newline delimited JSON requests, many per connection:
+
+    {"action": "nlserver", "args": ["pdump", "-full", "web"], "run_timeout": 15}
+    {"action": "nlserver", "args": ["restart", "inMail@acme", "-noconsole"], "background": true}
+    {"action": "nlserver", "args": ["javascript", "-instance:acme", "-file", "x.js"], "cwd": "/tmp"}
+    {"action": "config"}
+    {"action": "ping"}
+
+Every response is {"ok": bool, "stdout": str, "stderr": str, "returncode": int,
+"timed_out": bool}. An nlserver that runs past run_timeout is killed by the helper.
+SQL doesn't go through the helper: the scripts query as the user running
+them (database.py), with their own connection.
+The socket is 0666 so root's scripts and neolane can both reach it; the
+helper then reads the uid of every connecting process (SO_PEERCRED) and
+closes the connection unless it is root or neolane. When the socket is not
+there the scripts run nlserver themselves as before.
+The socket directory must exist and be writable by neolane, which can't
+create directories in /run: the systemd unit oncall-neolane-helper.service
+has systemd create /run/oncall-neolane (RuntimeDirectory=), or point
+--socket / ONCALL_HELPER_SOCKET (for the scripts too) at a directory neolane
+owns.
+Requirements: socketserver, json, struct
+Input: --socket path (default ONCALL_HELPER_SOCKET, else /run/oncall-neolane/helper.sock)
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+Start: systemctl start oncall-neolane-helper, see oncall-neolane-helper.service
+       (or: sudo -u neolane python3 neolane_helper.py --socket DIR/helper.sock)
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+from argparse import RawTextHelpFormatter
+from dataclasses import asdict
+from pwd import getpwnam
+
+SOCKET_PATH = os.environ.get("ONCALL_HELPER_SOCKET", "/run/oncall-neolane/helper.sock")
+NLSERVER_VERBS = ("pdump", "monitor", "start", "stop", "restart", "javascript")
+CONNECT_TIMEOUT = 2
+
+logger = logging.getLogger("neolane_helper")
+
+
+class HelperUnavailable(Exception):
+    """The helper socket is missing or not answering"""
+
+
+def _peer_uid(connection):
+    credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    pid, uid, gid = struct.unpack("3i", credentials)
+    return uid
+
+
+def _response(stdout="", stderr="", returncode=0, timed_out=False):
+    return {"ok": returncode in (0, None) and not timed_out, "stdout": stdout, "stderr": stderr,
+            "returncode": returncode, "timed_out": timed_out}
+
+
+def handle_request(request):
+    """Runs one request and returns the response dict"""
+    # imported here so the client side stays light
+    from campaign_config import get_host_profile
+    from command_runner import timeout_message
+    from neolane_env import run_nlserver
+
+    action = request.get("action")
+    if action == "ping":
+        return _response("pong")
+
+    if action == "config":
+        return _response(json.dumps(asdict(get_host_profile())))
+
+    if action == "nlserver":
+        args = [str(arg) for arg in request.get("args", [])]
+        if not args or args[0] not in NLSERVER_VERBS:
+            return _response(stderr="nlserver verb not allowed: {}".format(args[:1]), returncode=2)
+        try:
+            stdout, stderr, returncode = run_nlserver(args, timeout=request.get("run_timeout"),
+                                                      background=bool(request.get("background")),
+                                                      use_helper=False, cwd=request.get("cwd"))
+        except subprocess.TimeoutExpired as e:
+            return _response(e.stdout or "", (e.stderr or "") + timeout_message(e.timeout, args),
+                             None, timed_out=True)
+        return _response(stdout, stderr, returncode)
+
+    return _response(stderr="unknown action: {}".format(action), returncode=2)
+
+
+class HelperHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        uid = _peer_uid(self.connection)
+        if uid not in self.server.allowed_uids:
+            logger.warning("refused connection from uid %s", uid)
+            return
+        for line in self.rfile:
+            try:
+                response = handle_request(json.loads(line))
+            except ValueError as e:
+                response = _response(stderr="bad request: {}".format(e), returncode=2)
+            except Exception as e:
+                logger.exception("error in handling request")
+                response = _response(stderr=str(e), returncode=1)
+            self.wfile.write((json.dumps(response) + "\n").encode())
+            self.wfile.flush()
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path=SOCKET_PATH):
+    """Runs the helper until killed"""
+    from campaign_config import get_host_profile
+    from neolane_env import capture_environment
+
+    # warm up once so the first request is as fast as the others
+    environment, stderr = capture_environment()
+    if not environment:
+        logger.error("could not capture the neolane environment: %s", stderr)
+    get_host_profile()
+
+    try:
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    except OSError as e:
+        # /run/oncall-neolane comes from RuntimeDirectory= of the systemd unit, neolane can't create it
+        raise SystemExit("cannot create the socket directory of {} ({}): start the helper with "
+                         "oncall-neolane-helper.service or pass --socket in a directory neolane can "
+                         "write".format(socket_path, e))
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = HelperServer(socket_path, HelperHandler)
+    server.allowed_uids = {0, getpwnam("neolane").pw_uid}
+    # anyone may connect, the peer uid (SO_PEERCRED) is checked on every connection
+    os.chmod(socket_path, 0o666)
+    logger.info("neolane helper listening on %s", socket_path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+class HelperClient:
+    """Connections to the helper, one per thread, each reused for every request of its thread
+
+    Requests and responses are lines on a stream, so two threads sharing a
+    connection could read each other's response; the helper serves each
+    connection in a thread of its own, so per-thread connections also keep
+    concurrent requests (run_per_instance) concurrent.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self._local = threading.local()
+
+    @property
+    def sock(self):
+        return getattr(self._local, "sock", None)
+
+    @property
+    def reader(self):
+        return getattr(self._local, "reader", None)
+
+    def connect(self):
+        if self.sock is not None:
+            return
+        if not os.path.exists(self.socket_path):
+            raise HelperUnavailable(self.socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(CONNECT_TIMEOUT)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise HelperUnavailable(str(e))
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+
+    def close(self):
+        """Closes the connection of the calling thread"""
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self._local.sock = None
+        self._local.reader = None
+
+    def request(self, action, timeout=None, **params):
+        """Sends one request and waits for its response
+
+        Args:
+            action (str): nlserver, config or ping
+            timeout (int): seconds to wait for the response, raises socket.timeout
+            params: fields of the request
+
+        Returns:
+            dict: response
+        """
+        self.connect()
+        params["action"] = action
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.sendall((json.dumps(params) + "\n").encode())
+            line = self.reader.readline()
+        except socket.timeout:
+            # the late answer would be read by the next request, start over
+            self.close()
+            raise
+        except OSError as e:
+            self.close()
+            raise HelperUnavailable(str(e))
+        if not line:
+            self.close()
+            raise HelperUnavailable("helper closed the connection")
+        return json.loads(line)
+
+
+_client = HelperClient()
+
+
+def helper_available():
+    """True when the helper socket exists"""
+    return os.path.exists(_client.socket_path)
+
+
+def helper_request(action, timeout=None, **params):
+    """Sends a request on the shared helper connection, see HelperClient.request"""
+    return _client.request(action, timeout=timeout, **params)
+
+
+if __name__ == '__main__':
+    exe_process = """Runs the neolane helper daemon, start it as the neolane user"""
+    parser = argparse.ArgumentParser(
+        epilog=exe_process, formatter_class=RawTextHelpFormatter)
+    parser.add_argument("-s", "--socket", default=SOCKET_PATH, help="Unix socket path")
+
+    args_namespace = parser.parse_args()
+    args = vars(args_namespace)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    serve(args.get("socket"))
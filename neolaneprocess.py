@@ -12,122 +12,107 @@ import sys
 import time
 import argparse
 from argparse import RawTextHelpFormatter
+from command_runner import CommandResult, invalidate_probes, timeout_message
+from neolane_env import run_nlserver
+from process_table import missing_processes
+from instances import add_instance_arguments, select_instances
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args, set_action
 
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True,
-                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
+ACTION_TIMEOUT = 15
 
 def run_action_command(action, process, no_console=True):
     """
     Runs commond in neolane user for given action and process
-    :return: output
+    :return: CommandResult, timed_out when nlserver was killed after ACTION_TIMEOUT secs
+        (the caller decides whether to go on with another process)
     """
+    args = [action] + process.split()
     if no_console:
-        end = " -noconsole' > /dev/null &"
-    else:
-        end = "'"
-    commands = [
-        "nohup /usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver " + action + " " +process+end+""
-    ]
-    print(commands)
+        args.append("-noconsole")
+    print(args)
+    set_action(" ".join(args[:2]))
+    started = time.monotonic()
     try:
-        result = subprocess.check_output(
-            commands[0], shell=True, universal_newlines=True, timeout=15)
-    except subprocess.TimeoutExpired:
-        print("timed out")
-        sys.exit(0)
+        stdout, stderr, returncode = run_nlserver(args, timeout=ACTION_TIMEOUT, background=no_console)
+        result = CommandResult(stdout, stderr, returncode, False, time.monotonic() - started)
+    except subprocess.TimeoutExpired as e:
+        result = CommandResult(e.stdout or "", timeout_message(e.timeout, ["nlserver"] + args), None, True,
+                               time.monotonic() - started)
+    if no_console:
+        # the process list is different now, whether or not nlserver finished
+        invalidate_probes()
     return result
 
-def get_hostname_new():
-    """Gets the hostname from predefined commands new/updated
+def get_process_hostname():
+    """Gets the missing processes from nlserver monitor -missing
 
     Returns:
-        hostname: string
+        hostname: list of name@instance
     """
-    hostname = ""
-    stdout, stderr = run_commands(
-        ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default | cut -d. -f1 | cut -d'-' -f2"])
+    hostname, stderr = missing_processes()
     if stderr:
-        print("error in fetching hostname")
-    else:
-        hostname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
+        print(stderr)
 
-    return hostname
-
-def get_process_hostname():
-    """Gets the hostname from predefined commands new/updated
-
-    Returns:
-        hostname: string
-    """
-    hostname = []
-    stdout = run_action_command('monitor', '-missing', False)
-
-    lineno = 0
-    lines = stdout.split("\n")
-    for line in lines:
-        if lineno > 0:
-            hostname.append(line)
-        lineno +=1
-    
     print("here is hostname in non-stop")
     print(hostname)
     return hostname
 
-def action_process(process, action):
+def action_process(process, action, instance_names=None):
     """Perform given action the inmail nlserver
 
+    Args:
+        instance_names (list): instances to act on, None for every instance
+
     Returns:
         None
     """
 
     if action == 'stop':
-        hostname = get_hostname_new()
-        print("its in stop - here is hostname " + hostname)
+        if instance_names is None:
+            instances, stderr = select_instances()
+            if stderr:
+                print(stderr)
+                sys.exit(1)
+            instance_names = [instance.name for instance in instances]
+        hostnames = instance_names
+        print("its in stop - here is hostname " + ", ".join(hostnames))
         time.sleep(5)
-        commands = [
-            "nohup /usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver " + action + " " + process + "@" +
-            hostname + " -noconsole' > /dev/null &"
-        ]
-        print(commands)
-        try:
-            result = subprocess.check_output(
-                commands[0], shell=True, universal_newlines=True, timeout=15)
-            print(result)
-            print('Successfull performed ' + action + ' on ' + process)
-        except subprocess.TimeoutExpired:
-            print("timed out")
-            sys.exit(0)
+        timed_out = []
+        for hostname in hostnames:
+            result = run_action_command(action, process + "@" + hostname)
+            if result.timed_out:
+                # stop the other instances all the same
+                print(result.stderr)
+                timed_out.append(hostname)
+                continue
+            print(result.stdout)
+            print('Successfull performed ' + action + ' on ' + process + '@' + hostname)
 
         time.sleep(5)
+        if timed_out:
+            sys.exit(1)
     else:
         hostname = get_process_hostname()
+        # one missing process per instance, e.g. inMail@acme and inMail@acme_rt on a shared host
+        matches = [proc for proc in hostname if proc.startswith(process)
+                   and (instance_names is None or proc.partition("@")[2] in instance_names)]
 
         if len(hostname) > 0:
-            for proc in hostname:
-                if proc.startswith(process):
-                    result = run_action_command(action, proc)
-                    print(result)
-                    print('Successfull performed ' + action + ' on ' + proc)
-                    break;
-            else:
+            timed_out = []
+            for proc in matches:
+                result = run_action_command(action, proc)
+                if result.timed_out:
+                    # go on with the next process, report it at the end
+                    print(result.stderr)
+                    timed_out.append(proc)
+                    continue
+                print(result.stdout)
+                print('Successfull performed ' + action + ' on ' + proc)
+            if timed_out:
+                print('Could not ' + action + ' ' + ", ".join(timed_out))
+                sys.exit(1)
+            if not matches:
                 print('Didnt perform action as their is a process missing but not matching with given input')
                 sys.exit(0)
         else:
@@ -147,11 +132,24 @@ if __name__ == '__main__':
     required_parser.add_argument("-a", "--action", help="Action")
     required_parser.add_argument("-p", "--process_name", help="Process Name",
                                  choices = ["inmail", "mta", "pipelined", "syslogd", "trackinglogd", "web", "wfserver"])
+    add_instance_arguments(parser)
 
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     action = args.get('action')
     process_name = args.get('process_name')
 
-    action_process(process_name, action)
+    instance_names = None
+    if args.get('instance'):
+        instances, stderr = select_instances(args['instance'])
+        if stderr:
+            print(stderr)
+            sys.exit(1)
+        instance_names = [instance.name for instance in instances]
+
+    action_process(process_name, action, instance_names)
@@ -47,6 +47,8 @@ from copy import deepcopy
 import argparse
 import sys
 from argparse import RawTextHelpFormatter
+from tracing import add_trace_argument, trace_from_args
+from profiling import add_profile_arguments, profile_from_args
 
 # key = "NRAK-NVRU3HTPPBY8RUWDYFCX2PH598W"
 key = "NRAK-DATZR69AHO4WU1609UG4HIDHOVR"
@@ -354,8 +356,12 @@ def main():
     parser.add_argument("-dw", "--desired_widget_name",
                         help="Desired Widget name")
 
+    add_trace_argument(parser)
+    add_profile_arguments(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    profile_from_args(args)
 
     actions = {
         "1": create_new_dashboard_from_brp,
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+Single entry point for the oncall scripts
+Dispatches `oncall <command> [args]` to the matching script. Only the
+chosen script is loaded, so quick actions don't pay for pandas, boto3 and
+friends used by the other tools.
+Requirements: argparse, runpy
+Input: command and its arguments
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+Install: ln -s /path/to/oncall-automation/oncall.py /usr/local/bin/oncall
+"""
+import argparse
+import os
+import runpy
+import sys
+from argparse import RawTextHelpFormatter
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+
+def _positional_action_process(args):
+    """`<action> <process>` -> `-a <action> -p <process>` for the nlserver process scripts"""
+    if len(args) >= 2 and not args[0].startswith('-') and not args[1].startswith('-'):
+        return ['-a', args[0], '-p', args[1]] + args[2:]
+    return args
+
+
+# command: (script, help, argument translation)
+COMMANDS = {
+    'camp-glops': ('camp_glops.py', 'check/install camp-glops and fix inMail', None),
+    'process': ('neolaneprocess.py', 'start/stop/restart a missing nlserver process, e.g. process restart inmail',
+                _positional_action_process),
+    'action-pdumps': ('action_pdumps.py', 'start/stop/restart an nlserver process from pdump/monitor output',
+                      _positional_action_process),
+    'acc-acs': ('acc-acs_updated.py', 'fix a sequence gap (ACC/ACS aware)', None),
+    'sequencegapfix': ('sequencegapfix.py', 'fix a sequence gap', None),
+    'kill-idle-queries': ('kill_idle_Queries.py', 'cancel/terminate idle database sessions', None),
+    'critical-workflow': ('critical_workflow_updated.py', 'restart a failed critical workflow', None),
+    'manage-host': ('Manage_host.py', 'add spare servers to /etc/hosts', None),
+    'login-monitor': ('RecreateLoginMonitorUser.py', 'repair the campaign-loginmonitor integration', None),
+    'recreate-login-user': ('recreate_login_user.py', 'recreate the campaign-loginmonitor user', None),
+    'neolane-helper': ('neolane_helper.py', 'run the neolane helper daemon (start as neolane)', None),
+    'sg-audit': ('SecurityGroupRules_AWS_Adobe.py', 'audit AWS security group rules', None),
+    'nr-scorecard': ('NRScorecard.py', 'build the New Relic customer scorecard', None),
+    'nr-tab-update': ('nrtabupdate_final_neat.py', 'update New Relic dashboard tabs', None),
+    'nr-widget-update': ('nrwidgetupdate_final_neat.py', 'update New Relic dashboard widgets', None),
+    'fleet': ('fleet.py', 'run one of these commands on many hosts over ssh', None),
+    'instances': ('instances.py', 'report every Campaign instance of the host', None),
+}
+
+# the old script names keep working, e.g. `oncall kill_idle_Queries -days 3`
+ALIASES = {os.path.splitext(script)[0]: command for command, (script, _, _) in COMMANDS.items()}
+ALIASES['inmail'] = 'camp-glops'
+
+
+def resolve_command(name):
+    """Returns the command name for a command or alias, None if unknown"""
+    if name in COMMANDS:
+        return name
+    return ALIASES.get(name)
+
+
+def run_subcommand(command, args):
+    """Runs the script of command as __main__ with args as its argv
+
+    Args:
+        command (str): key of COMMANDS
+        args (list): arguments for the script
+    """
+    script, _, translate = COMMANDS[command]
+    if translate is not None:
+        args = translate(args)
+    path = os.path.join(HERE, script)
+    sys.argv = [path] + list(args)
+    runpy.run_path(path, run_name='__main__')
+
+
+def build_parser():
+    commands_help = "\n".join("  {:<22}{}".format(command, description)
+                              for command, (_, description, _) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog='oncall', description='oncall automation commands:\n' + commands_help,
+        epilog='Run `oncall <command> -h` for the options of a command.',
+        formatter_class=RawTextHelpFormatter)
+    parser.add_argument('--budget', type=float, metavar='SECS',
+                        help='time the whole run may spend in shell/nlserver/psql calls;\n'
+                             'calls still running when it is used up are killed')
+    transcript_group = parser.add_mutually_exclusive_group()
+    transcript_group.add_argument('--record', metavar='FILE',
+                                  help='write every command, nlserver, HTTP and boto3 call with its\n'
+                                       'result and timing to FILE')
+    transcript_group.add_argument('--replay', metavar='FILE',
+                                  help='answer those calls from a recorded FILE instead')
+    parser.add_argument('--replay-speed', type=float, default=1.0, metavar='FACTOR',
+                        help='replay waits recorded time * FACTOR, 0 answers at once (default 1)')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='write a Chrome trace (chrome://tracing, Perfetto) of every command,\n'
+                             'request and sleep of the run to FILE')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='write a CPU profile (pstats) of the run to FILE and flamegraph\n'
+                             'stacks to FILE.folded')
+    parser.add_argument('--profile-mode', choices=('cprofile', 'sample'), default='cprofile',
+                        help='cprofile: exact call counts, slower run; sample: low overhead\n'
+                             '(default cprofile)')
+    parser.add_argument('--metrics', metavar='DIR',
+                        help='leave a New Relic custom integration sample of the run (duration,\n'
+                             'shell calls, action, result, time to healthy) in DIR')
+    parser.add_argument('command', metavar='command', help='command to run, see above')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='arguments of the command')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args_namespace = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    command = resolve_command(args_namespace.command)
+    if command is None:
+        parser.error("unknown command '{}'".format(args_namespace.command))
+    if args_namespace.budget is not None:
+        from command_runner import set_run_budget
+        set_run_budget(args_namespace.budget)
+    if args_namespace.record or args_namespace.replay:
+        import transcript
+        if args_namespace.record:
+            transcript.start(transcript.RECORD, args_namespace.record)
+        else:
+            transcript.start(transcript.REPLAY, args_namespace.replay, args_namespace.replay_speed)
+    if args_namespace.trace:
+        import tracing
+        tracing.start(args_namespace.trace)
+    if args_namespace.metrics:
+        import run_metrics
+        run_metrics.start(args_namespace.metrics)
+    if args_namespace.profile:
+        import profiling
+        profiling.start(args_namespace.profile, args_namespace.profile_mode)
+    run_subcommand(command, args_namespace.args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+"""
+Process table of the nlserver processes, parsed from nlserver pdump
+Turns pdump / pdump -full output into records (name, instance, pid, memory,
+start time) and monitor -missing output into process names. The table is
+kept for a few seconds and shared by every caller of the run, so a restart
+decision, the web@ check and memory triage cost one pdump between them.
+
+    17:30:51 >   Application server for Adobe Campaign Classic (7.3.2 build 9356@0347232 of 11/10/2022)
+    syslogd@default (841313) - 26.7 MB
+    mta@clarins_rt_prod3 (845538) - 271.2 MB
+    web@default (845943) - 801.3 MB
+    watchdog (2833137) - 7.8 MB
+
+Requirements: re, time, dataclasses
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import re
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+from command_runner import on_invalidate
+from neolane_env import run_nlserver
+
+PDUMP_TTL = 5
+PDUMP_TIMEOUT = 15
+RECORD_PATTERN = re.compile(r"^\s*(?P<name>[\w.-]+)(?:@(?P<instance>[\w.-]+))?\s+\((?P<pid>\d+)\)"
+                            r"(?:\s*-\s*(?P<memory>[\d.]+)\s*(?P<unit>[KMG])B)?")
+START_TIME_PATTERN = re.compile(r"\d{4}[/-]\d{2}[/-]\d{2}[ T]\d{2}:\d{2}:\d{2}|\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2}")
+MEMORY_UNITS = {"K": 1 / 1024, "M": 1, "G": 1024}
+
+_tables = {}
+_missing = {}
+
+
+@dataclass
+class ProcessRecord:
+    """One nlserver process of pdump"""
+    name: str
+    instance: str
+    pid: int
+    memory_mb: float = None
+    start_time: str = None
+    details: list = field(default_factory=list)
+
+    @property
+    def full_name(self):
+        """name@instance as nlserver expects it, just name for watchdog"""
+        return "{}@{}".format(self.name, self.instance) if self.instance else self.name
+
+
+@dataclass
+class ProcessTable:
+    """Parsed pdump output"""
+    header: list = field(default_factory=list)
+    processes: list = field(default_factory=list)
+    output: str = ""
+
+    @property
+    def banner(self):
+        """Product line(s) of the header, e.g. Application server for Adobe Campaign Classic (...)"""
+        return "\n".join(line for line in self.header if "Adobe Campaign" in line)
+
+    def find(self, name, instance=None):
+        """Processes called name (case-insensitive, e.g. inmail), of instance if given"""
+        return [process for process in self.processes
+                if process.name.lower() == name.lower() and (instance is None or process.instance == instance)]
+
+    def get(self, full_name):
+        """Process with name@instance, None if it isn't running"""
+        for process in self.processes:
+            if process.full_name == full_name:
+                return process
+        return None
+
+    def by_memory(self):
+        """Processes with the biggest first, for memory triage"""
+        return sorted(self.processes, key=lambda process: process.memory_mb or 0, reverse=True)
+
+
+def parse_pdump(output):
+    """Parses nlserver pdump or pdump -full output
+
+    Indented lines after a process (pdump -full) are kept in its details and
+    the first date/time found in them is taken as its start time.
+
+    Returns:
+        ProcessTable
+    """
+    table = ProcessTable(output=output)
+    for line in output.split("\n"):
+        if not line.strip():
+            continue
+        match = RECORD_PATTERN.match(line)
+        # -full details are indented, a process line is not (or at least has its memory)
+        if match and (match.group("memory") or not line[:1].isspace()):
+            memory = match.group("memory")
+            start_time = START_TIME_PATTERN.search(line[match.end():])
+            table.processes.append(ProcessRecord(
+                name=match.group("name"), instance=match.group("instance") or "", pid=int(match.group("pid")),
+                memory_mb=None if memory is None else round(float(memory) * MEMORY_UNITS[match.group("unit")], 1),
+                start_time=start_time.group(0) if start_time else None))
+        elif table.processes:
+            process = table.processes[-1]
+            process.details.append(line.strip())
+            if process.start_time is None:
+                start_time = START_TIME_PATTERN.search(line)
+                if start_time:
+                    process.start_time = start_time.group(0)
+        else:
+            table.header.append(line.split(">", 1)[-1].strip() if ">" in line else line.strip())
+    return table
+
+
+def parse_missing(output):
+    """Process names (name@instance) listed by nlserver monitor -missing"""
+    return [line.split()[0] for line in output.split("\n")[1:] if line.strip()]
+
+
+def _fresh(cache, key, ttl):
+    if key not in cache:
+        return False
+    taken_at, _, _ = cache[key]
+    return time.monotonic() - taken_at < ttl
+
+
+def _run_pdump(args):
+    try:
+        stdout, stderr, returncode = run_nlserver(args, timeout=PDUMP_TIMEOUT)
+    except subprocess.TimeoutExpired as e:
+        return "", "nlserver {} timed out after {:g} secs".format(" ".join(args), e.timeout), None
+    if returncode != 0 and not stderr:
+        stderr = "nlserver {} exited with {}".format(" ".join(args), returncode)
+    return stdout, stderr, returncode
+
+
+def get_process_table(target=None, full=False, refresh=False, ttl=PDUMP_TTL):
+    """Returns the process table, running pdump at most once every ttl seconds
+
+    Args:
+        target (str): process or name@instance to dump, None for all of them
+        full (bool): pdump -full, adds the details and start times
+        refresh (bool): run pdump even if the table is fresh
+        ttl (float): seconds a table is shared for
+
+    Returns:
+        table: ProcessTable, empty if pdump failed
+        stderr: error of pdump if any
+    """
+    key = (target, full)
+    if refresh or not _fresh(_tables, key, ttl):
+        args = ["pdump"] + (["-full"] if full else []) + ([target] if target else [])
+        stdout, stderr, returncode = _run_pdump(args)
+        _tables[key] = (time.monotonic(), parse_pdump(stdout), stderr)
+    _, table, stderr = _tables[key]
+    return table, stderr
+
+
+def missing_processes(refresh=False, ttl=PDUMP_TTL):
+    """Processes nlserver monitor -missing reports, cached like the table
+
+    Returns:
+        names: list of name@instance
+        stderr: error of monitor if any
+    """
+    if refresh or not _fresh(_missing, None, ttl):
+        stdout, stderr, returncode = _run_pdump(["monitor", "-missing"])
+        _missing[None] = (time.monotonic(), parse_missing(stdout), stderr)
+    _, names, stderr = _missing[None]
+    return names, stderr
+
+
+def invalidate_process_table():
+    """Drops the cached tables, after a process was started, stopped or restarted"""
+    _tables.clear()
+    _missing.clear()
+
+
+on_invalidate(invalidate_process_table)
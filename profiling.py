@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+"""
+CPU profile of a run: pstats file plus collapsed stacks for a flamegraph
+Two modes:
+  cprofile  cProfile of the main thread, exact call counts, slows Python code
+            down; a sampler runs alongside for the collapsed stacks
+  sample    only the sampler (every thread, every few ms), low overhead;
+            the pstats file is built from the samples, call counts are
+            sample counts
+FILE gets the pstats (python3 -m pstats FILE, snakeviz FILE) and
+FILE.folded the collapsed stacks (flamegraph.pl FILE.folded > run.svg, or
+load it in https://www.speedscope.app).
+Requirements: cProfile, pstats, marshal, threading
+Input: --profile FILE [--profile-mode cprofile|sample] (or ONCALL_PROFILE=FILE, ONCALL_PROFILE_MODE)
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import atexit
+import collections
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = "ONCALL_PROFILE"
+MODE_ENV = "ONCALL_PROFILE_MODE"
+CPROFILE = "cprofile"
+SAMPLE = "sample"
+MODES = (CPROFILE, SAMPLE)
+SAMPLE_INTERVAL = 0.005
+
+_path = None
+_mode = None
+_profiler = None
+_sampler = None
+_exit_registered = False
+
+
+class StackSampler(threading.Thread):
+    """Counts the Python stacks of every other thread every interval seconds"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.seconds = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            # a busy GIL makes the wait longer than interval, weigh the sample by the real gap
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                key = (names.get(ident, str(ident)), tuple(stack))
+                self.stacks[key] += 1
+                self.seconds[key] += elapsed
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self):
+        """Lines of thread;outer;...;inner count, the flamegraph.pl input format"""
+        lines = collections.Counter()
+        for (thread_name, stack), count in self.stacks.items():
+            lines[";".join([thread_name] + [_frame_name(code) for code in stack])] += count
+        return ["{} {}".format(stack, count) for stack, count in sorted(lines.items())]
+
+    def stats(self):
+        """Samples as a pstats dict, call counts are sample counts"""
+        stats = {}
+        for key, count in self.stacks.items():
+            stack, seconds = key[1], self.seconds[key]
+            functions = [_function_key(code) for code in stack]
+            for function in set(functions):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                entry[3] += seconds
+            leaf = stats[functions[-1]]
+            leaf[0] += count
+            leaf[1] += count
+            leaf[2] += seconds
+            for caller, callee in set(zip(functions, functions[1:])):
+                edge = stats[callee][4].get(caller, (0, 0, 0.0, 0.0))
+                stats[callee][4][caller] = (edge[0] + count, edge[1] + count, edge[2], edge[3] + seconds)
+        return {function: (cc, nc, tt, ct, callers) for function, (cc, nc, tt, ct, callers) in stats.items()}
+
+
+def _function_key(code):
+    return (code.co_filename, code.co_firstlineno, getattr(code, "co_qualname", code.co_name))
+
+
+def _frame_name(code):
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return "{}:{}".format(module, getattr(code, "co_qualname", code.co_name))
+
+
+def start(path, mode=CPROFILE):
+    """Starts profiling the run, the files are written when it ends
+
+    Args:
+        path (str): pstats file, the collapsed stacks go to path + ".folded"
+        mode (str): cprofile or sample
+    """
+    global _path, _mode, _profiler, _sampler, _exit_registered
+    if mode not in MODES:
+        raise ValueError("profile mode must be one of {}".format(", ".join(MODES)))
+    _path, _mode = path, mode
+    _sampler = StackSampler()
+    _sampler.start()
+    if mode == CPROFILE:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if not _exit_registered:
+        atexit.register(stop)
+        _exit_registered = True
+
+
+def active():
+    """True while the run is profiled"""
+    return _path is not None
+
+
+def stop():
+    """Stops profiling and writes the pstats and collapsed stack files"""
+    global _path, _profiler, _sampler
+    if _path is None:
+        return
+    path, profiler, sampler = _path, _profiler, _sampler
+    _path = _profiler = _sampler = None
+    if profiler is not None:
+        profiler.disable()
+    sampler.stop()
+    try:
+        if profiler is not None:
+            profiler.dump_stats(path)
+        else:
+            with open(path, "wb") as fp:
+                marshal.dump(sampler.stats(), fp)
+        with open(path + ".folded", "w") as fp:
+            fp.write("\n".join(sampler.collapsed()) + "\n")
+    except OSError as e:
+        print("could not write profile {}: {}".format(path, e), file=sys.stderr)
+        return
+    print("profile written to {} ({}), flamegraph stacks to {}.folded".format(path, _mode, path), file=sys.stderr)
+
+
+def add_profile_arguments(parser):
+    """Adds --profile FILE and --profile-mode to a script's argument parser"""
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write a CPU profile (pstats) to FILE and flamegraph stacks to FILE.folded")
+    parser.add_argument("--profile-mode", choices=MODES, default=CPROFILE,
+                        help="cprofile: exact, slower run; sample: low overhead (default cprofile)")
+
+
+def profile_from_args(args):
+    """Starts profiling when --profile was given, args is vars() of the parsed arguments"""
+    if args.get("profile"):
+        start(args["profile"], args.get("profile_mode") or CPROFILE)
+
+
+def profile_from_argv(argv=None):
+    """--profile FILE [--profile-mode MODE] for scripts without an argument parser, removed from argv"""
+    argv = sys.argv if argv is None else argv
+    mode = CPROFILE
+    if "--profile-mode" in argv:
+        index = argv.index("--profile-mode")
+        if index + 1 < len(argv):
+            mode = argv[index + 1]
+            del argv[index:index + 2]
+    if "--profile" in argv:
+        index = argv.index("--profile")
+        if index + 1 < len(argv):
+            start(argv[index + 1], mode)
+            del argv[index:index + 2]
+
+
+if os.environ.get(PROFILE_ENV):
+    start(os.environ[PROFILE_ENV], os.environ.get(MODE_ENV, CPROFILE))
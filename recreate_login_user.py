@@ -9,76 +9,57 @@ Date: 25-04-2023
 import subprocess
 import argparse
 from argparse import RawTextHelpFormatter
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
-
+from command_runner import memoize_probe
+from database import query
+from async_runner import gather_commands
+from host_facts import campaign_product
+from neolane_env import run_nlserver, environment_summary
+from campaign_config import get_host_profile, CONFIG_GLOB
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args
+
+PROBE_TIMEOUT = 60
+
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(
-        ["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         print("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
 def _is_is_ACC_or_ACS():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump -full web'"]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = campaign_product()
     return stdout, stderr
 
 def set_neolane_env():
-    commands = ['source /usr/local/neolane/nl*/env.sh']
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = environment_summary()
     return stdout, stderr
 
 def _get_instance_name():
-    commands = ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default |cut -d. -f1 |cut -d'-' -f2"]
-    stdout, stderr = run_commands(commands)
-    return stdout, stderr
+    instance_name = get_host_profile().instance_name
+    if not instance_name:
+        return "", "no Campaign instance config found under " + CONFIG_GLOB
+    return instance_name, ""
 
 def update_folder_settings(instance_id):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "/usr/local/neolane ; nlserver javascript -instance:{} -file " \
-                           "/etc/newrelic-infra/custom-integrations/loginmonitor/update_folder_settings.js'"\
-                            .format(instance_id)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file",
+                                               "/etc/newrelic-infra/custom-integrations/loginmonitor/update_folder_settings.js"])
     return stdout, stderr
 
 def create_credentials(instance_id):
     print("here is the instance id")
     print(instance_id)
-    run_workflow_command = "/usr/local/neolane ; nlserver javascript -instance:{} -file " \
-                           "/etc/newrelic-infra/custom-integrations/loginmonitor/create_credentials.js -arg:{}}'"\
-                            .format(instance_id,pwd)
-    commands = [run_workflow_command]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(["javascript", "-instance:" + instance_id, "-file",
+                                               "/etc/newrelic-infra/custom-integrations/loginmonitor/create_credentials.js",
+                                               "-arg:" + pwd.strip()])
     return stdout, stderr
 
 def create_file(file_path, data):
@@ -89,21 +70,24 @@ def create_file(file_path, data):
     #os.chown(file_path, neolane_uid, neolane_gid)
     return
 
-def check_for_failed_login(query_param,param2):
-    """This will return all critical failed workflows for you.
+def check_for_failed_login(query_param, param2, dbname=None):
+    """This will return the login user rows for you.
 
-    Args: None
+    Args:
+        query_param (str): operator table, xtkoperator or xtkuser
+        param2 (str): login name pattern
 
-    Return output which contains status and error if any
-    :rtype: Std output and error
+    Return rows of the user and error if any
+    :rtype: rows and error
     """
-    dbname = get_db_name()
-    sql_retrieve_command = "psql -d " + dbname + \
-                           " -c \"select * from {} where sname like '{}';\"".format(query_param, param2);
-    print(sql_retrieve_command)
-    stdout, stderr = run_commands([sql_retrieve_command])
+    if dbname is None:
+        dbname = get_db_name()
+    # a table name can't be a parameter, it is one of the two above
+    sql = "select * from {} where sname like %s;".format(query_param)
+    print(sql, param2)
+    rows, stderr = query(sql, (param2,), dbname)
     print(stderr)
-    return stdout, stderr
+    return rows, stderr
 
 if __name__ == '__main__':
 
@@ -116,12 +100,22 @@ if __name__ == '__main__':
     required_parser = parser.add_argument_group('required arguments')
     required_parser.add_argument("-ti", "--tenant_id", help="Tenant ID")
 
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     tenant_id = args.get('tenant_id')
 
-    stdout, stderr = _is_is_ACC_or_ACS()
+    # None of these depend on each other, so fire them together
+    probes = gather_commands({
+        'acc_or_acs': campaign_product,
+        'neolane_env': environment_summary,
+    }, timeout=PROBE_TIMEOUT)
+
+    stdout, stderr = probes['acc_or_acs']
     if stderr:
         print(stderr)
         exit(1)
@@ -138,12 +132,12 @@ if __name__ == '__main__':
 
     param2 = 'campaign-loginmonitor'
 
-    stdout, stderr = check_for_failed_login(query_param, param2)
+    rows, stderr = check_for_failed_login(query_param, param2)
     if stderr:
         print(stderr)
         exit(1)
-    print("stdout " + stdout)
-    if param2 not in stdout:
+    print("rows", rows)
+    if not rows:
         #random password generation
         process = subprocess.Popen(['openssl', 'rand', '-base64', '15'], shell=True, universal_newlines=True,
                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -151,7 +145,7 @@ if __name__ == '__main__':
 
         print("password created", pwd)
 
-        stdout, stderr = set_neolane_env()
+        stdout, stderr = probes['neolane_env']
         if stderr:
             print(stderr)
             exit(1)
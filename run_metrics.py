@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+"""
+Run metrics of the remediation scripts as a New Relic Infra custom integration
+A script run with --metrics DIR leaves one OncallRemediationSample in DIR
+when it exits, a daemon one per sweep: script, action taken, result, exit
+code, duration, number of shell/SQL/nlserver calls, time from the action to
+healthy, plus the script's own numbers (camp-glops throughput, idle PIDs
+killed, ...). The
+newrelic-infra agent picks them up through this file run as an integration,
+which prints the samples waiting in DIR and removes them:
+
+    # /etc/newrelic-infra/integrations.d/oncall-automation.yml
+    integrations:
+      - name: oncall-automation
+        exec: /usr/bin/python3 /path/to/oncall-automation/run_metrics.py --flush /var/db/newrelic-infra/oncall-automation
+        interval: 60s
+
+Requirements: json, time, atexit
+Input: --metrics DIR (or FILE) on the scripts, ONCALL_METRICS; --flush DIR for the agent
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import argparse
+import atexit
+import builtins
+import glob
+import json
+import os
+import sys
+import time
+
+import transcript
+
+METRICS_ENV = "ONCALL_METRICS"
+INTEGRATION_NAME = "com.adobe.campaign.oncall-automation"
+INTEGRATION_VERSION = "1.0.0"
+EVENT_TYPE = "OncallRemediationSample"
+SAMPLE_GLOB = "oncall-*.json"
+# calls that start a process (or use the shell session), the shellCalls of the sample
+SHELL_KINDS = ("shell", "argv", "stream", "async", "nlserver")
+
+_started = time.monotonic()
+_path = None
+_action = None
+_action_started = None
+_healthy_after = None
+_result = None
+_exit_code = None
+_error = None
+_metrics = {}
+_counts_base = {}
+_checkpoints = 0
+
+
+def set_action(action):
+    """Records the remediation taken, time to healthy is counted from the first one
+
+    Args:
+        action (str): e.g. restart inMail@acme
+    """
+    global _action, _action_started
+    _action = action if _action is None else "{}; {}".format(_action, action)
+    if _action_started is None:
+        _action_started = time.monotonic()
+
+
+def mark_healthy():
+    """Records that the service is healthy again (the first time counts)"""
+    global _healthy_after
+    if _healthy_after is None:
+        _healthy_after = time.monotonic() - (_action_started or _started)
+
+
+def set_result(result):
+    """Overrides the result worked out from the exit code (success, failure, error)"""
+    global _result
+    _result = result
+
+
+def add_metric(name, value):
+    """Adds a number or string of the script to the sample, e.g. idlePidsKilled"""
+    _metrics[name] = value
+
+
+def count_metric(name, increment=1):
+    """Adds increment to a counter of the sample"""
+    _metrics[name] = _metrics.get(name, 0) + increment
+
+
+def sample():
+    """The sample of the run so far"""
+    counts = {kind: count - _counts_base.get(kind, 0) for kind, count in transcript.call_counts().items()}
+    exit_code = 0 if _exit_code is None else _exit_code
+    if _result is not None:
+        result = _result
+    else:
+        result = "error" if _error else "success" if exit_code == 0 else "failure"
+    data = {
+        "event_type": EVENT_TYPE,
+        "script": os.path.basename(sys.argv[0]),
+        "action": _action or "none",
+        "result": result,
+        "exitCode": str(exit_code),
+        "durationSeconds": round(time.monotonic() - _started, 3),
+        "shellCalls": sum(counts.get(kind, 0) for kind in SHELL_KINDS),
+    }
+    for kind, count in counts.items():
+        data["calls" + kind.capitalize()] = count
+    if _healthy_after is not None:
+        data["timeToHealthySeconds"] = round(_healthy_after, 3)
+    if _error:
+        data["error"] = _error
+    data.update(_metrics)
+    return data
+
+
+def payload(samples):
+    """Custom integration output (protocol 2, local entity) holding samples"""
+    return {"name": INTEGRATION_NAME, "protocol_version": "2", "integration_version": INTEGRATION_VERSION,
+            "data": [{"metrics": samples, "inventory": {}, "events": []}]}
+
+
+def _record_exit(original):
+    def exit(code=None):
+        global _exit_code
+        _exit_code = code if isinstance(code, int) or code is None else 1
+        original(code)
+    return exit
+
+
+def _record_exception(original):
+    def excepthook(exc_type, value, traceback):
+        global _exit_code, _error
+        _exit_code = 1
+        _error = "{}: {}".format(exc_type.__name__, value)
+        original(exc_type, value, traceback)
+    return excepthook
+
+
+def start(path):
+    """Writes the sample of the run to path (a directory, or a file) when it exits"""
+    global _path
+    if _path is None:
+        # the scripts leave with sys.exit() and exit() alike
+        sys.exit = _record_exit(sys.exit)
+        builtins.exit = _record_exit(builtins.exit)
+        sys.excepthook = _record_exception(sys.excepthook)
+        atexit.register(_write_at_exit)
+    _path = path
+
+
+def write():
+    """Writes the sample, a file written this way is only ever complete"""
+    if _path is None:
+        return
+    path = _path
+    if os.path.isdir(path):
+        path = os.path.join(path, "oncall-{}-{}-{}{}.json".format(
+            os.path.splitext(os.path.basename(sys.argv[0]))[0], int(time.time()), os.getpid(),
+            "-{}".format(_checkpoints) if _checkpoints else ""))
+    try:
+        with open(path + ".tmp", "w") as fp:
+            json.dump(payload([sample()]), fp)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print("could not write run metrics {}: {}".format(path, e), file=sys.stderr)
+
+
+def _write_at_exit():
+    # a daemon stopped between sweeps has reported them all already
+    if _checkpoints and _action is None and not _metrics and not _exit_code and _error is None:
+        return
+    write()
+
+
+def checkpoint():
+    """Writes the sample so far and starts a new one, for a daemon reporting every sweep
+
+    Calls, duration, action and the script's metrics of the next sample
+    count from here.
+    """
+    global _started, _action, _action_started, _healthy_after, _result, _metrics, _counts_base, _checkpoints
+    write()
+    _checkpoints += 1
+    _started = time.monotonic()
+    _action = _action_started = _healthy_after = _result = None
+    _metrics = {}
+    _counts_base = transcript.call_counts()
+
+
+def flush(directory):
+    """Prints the samples waiting in directory as one payload and removes them"""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, SAMPLE_GLOB))):
+        try:
+            with open(path) as fp:
+                for entry in json.load(fp)["data"]:
+                    samples.extend(entry["metrics"])
+            os.unlink(path)
+        except (OSError, ValueError, KeyError) as e:
+            print("skipping {}: {}".format(path, e), file=sys.stderr)
+    print(json.dumps(payload(samples)))
+
+
+def add_metrics_argument(parser):
+    """Adds --metrics DIR to a script's argument parser"""
+    parser.add_argument("--metrics", metavar="DIR",
+                        help="leave a New Relic custom integration sample of the run in DIR (or FILE)")
+
+
+def metrics_from_args(args):
+    """Starts writing run metrics when --metrics was given, args is vars() of the parsed arguments"""
+    if args.get("metrics"):
+        start(args["metrics"])
+
+
+def metrics_from_argv(argv=None):
+    """--metrics DIR for scripts without an argument parser, removed from argv"""
+    argv = sys.argv if argv is None else argv
+    if "--metrics" in argv:
+        index = argv.index("--metrics")
+        if index + 1 < len(argv):
+            start(argv[index + 1])
+            del argv[index:index + 2]
+
+
+if os.environ.get(METRICS_ENV) and __name__ != '__main__':
+    start(os.environ[METRICS_ENV])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="newrelic-infra integration: print and remove the waiting samples")
+    parser.add_argument("--flush", metavar="DIR", required=True, help="directory the scripts write to")
+    flush(parser.parse_args().flush)
@@ -1,60 +1,42 @@
 #!/usr/bin/python3
 """
 Python3 script for fixing sequencegap of user's input
-Requirements: subprocess, time, logging
+Requirements: logging
 Input: None
 Author: Shivakumar Bommakanti
 Date: 21-03-2023
 """
-import subprocess
-import time
 import logging
 import argparse
 from argparse import RawTextHelpFormatter
-
-def run_commands(commands):
-    """Runs unix commands using subprocess module
-
-    Args:
-        commands (list): list of commands to execute
-
-    Returns:
-        stdout: output of the commands
-        stderr: standard error if any
-    """
-    process = subprocess.Popen("/bin/bash", shell=True, universal_newlines=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    for command in commands:
-        command += "\n"
-        process.stdin.write(command)
-    process.stdin.flush()
-    stdout, stderr = process.communicate()
-    process.stdin.close()
-    return stdout, stderr
+from command_runner import memoize_probe
+from neolane_env import run_nlserver
+from host_facts import campaign_product
+from campaign_config import get_host_profile, CONFIG_GLOB
+from tracing import add_trace_argument, trace_from_args
+from run_metrics import add_metrics_argument, metrics_from_args
 
 def _is_is_ACC_or_ACS():
-    commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ; nlserver pdump -full web'"]
-    stdout, stderr = run_commands(commands)
+    stdout, stderr = campaign_product()
     return stdout, stderr
 
 def _get_instance_name():
-    commands = ["ls /usr/local/neolane/nl*/conf/config*xml | grep -v default |cut -d. -f1 |cut -d'-' -f2"]
-    stdout, stderr = run_commands(commands)
-    return stdout, stderr
+    instance_name = get_host_profile().instance_name
+    if not instance_name:
+        return "", "no Campaign instance config found under " + CONFIG_GLOB
+    return instance_name, ""
 
+@memoize_probe
 def get_db_name():
-    """Gets the database name from predefined commands
+    """Gets the database name from the Campaign config
 
     Returns:
         db name: string
     """
-    dbname = ""
-    stdout, stderr = run_commands(["cat /usr/local/neolane/nl*/conf/config-*.xml | grep db | grep login | awk -F'login=\"' '{print $2}' | awk -F':' '{print $1}'"])
-    if stderr:
+    dbname = get_host_profile().db_name
+    if not dbname:
         print("error in fetching dbname")
         logging.info("error in fetching dbname")
-    else:
-        dbname = stdout.replace('\n', '').replace('\t', '').replace(' ', '')
 
     return dbname
 
@@ -75,8 +57,12 @@ if __name__ == '__main__':
     required_parser = parser.add_argument_group('required arguments')
     parser.add_argument("-s", "--sequence", help="Sequence ID")
     parser.add_argument("-fp", "--file_path", help="File Path")
+    add_trace_argument(parser)
+    add_metrics_argument(parser)
     args_namespace = parser.parse_args()
     args = vars(args_namespace)
+    trace_from_args(args)
+    metrics_from_args(args)
 
     stdout, stderr = _is_is_ACC_or_ACS()
     if stderr:
@@ -104,16 +90,14 @@ if __name__ == '__main__':
         if file_path == "":
             file_path = "/usr/local/neolane/acc_sequences_gapFinder.js"
         _file_update(file_path, sequence, "50000000")
-        commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ;  nlserver javascript -instance:{} -file "+file_path+"'"
-                    .format(instance_name)]
+        args = ["javascript", "-instance:" + instance_name, "-file", file_path]
     else:
         if file_path == "":
             file_path = "/usr/local/neolane/acs_sequences_gapFinder.js"
         _file_update("/usr/local/neolane/acs_sequences_gapFinder.js", sequence, "50000000")
-        commands = ["/usr/bin/sudo -u neolane bash -c '. /usr/local/neolane/nl*/env.sh ;  nlserver javascript -instance:{} -file "+file_path+"'"
-                    .format(instance_name)]
+        args = ["javascript", "-instance:" + instance_name, "-file", file_path]
 
-    stdout, stderr = run_commands(commands)
+    stdout, stderr, returncode = run_nlserver(args)
     if stderr:
         print(stderr)
         logging.info(stderr)
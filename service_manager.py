@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+"""
+Start/stop/enable system services (camp-glops, dovecot, ...) on Debian and CentOS
+One implementation for Debian init.d scripts and update-rc.d, one for
+CentOS systemd. The state of several services is read in one shell call,
+and a batch of changes is applied, and the services re-checked, in one
+shell call as well, instead of a round trip per command and per-OS
+branches in every script.
+
+    services = get_service_manager()
+    states, stderr = services.apply([("stop", "dovecot"), ("disable", "dovecot"), ("restart", "camp-glops")])
+    if not states["camp-glops"].active: ...
+
+Requirements: dataclasses, abc
+Input: None
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import shlex
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from command_runner import run_commands, invalidate_probes
+from host_facts import os_name
+
+SERVICE_TIMEOUT = 120
+MARK = "@@oncall-service"
+VERBS = ("start", "stop", "restart", "enable", "disable")
+
+
+@dataclass
+class ServiceState:
+    """State of one service"""
+    name: str
+    active: bool
+    enabled: bool = None
+    output: str = ""
+
+
+class ServiceManager(ABC):
+    """Shell commands of one init system, run in batches
+
+    Subclasses give the command checking a service is running and the one
+    checking it starts at boot (exit 0 = yes), and the commands of a change.
+    A subclass missing one of them can't be instantiated, rather than
+    failing halfway through a batch.
+    """
+    package_commands = []
+
+    def __init__(self, timeout=SERVICE_TIMEOUT):
+        self.timeout = timeout
+
+    @abstractmethod
+    def active_command(self, name):
+        """Shell command exiting 0 when the service is running"""
+
+    @abstractmethod
+    def enabled_command(self, name):
+        """Shell command exiting 0 when the service starts at boot"""
+
+    @abstractmethod
+    def change_commands(self, changes):
+        """Shell commands for [(verb, service), ...]"""
+
+    def install_commands(self, package):
+        """Shell commands installing package"""
+        return [command.format(package=shlex.quote(package)) for command in self.package_commands]
+
+    def status_commands(self, names, enabled=False):
+        """Shell commands printing the state of every service, for parse_status
+
+        Args:
+            names (list): services
+            enabled (bool): check whether they start at boot too
+        """
+        commands = []
+        for name in names:
+            commands += ["echo '{} {}'".format(MARK, name),
+                         "{} 2>&1; echo \"{}active $?\"".format(self.active_command(name), MARK)]
+            if enabled:
+                commands.append("{} >/dev/null 2>&1; echo \"{}enabled $?\"".format(self.enabled_command(name), MARK))
+        return commands
+
+    def batch_commands(self, changes):
+        """Shell commands applying the changes, reporting the failed ones, then the state"""
+        commands = []
+        for verb, name in changes:
+            if verb not in VERBS:
+                raise ValueError("unknown service change {} {}".format(verb, name))
+        for command in self.change_commands(changes):
+            # stderr is already taken, the failures are told apart on stdout
+            commands.append("{} || echo \"{}failed $?\" {}".format(command, MARK, shlex.quote(command)))
+        enabled = any(verb in ("enable", "disable") for verb, _ in changes)
+        return commands + self.status_commands(list(dict.fromkeys(name for _, name in changes)), enabled)
+
+    def status(self, names, enabled=False):
+        """Reads the state of the services in one shell call
+
+        Args:
+            names (list): services
+            enabled (bool): check whether they start at boot too, else enabled is None
+
+        Returns:
+            states: dict name -> ServiceState
+            stderr: error of the shell if any
+        """
+        stdout, stderr = run_commands(self.status_commands(names, enabled), timeout=self.timeout)
+        states, _ = parse_status(stdout)
+        return states, stderr
+
+    def apply(self, changes):
+        """Applies a batch of changes and reads the resulting state, in one shell call
+
+        Args:
+            changes (list): (verb, service) in order, verb is start, stop, restart, enable or disable
+
+        Returns:
+            states: dict name -> ServiceState of every service changed
+            stderr: error output, with a line per command that failed
+        """
+        stdout, stderr = run_commands(self.batch_commands(changes), timeout=self.timeout)
+        # services (and the processes behind them) changed, the run's probes are stale
+        invalidate_probes()
+        states, failures = parse_status(stdout)
+        return states, "\n".join([stderr.strip()] + failures).strip()
+
+
+class InitdServiceManager(ServiceManager):
+    """Debian: /etc/init.d scripts, update-rc.d for the boot links"""
+    package_commands = ["apt-get update -y", "apt-get install {package} -y"]
+
+    def active_command(self, name):
+        return "/etc/init.d/{} status".format(name)
+
+    def enabled_command(self, name):
+        return "ls /etc/rc[2345].d/S??{}".format(name)
+
+    def change_commands(self, changes):
+        return ["/etc/init.d/{} {}".format(name, verb) if verb in ("start", "stop", "restart")
+                else "update-rc.d {} {}".format(name, verb) for verb, name in changes]
+
+
+class SystemdServiceManager(ServiceManager):
+    """CentOS: systemctl"""
+    package_commands = ["yum update -y", "yum install {package} -y"]
+
+    def active_command(self, name):
+        return "systemctl status {}.service".format(name)
+
+    def enabled_command(self, name):
+        return "systemctl is-enabled {}.service".format(name)
+
+    def change_commands(self, changes):
+        # systemctl takes many units per verb, consecutive changes with the same verb go together
+        commands = []
+        groups = []
+        for verb, name in changes:
+            if groups and groups[-1][0] == verb:
+                groups[-1][1].append(name)
+            else:
+                groups.append((verb, [name]))
+        for verb, names in groups:
+            commands.append("systemctl {} {}".format(verb, " ".join(name + ".service" for name in names)))
+        return commands
+
+
+SERVICE_MANAGERS = {"Debian": InitdServiceManager, "CentOS": SystemdServiceManager}
+
+
+def parse_status(stdout):
+    """Parses the output of status_commands / batch_commands
+
+    Returns:
+        states: dict name -> ServiceState
+        failures: lines for the changes that failed
+    """
+    states = {}
+    failures = []
+    name, output = None, []
+    for line in stdout.split("\n"):
+        if line.startswith(MARK + " "):
+            name, output = line[len(MARK) + 1:], []
+            states[name] = ServiceState(name, False)
+        elif line.startswith(MARK + "active ") and name:
+            # LSB status exits 0 when running; some init scripts say "not running" and exit 0 anyway
+            text = "\n".join(output)
+            states[name].active = line.split()[-1] == "0" and "not running" not in text.lower()
+            states[name].output = text
+        elif line.startswith(MARK + "enabled ") and name:
+            states[name].enabled = line.split()[-1] == "0"
+        elif line.startswith(MARK + "failed "):
+            _, returncode, command = line.split(" ", 2)
+            failures.append("{} failed with exit code {}".format(command, returncode))
+        elif name:
+            output.append(line)
+    return states, failures
+
+
+def get_service_manager(timeout=SERVICE_TIMEOUT):
+    """Service manager of this host's OS (hostnamectl, cached in the host facts)
+
+    Returns:
+        ServiceManager, None if the OS is neither Debian nor CentOS
+    """
+    stdout, stderr = os_name()
+    for os_release, manager in SERVICE_MANAGERS.items():
+        if os_release in stdout:
+            return manager(timeout)
+    return None
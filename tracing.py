@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+"""
+Per-step timing trace of a run, written as Chrome trace JSON
+Every shell batch, program run, nlserver call, HTTP request, boto3 call and
+time.sleep of the run becomes a span with its command, duration and exit
+status, plus one span for the whole run. Open the file in chrome://tracing
+or https://ui.perfetto.dev to see which steps are slow.
+Requirements: json, threading, atexit
+Input: --trace FILE on the scripts (or oncall --trace FILE, or ONCALL_TRACE=FILE)
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import atexit
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+TRACE_ENV = "ONCALL_TRACE"
+NAME_LENGTH = 120
+
+_path = None
+_origin = None
+_events = []
+_lock = threading.Lock()
+_lanes = itertools.count(1000)
+_exit_registered = False
+_start_callbacks = []
+
+
+def start(path):
+    """Starts tracing the run, the trace is written to path when it ends
+
+    Args:
+        path (str): trace file
+    """
+    global _path, _origin, _exit_registered
+    _path = path
+    _origin = time.perf_counter()
+    del _events[:]
+    _hook_sleep()
+    for callback in _start_callbacks:
+        callback()
+    # HTTP and boto3 calls are seen through the transcript hooks, it registers them on import
+    import transcript  # noqa: F401
+    if not _exit_registered:
+        atexit.register(stop)
+        _exit_registered = True
+
+
+def on_start(callback):
+    """Registers callback to run when tracing starts, now if it already did"""
+    _start_callbacks.append(callback)
+    if active():
+        callback()
+
+
+def active():
+    """True while the run is traced"""
+    return _path is not None
+
+
+def new_lane():
+    """Thread id for spans that overlap on one thread, e.g. asyncio probes"""
+    return next(_lanes)
+
+
+@contextlib.contextmanager
+def span(name, category, lane=None, **args):
+    """Records the enclosed block as one span
+
+    Args:
+        name (str): what ran, e.g. the command line
+        category (str): shell, argv, nlserver, http, boto3, sleep, ...
+        lane (int): thread id to show it on, defaults to the current thread
+        args: details shown with the span, the block may add more (exit status, ...)
+
+    Yields:
+        dict: args of the span
+    """
+    if _path is None:
+        yield args
+        return
+    started = time.perf_counter()
+    try:
+        yield args
+    except Exception as e:
+        args.setdefault("error", repr(e))
+        raise
+    finally:
+        _add(name, category, started, time.perf_counter(), lane, args)
+
+
+def _add(name, category, started, ended, lane, args):
+    event = {"name": name[:NAME_LENGTH], "cat": category, "ph": "X",
+             "ts": round((started - _origin) * 1e6), "dur": round((ended - started) * 1e6),
+             "pid": os.getpid(), "tid": lane or threading.get_native_id(), "args": args}
+    with _lock:
+        _events.append(event)
+
+
+def describe(kind, key):
+    """Span name for a call of the transcript kinds"""
+    if kind == "shell":
+        return "; ".join(key)
+    if kind in ("argv", "async"):
+        return " ".join(str(part) for part in key)
+    if kind == "stream":
+        return key if isinstance(key, str) else " ".join(key)
+    if kind == "nlserver":
+        return "nlserver " + " ".join(key[0])
+    if kind == "http":
+        return "{} {}".format(key[0], key[1])
+    if kind == "boto3":
+        return "{}.{} {}".format(key[0], key[2], key[1] or "")
+    if kind == "sql":
+        return "{}: {}".format(key[0], " ".join(key[1].split()))
+    return "{} {}".format(kind, json.dumps(key, default=str))
+
+
+def outcome(kind, result):
+    """Exit status details of a call result, for the span args"""
+    if kind in ("shell", "argv"):
+        return {"returncode": result.returncode, "timed_out": result.timed_out}
+    if kind in ("nlserver", "async"):
+        return {"returncode": result[2], "timed_out": bool(result[3]) if len(result) > 3 else result[2] is None}
+    if kind == "http":
+        return {"status": result.status_code}
+    if kind == "sql":
+        return {"rows": len(result.rows), "rowcount": result.rowcount, "error": result.error[:200]}
+    return {}
+
+
+def _hook_sleep():
+    original = time.sleep
+    if getattr(original, "trace_hook", False):
+        return
+
+    def sleep(seconds):
+        with span("sleep {:g}s".format(seconds), "sleep", seconds=seconds):
+            original(seconds)
+    sleep.trace_hook = True
+    time.sleep = sleep
+
+
+def stop():
+    """Writes the trace and stops tracing"""
+    global _path
+    if _path is None:
+        return
+    path, _path = _path, None
+    ended = time.perf_counter()
+    with _lock:
+        events = list(_events)
+    events.insert(0, {"name": os.path.basename(sys.argv[0]) or "run", "cat": "run", "ph": "X", "ts": 0,
+                      "dur": round((ended - _origin) * 1e6), "pid": os.getpid(),
+                      "tid": threading.main_thread().native_id, "args": {"argv": sys.argv}})
+    try:
+        with open(path, "w") as fp:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp)
+    except OSError as e:
+        print("could not write trace {}: {}".format(path, e), file=sys.stderr)
+
+
+def add_trace_argument(parser):
+    """Adds --trace FILE to a script's argument parser"""
+    parser.add_argument("--trace", metavar="FILE",
+                        help="write a Chrome trace of every command, request and sleep to FILE")
+
+
+def trace_from_args(args):
+    """Starts tracing when --trace was given, args is vars() of the parsed arguments"""
+    if args.get("trace"):
+        start(args["trace"])
+
+
+def trace_from_argv(argv=None):
+    """--trace FILE for scripts without an argument parser, removed from argv"""
+    argv = sys.argv if argv is None else argv
+    if "--trace" in argv:
+        index = argv.index("--trace")
+        if index + 1 < len(argv):
+            start(argv[index + 1])
+            del argv[index:index + 2]
+
+
+if os.environ.get(TRACE_ENV):
+    start(os.environ[TRACE_ENV])
@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+"""
+Record/replay of everything the oncall scripts ask of the outside world
+In record mode every shell batch, program run, nlserver call, SQL statement,
+host config lookup, HTTP request and boto3 call is written with its result
+and how long it took to a JSON lines transcript. In replay mode the same calls are
+answered from the transcript in the recorded order, after waiting for the
+recorded time (scaled by the replay speed), so a whole run can be timed on
+a machine without Campaign, the database or network access.
+Request headers and auth are never written, only method, url and body.
+Secrets are written as <redacted>: values of columns and fields named like a
+password, secret, token or API key (spassword, ...) and the -arg: values passed
+to nlserver. A replay gets the same redacted values, and the transcript is
+created readable by its owner only.
+Files edited by the scripts themselves (/etc/hosts, config-*.xml, ...) are
+not intercepted, replay those scripts in a scratch container.
+Requirements: json, threading, base64
+Input: ONCALL_RECORD=path or ONCALL_REPLAY=path (or oncall --record/--replay),
+       ONCALL_REPLAY_SPEED (1 = recorded latencies, 0 = no waiting)
+Author: Shivakumar Bommakanti
+ver 1 : Created - 18-10-2026
+"""
+import base64
+import collections
+import json
+import os
+import re
+import threading
+import time
+
+import tracing
+
+RECORD = "record"
+REPLAY = "replay"
+RECORD_ENV = "ONCALL_RECORD"
+REPLAY_ENV = "ONCALL_REPLAY"
+SPEED_ENV = "ONCALL_REPLAY_SPEED"
+REDACTED = "<redacted>"
+SECRET_NAME = re.compile(r"pass|secret|token|api_?key|credential", re.IGNORECASE)
+SECRET_ARG = re.compile(r"(-arg:)\S+")
+
+_mode = None
+_speed = 1.0
+_file = None
+_entries = {}
+_lock = threading.Lock()
+_local = threading.local()
+_call_counts = collections.Counter()
+# replay waits with the real sleep, a traced run would count it as the script's own
+_wait = time.sleep
+
+
+class TranscriptMiss(Exception):
+    """Replay found no recorded answer for a call"""
+
+
+def _redact_value(value):
+    # an empty secret stays empty, the scripts check for a missing password
+    return REDACTED if value not in (None, "") else value
+
+
+def redact(value):
+    """value with its secrets replaced by REDACTED, see the module docstring
+
+    Handles the JSON-able values written to the transcript: dicts, lists,
+    strings and the columns/rows of a SQL result.
+    """
+    if isinstance(value, dict):
+        redacted = {}
+        for name, item in value.items():
+            if isinstance(name, str) and SECRET_NAME.search(name) and not isinstance(item, (dict, list, tuple)):
+                redacted[name] = _redact_value(item)
+            else:
+                redacted[name] = redact(item)
+        columns = redacted.get("columns")
+        if isinstance(columns, list) and isinstance(redacted.get("rows"), list):
+            secret = [index for index, column in enumerate(columns) if SECRET_NAME.search(str(column))]
+            if secret:
+                redacted["rows"] = [[_redact_value(item) if index in secret else item for index, item in enumerate(row)]
+                                    for row in redacted["rows"]]
+        return redacted
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return SECRET_ARG.sub(r"\1" + REDACTED, value)
+    return value
+
+
+def _entry_key(kind, key):
+    # redacted on replay too, so a call made with a secret finds its recording
+    return kind + " " + json.dumps(redact(key), sort_keys=True, default=str)
+
+
+def start(mode, path, speed=1.0):
+    """Starts recording to or replaying from path for the rest of the run
+
+    Args:
+        mode (str): RECORD or REPLAY
+        path (str): transcript file, appended to when recording
+        speed (float): replay waits recorded time * speed, 0 answers at once
+    """
+    global _mode, _speed, _file, _entries
+    stop()
+    if mode == RECORD:
+        # results carry rows of the database and nlserver output, keep them from other users
+        _file = os.fdopen(os.open(path, os.O_CREAT | os.O_APPEND | os.O_WRONLY, 0o600), "a")
+    elif mode == REPLAY:
+        _entries = {}
+        with open(path) as fp:
+            for line in fp:
+                if line.strip():
+                    entry = json.loads(line)
+                    _entries.setdefault(entry["key"], collections.deque()).append(entry)
+    else:
+        raise ValueError("unknown transcript mode: {}".format(mode))
+    _mode = mode
+    _speed = speed
+    install_hooks()
+
+
+def stop():
+    """Stops recording or replaying"""
+    global _mode, _file
+    if _file is not None:
+        _file.close()
+    _file = None
+    _mode = None
+
+
+def _outermost():
+    # calls made while answering a recorded call belong to it
+    return not getattr(_local, "depth", 0)
+
+
+def recording():
+    """True when calls made here should be written to the transcript"""
+    return _mode == RECORD and _outermost()
+
+
+def replaying():
+    """True when calls made here should be answered from the transcript"""
+    return _mode == REPLAY and _outermost()
+
+
+def record(kind, key, result, elapsed):
+    """Writes one call and its JSON-able result, secrets redacted, to the transcript"""
+    entry = {"key": _entry_key(kind, key), "kind": kind, "elapsed": round(elapsed, 6),
+             "result": redact(json.loads(json.dumps(result, default=str)))}
+    with _lock:
+        _file.write(json.dumps(entry, default=str) + "\n")
+        _file.flush()
+
+
+def replay_entry(kind, key):
+    """Returns the recorded result of a call and how long to wait before answering
+
+    Calls are answered in the recorded order; once the recording of a call
+    runs out its last answer is repeated, so polling loops that go round
+    more often than when recorded still get an answer.
+
+    Raises:
+        TranscriptMiss: the call was never recorded
+    """
+    entry_key = _entry_key(kind, key)
+    with _lock:
+        queue = _entries.get(entry_key)
+        if not queue:
+            raise TranscriptMiss(entry_key)
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+    return entry["result"], entry["elapsed"] * _speed
+
+
+def replay(kind, key):
+    """Returns the recorded result of a call, waiting as long as it took, see replay_entry"""
+    result, delay = replay_entry(kind, key)
+    if delay:
+        _wait(delay)
+    return result
+
+
+def call(kind, key, func, encode=None, decode=None):
+    """Runs func() through the transcript: recorded, replayed or just run
+
+    Args:
+        kind (str): shell, argv, stream, nlserver, sql, config, fact, http, boto3, passwd
+        key: JSON-able description of the call, the same on record and replay
+        func (function): makes the real call
+        encode (function): result -> JSON-able value, default as is
+        decode (function): JSON value -> result, default as is
+
+    Returns:
+        result of func, or the recorded one on replay
+    """
+    # the argv run behind an nlserver call is the same call, count it once
+    nesting = getattr(_local, "nesting", 0)
+    if not nesting:
+        note_call(kind)
+    _local.nesting = nesting + 1
+    try:
+        with tracing.span(tracing.describe(kind, key), kind) as span_args:
+            result = _call(kind, key, func, encode, decode)
+            span_args.update(tracing.outcome(kind, result))
+    finally:
+        _local.nesting = nesting
+    return result
+
+
+def note_call(kind):
+    """Counts a call made without call(), e.g. a streamed command"""
+    with _lock:
+        _call_counts[kind] += 1
+
+
+def call_counts():
+    """Calls of the run so far by kind (shell, argv, nlserver, http, ...)"""
+    with _lock:
+        return dict(_call_counts)
+
+
+def _call(kind, key, func, encode, decode):
+    if replaying():
+        result = replay(kind, key)
+        return decode(result) if decode else result
+    if not recording():
+        return func()
+
+    _local.depth = 1
+    started = time.monotonic()
+    try:
+        result = func()
+    finally:
+        _local.depth = 0
+    record(kind, key, encode(result) if encode else result, time.monotonic() - started)
+    return result
+
+
+def _encode_response(response):
+    return {"status_code": response.status_code, "reason": response.reason, "url": response.url,
+            "headers": dict(response.headers), "encoding": response.encoding,
+            "content": base64.b64encode(response.content).decode()}
+
+
+def _decode_response(data):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    response.reason = data["reason"]
+    response.url = data["url"]
+    response.headers = CaseInsensitiveDict(data["headers"])
+    response.encoding = data["encoding"]
+    response._content = base64.b64decode(data["content"])
+    return response
+
+
+def _jsonable(value):
+    # boto3 answers carry datetimes, they come back as strings on replay
+    return json.loads(json.dumps(value, default=str))
+
+
+def _hook_requests():
+    try:
+        import requests
+    except ImportError:
+        return
+    original = requests.Session.request
+    if getattr(original, "transcript_hook", False):
+        return
+
+    def request(self, method, url, *args, **kwargs):
+        key = [method.upper(), url, kwargs.get("params"), kwargs.get("data"), kwargs.get("json")]
+        return call("http", key, lambda: original(self, method, url, *args, **kwargs),
+                    _encode_response, _decode_response)
+    request.transcript_hook = True
+    requests.Session.request = request
+
+
+def _hook_boto3():
+    try:
+        from botocore.client import BaseClient
+    except ImportError:
+        return
+    original = BaseClient._make_api_call
+    if getattr(original, "transcript_hook", False):
+        return
+
+    def _make_api_call(self, operation_name, api_params):
+        key = [self.meta.service_model.service_name, self.meta.region_name, operation_name, api_params]
+        return call("boto3", key, lambda: original(self, operation_name, api_params), _jsonable)
+    _make_api_call.transcript_hook = True
+    BaseClient._make_api_call = _make_api_call
+
+
+def _hook_passwd():
+    # scripts look up the neolane account at import, which a laptop doesn't have
+    import pwd
+    original = pwd.getpwnam
+    if getattr(original, "transcript_hook", False):
+        return
+
+    def getpwnam(name):
+        return call("passwd", [name], lambda: original(name), list, pwd.struct_passwd)
+    getpwnam.transcript_hook = True
+    pwd.getpwnam = getpwnam
+
+
+def install_hooks():
+    """Routes HTTP, boto3 and passwd lookups through call(), once"""
+    _hook_requests()
+    _hook_boto3()
+    _hook_passwd()
+
+
+tracing.on_start(install_hooks)
+
+if os.environ.get(RECORD_ENV):
+    start(RECORD, os.environ[RECORD_ENV])
+elif os.environ.get(REPLAY_ENV):
+    start(REPLAY, os.environ[REPLAY_ENV], float(os.environ.get(SPEED_ENV, "1")))